@@ -1,21 +1,29 @@
-import fastapi
-from fastapi import FastAPI, HTTPException, UploadFile, File
+import time
+
+# measured before the imports, so the startup report includes them
+startup_start_time = time.perf_counter()
+
+import asyncio
+import logging
+from fastapi import FastAPI, HTTPException
 from fastapi.concurrency import asynccontextmanager
 from fastapi.responses import JSONResponse
 from fastapi.middleware import cors
-from neo4j import GraphDatabase
-from models.extraction_models import Entity, ExtractionModel, ExtractionResponseModel, ExtractionCreateModel
-from models.entity_models import Entity as EntityModelForGeneration, EntityLinkingCreate, RelationshipCreateModel
-from data_processor.data_transformer import get_english_stopwords, get_hlc_entities, get_spacy_sentences, get_spacy_entities, get_spacy_tokens
-from database.graph_helper import add_node
-import uuid
-from datetime import datetime
-from helper import extraction_create, extraction_create_calculate_in_ram, remove_all_nodes
-from helper_test import extraction_create_optimized, extraction_create_optimized_nltk
-import time
-import spacy
+from neo4j import AsyncGraphDatabase
+from database.read_cache import ReadCache
+from database.schema import apply_schema
+from database.search_index import SearchIndex
+from database.similarity_index import SimilarityIndex
+from database.storage import create_storage
+from data_processor.token_filter import get_token_filter
+from data_processor.tokenizers import create_tokenizers
+from data_processor.pdf_extractor import PdfExtractor
+from data_processor.entity_matcher import EntityMatcher
+from data_processor.nlp_executor import SPACY_EXCLUDE, SPACY_MODEL, NlpExecutor, NlpExecutorBusy, load_spacy_model
+from ingestion_jobs import IngestionQueue, IngestionQueueFull
 
-from pypdf import PdfReader
+# spacy, nltk and pypdf are imported on first use (see data_processor.nlp_executor, routes/functions.py),
+# the legacy ingestion functions (helper.py) are not needed by the API
 
 # get router from /routes/extractions.py and add it to the app
 from routes.extractions import router as extractions_router
@@ -31,30 +39,179 @@ import os
 
 dotenv.load_dotenv()
 
+# eager: load the spaCy model before serving requests
+# background: serve the graph routes right away, NLP routes answer 503 until GET /ready reports nlp "ready"
+NLP_STARTUP = os.getenv("NLP_STARTUP", "background")
+# in-process search index for /nodes/autocomplete and /nodes/search (built in the background after startup)
+SEARCH_INDEX = os.getenv("SEARCH_INDEX", "true").lower() == "true"
+
+async def build_search_index(search_index, storage):
+    try:
+        await search_index.build(storage)
+        print(f"Search index ready: {search_index.get_stats()}")
+    except Exception:
+        # search falls back to the full-text indexes of the graph
+        logging.exception("Building the search index failed")
+
+async def build_similarity_index(similarity_index, storage):
+    try:
+        await similarity_index.build(storage)
+        print(f"Similarity index ready: {similarity_index.get_stats()}")
+    except Exception:
+        # /similar-extractions answers 503
+        logging.exception("Building the similarity index failed")
+
+async def build_entity_matcher(entity_matcher, storage):
+    try:
+        await entity_matcher.build(storage)
+        print(f"Entity matcher ready: {entity_matcher.get_stats()}")
+    except Exception:
+        # /hlc falls back to scanning all entity texts
+        logging.exception("Building the entity matcher failed")
+
+async def backfill_ngram_index(app, storage, token_filter):
+    """Adds HLCs of older graphs to the n-gram index, the n-gram routes are incomplete until it is done."""
+    try:
+        hlcs = await storage.backfill_ngrams(token_filter)
+        app.state.ngram_index = "ready"
+        if hlcs:
+            app.state.read_cache.invalidate()
+            print(f"N-gram index: {hlcs} HLCs of older extractions added")
+    except Exception:
+        app.state.ngram_index = "failed"
+        logging.exception("Backfilling the n-gram index failed")
+
+async def load_nlp(app, storage, token_filter, timings):
+    """Loads the spaCy model and starts everything that needs it: tokenizers, NLP executor and ingestion queue."""
+    start_time = time.perf_counter()
+    app.state.nlp_status = "loading"
+    try:
+        # in a thread, the event loop keeps serving requests while the model is loaded
+        spacy_context = await asyncio.to_thread(load_spacy_model, SPACY_MODEL, SPACY_EXCLUDE)
+        app.state.spacy_context = spacy_context
+
+        # tokenizer backends (spacy, nltk, regex), selectable per extraction
+        tokenizers = create_tokenizers(spacy_context)
+        app.state.tokenizers = tokenizers
+
+        # spaCy/NLTK work runs in a thread pool (short texts) or a process pool (long documents), not on the event loop
+        nlp_executor = NlpExecutor(spacy_context, tokenizers, SPACY_MODEL, exclude=SPACY_EXCLUDE)
+        app.state.nlp_executor = nlp_executor
+
+        # background workers for POST /extractions (INGESTION_WORKERS in .env)
+        ingestion_queue = IngestionQueue(storage, tokenizers, token_filter, nlp_executor=nlp_executor, read_cache=app.state.read_cache)
+        ingestion_queue.start()
+        app.state.ingestion_queue = ingestion_queue
+
+        app.state.nlp_status = "ready"
+    except Exception as error:
+        logging.exception(f"Loading the spaCy model {SPACY_MODEL} failed")
+        app.state.nlp_status = "failed"
+        app.state.nlp_error = str(error)
+
+    timings["nlp_seconds"] = round(time.perf_counter() - start_time, 3)
+    timings["nlp_ready_after_seconds"] = round(time.perf_counter() - startup_start_time, 3)
+    print(f"NLP pipeline {SPACY_MODEL} (excluded: {', '.join(SPACY_EXCLUDE) or '-'}): {app.state.nlp_status} after {timings['nlp_seconds']}s")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # neo4j driver initialization
+    timings = {"imports_seconds": round(time.perf_counter() - startup_start_time, 3)}
+    app.state.startup_timings = timings
+    app.state.nlp_status = "loading"
+    app.state.nlp_error = None
 
-    db_uri = os.getenv("DB_URI")
-    db_user = os.getenv("DB_USER")
-    db_password = os.getenv("DB_PASSWORD")
+    # graph storage: neo4j (default) or memory for benchmarks and small local workspaces (GRAPH_STORAGE in .env)
+    start_time = time.perf_counter()
+    storage_backend = os.getenv("GRAPH_STORAGE", "neo4j")
+    driver = None
+    schema_version = None
 
-    print(db_uri)
-    print(db_user)
-    print(db_password)
+    if storage_backend == "neo4j":
+        # neo4j driver initialization
+
+        db_uri = os.getenv("DB_URI")
+        db_user = os.getenv("DB_USER")
+        db_password = os.getenv("DB_PASSWORD")
+
+        print(db_uri)
+        print(db_user)
+        print(db_password)
+
+        # async driver, so Cypher round-trips do not block the event loop
+        driver = AsyncGraphDatabase.driver(
+            db_uri,
+            auth=(db_user, db_password)
+        )
+
+        # create constraints and indexes before serving any request (idempotent)
+        schema_version = await apply_schema(driver)
+        print(f"Graph schema version: {schema_version}")
+
+    storage = create_storage(storage_backend, driver)
+    print(f"Graph storage: {storage.name}")
+    timings["graph_seconds"] = round(time.perf_counter() - start_time, 3)
 
-    driver = GraphDatabase.driver(
-        db_uri,
-        auth=(db_user, db_password)
-    )
-    spacy_context = spacy.load("en_core_web_sm")
     app.state.driver = driver
-    app.state.spacy_context = spacy_context
+    app.state.storage = storage
+    app.state.schema_version = schema_version
+
+    # updated by the writes of the storage, so it is attached before anything is ingested
+    search_index = None
+    search_index_task = None
+    if SEARCH_INDEX:
+        search_index = SearchIndex()
+        storage.search_index = search_index
+        search_index_task = asyncio.create_task(build_search_index(search_index, storage))
+    app.state.search_index = search_index
+
+    # MinHash/LSH index of the extractions for /similar-extractions, missing signatures are computed during the build
+    similarity_index = SimilarityIndex()
+    storage.similarity_index = similarity_index
+    app.state.similarity_index = similarity_index
+    similarity_index_task = asyncio.create_task(build_similarity_index(similarity_index, storage))
+
+    # responses of the search and workspace routes, invalidated by every write (READ_CACHE_SIZE, READ_CACHE_TTL)
+    app.state.read_cache = ReadCache()
+
+    # entity recommendations of /hlc (Aho-Corasick over all entity texts), built in the background
+    entity_matcher = EntityMatcher()
+    app.state.entity_matcher = entity_matcher
+    entity_matcher_task = asyncio.create_task(build_entity_matcher(entity_matcher, storage))
+
+    # PDF pages are extracted in parallel by a process pool (started on the first upload)
+    pdf_extractor = PdfExtractor()
+    app.state.pdf_extractor = pdf_extractor
+
+    # stopwords and filter rules are loaded once and shared by ingestion and search
+    token_filter = get_token_filter()
+    app.state.token_filter = token_filter
+
+    # n-grams are indexed at ingestion, HLCs ingested before the n-gram index are added in the background
+    app.state.ngram_index = "backfilling"
+    ngram_index_task = asyncio.create_task(backfill_ngram_index(app, storage, token_filter))
+
+    nlp_task = None
+    if NLP_STARTUP == "eager":
+        await load_nlp(app, storage, token_filter, timings)
+    else:
+        nlp_task = asyncio.create_task(load_nlp(app, storage, token_filter, timings))
+
+    timings["serving_after_seconds"] = round(time.perf_counter() - startup_start_time, 3)
+    print(f"Startup timings (NLP_STARTUP={NLP_STARTUP}): {timings}")
     try:
         yield
     finally:
+        for task in (nlp_task, search_index_task, entity_matcher_task, entity_matcher.rebuild_task, ngram_index_task, similarity_index_task):
+            if task:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        if getattr(app.state, "ingestion_queue", None):
+            await app.state.ingestion_queue.stop()
+        if getattr(app.state, "nlp_executor", None):
+            app.state.nlp_executor.shutdown()
+        pdf_extractor.shutdown()
         # Close the driver when the app is shutting down
-        await driver.close()
+        await storage.close()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -71,6 +228,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(NlpExecutorBusy)
+@app.exception_handler(IngestionQueueFull)
+async def queue_full_handler(request, error):
+    # backpressure: the NLP or ingestion queue is full, the client should retry later
+    return JSONResponse(status_code=503, content={"detail": str(error)}, headers={"Retry-After": "5"})
+
+@app.get("/ready")
+async def get_readiness():
+    """
+    Readiness of the API: the graph routes are available as soon as the app serves requests,
+    the NLP routes once nlp is "ready" (NLP_STARTUP=background loads the model after startup).
+    """
+    return {
+        "graph": app.state.storage.name,
+        "schema_version": app.state.schema_version,
+        "nlp": app.state.nlp_status,
+        "nlp_error": app.state.nlp_error,
+        "search_index": app.state.search_index.get_stats() if app.state.search_index else None,
+        "read_cache": app.state.read_cache.get_stats(),
+        "entity_matcher": app.state.entity_matcher.get_stats(),
+        "ngram_index": app.state.ngram_index,
+        "similarity_index": app.state.similarity_index.get_stats(),
+        "startup_timings": app.state.startup_timings
+    }
+
+@app.get("/ready/nlp")
+async def get_nlp_readiness():
+    """200 once the NLP pipeline is loaded, 503 before (e.g. for a readiness probe of workers that ingest)."""
+    status_code = 200 if app.state.nlp_status == "ready" else 503
+    return JSONResponse(status_code=status_code, content={"nlp": app.state.nlp_status, "nlp_error": app.state.nlp_error})
+
 app.include_router(extractions_router, tags=["extractions"])
 app.include_router(hlcs_router, tags=["hlcs"])
 app.include_router(mlcs_router, tags=["mlcs"])
@@ -0,0 +1,94 @@
+"""
+Compares the per-sentence Counter loop with the vectorized NumPy co-occurrence counting.
+
+Run from the repository root:
+    python -m benchmarks.cooccurrence_benchmark --file test/KGG_1.txt --repeat 5
+"""
+import argparse
+import json
+import time
+from collections import Counter
+
+import spacy
+
+from data_processor.cooccurrence import COOCCURRENCE_STRATEGIES, count_cooccurrences, count_cooccurrences_vectorized
+from data_processor.token_filter import get_token_filter
+
+def load_filtered_sentences(path):
+    # a blank pipeline with the rule-based sentencizer, so no model download is needed for the benchmark
+    nlp = spacy.blank("en")
+    nlp.add_pipe("sentencizer")
+    nlp.max_length = 10_000_000
+
+    with open(path, "r", encoding="utf-8") as file:
+        text = file.read()
+
+    token_filter = get_token_filter()
+    doc = nlp(text)
+    return [token_filter.filter([token.text for token in sent]) for sent in doc.sents]
+
+def count_with_counter(sentences_tokens, strategy, window_size):
+    counter = Counter()
+    for tokens in sentences_tokens:
+        count_cooccurrences(tokens, counter, strategy, window_size)
+    return counter
+
+def count_with_original_loop(sentences_tokens):
+    # pair loop of extraction_create_optimized before the vectorization (sentence strategy only)
+    counter = Counter()
+    for tokens in sentences_tokens:
+        for i in range(len(tokens)):
+            for j in range(i + 1, len(tokens)):
+                pair = tuple(sorted((tokens[i], tokens[j])))
+                counter[pair] += 1
+    return counter
+
+def best_time(function, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start_time)
+    return min(timings), result
+
+def run_benchmark(path, repeat, window_size, scale):
+    sentences_tokens = load_filtered_sentences(path) * scale
+    results = {
+        "file": path,
+        "scale": scale,
+        "sentences": len(sentences_tokens),
+        "tokens": sum(len(tokens) for tokens in sentences_tokens),
+        "strategies": {}
+    }
+
+    original_time, _ = best_time(lambda: count_with_original_loop(sentences_tokens), repeat)
+    results["original_loop_seconds"] = round(original_time, 4)
+
+    for strategy in COOCCURRENCE_STRATEGIES:
+        counter_time, counter_result = best_time(lambda: count_with_counter(sentences_tokens, strategy, window_size), repeat)
+        vectorized_time, vectorized_result = best_time(lambda: count_cooccurrences_vectorized(sentences_tokens, strategy, window_size), repeat)
+
+        same_result = counter_result.keys() == vectorized_result.keys() and all(
+            abs(counter_result[pair] - vectorized_result[pair]) < 1e-6 for pair in counter_result
+        )
+        results["strategies"][strategy] = {
+            "unique_pairs": len(vectorized_result),
+            "counter_seconds": round(counter_time, 4),
+            "vectorized_seconds": round(vectorized_time, 4),
+            "speedup": round(counter_time / vectorized_time, 2) if vectorized_time > 0 else None,
+            "speedup_vs_original_loop": round(original_time / vectorized_time, 2) if strategy == "sentence" and vectorized_time > 0 else None,
+            "same_result": same_result
+        }
+
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the co-occurrence counting implementations.")
+    parser.add_argument("--file", default="test/KGG_1.txt", help="Text file to tokenize")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetitions per implementation, the best time is reported")
+    parser.add_argument("--window", type=int, default=5, help="Window size for the window strategies")
+    parser.add_argument("--scale", type=int, default=1, help="Repeat the sentences of the file this many times")
+    args = parser.parse_args()
+
+    print(json.dumps(run_benchmark(args.file, args.repeat, args.window, args.scale), indent=4))
@@ -0,0 +1,364 @@
+"""
+End-to-end benchmark of the ingestion functions (extraction_create, extraction_create_calculate_in_ram,
+extraction_create_optimized, extraction_create_optimized_nltk and extraction_create_pipelined).
+
+Every function ingests every corpus (the test files and synthetic corpora scaled from them). The
+results are printed as JSON: per-stage timings, queries, transactions, rows written and peak memory.
+By default the queries go to an in-process recording driver, so only the Python side is measured;
+use --neo4j to write into the database configured in .env (DB_URI, DB_USER, DB_PASSWORD) or --memory
+to write the optimized functions into the in-memory graph storage (the legacy functions of helper.py
+always need a driver and keep using the recording driver then). --db-latency adds a delay to every
+query of the recording driver, to see how much of the database time the pipelined ingestion hides.
+
+--check-pipeline compares the graph of extraction_create_pipelined with the graph of a single-shot
+ingestion (in-memory storage, regex tokenizer, sentences wrapped across line breaks and block boundaries).
+
+Run from the repository root:
+    python -m benchmarks.ingestion_benchmark --scale 1 4 --output bench.json
+    python -m benchmarks.ingestion_benchmark --baseline bench.json   # exit code 1 on regressions
+    python -m benchmarks.ingestion_benchmark --check-pipeline        # exit code 1 if the graphs differ
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import textwrap
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+INGESTION_FUNCTIONS = ["extraction_create", "extraction_create_calculate_in_ram", "extraction_create_optimized", "extraction_create_optimized_nltk", "extraction_create_pipelined"]
+DEFAULT_FILES = ["test/KGG_1.txt", "test_data_kgg1.txt"]
+
+class RecordingResult:
+    async def consume(self):
+        return None
+
+    async def single(self):
+        return None
+
+    async def data(self):
+        return []
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        raise StopAsyncIteration
+
+class RecordingSession:
+    """Accepts the async session API used by the ingestion (run, execute_write/read) and counts the queries."""
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def run(self, query, parameters=None, **kwargs):
+        self.driver.record(query, {**(parameters or {}), **kwargs})
+        await asyncio.sleep(self.driver.latency)
+        return RecordingResult()
+
+    async def execute_write(self, function, *args, **kwargs):
+        self.driver.transactions += 1
+        return await function(self, *args, **kwargs)
+
+    execute_read = execute_write
+
+    async def close(self):
+        pass
+
+class RecordingDriver:
+    """
+        In-process stand-in for the async neo4j driver. Nothing is stored, but every query is counted
+        together with the rows it carries (the length of its largest list parameter, or 1).
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.queries = 0
+        self.transactions = 0
+        self.rows = 0
+
+    def record(self, query, parameters):
+        list_lengths = [len(value) for value in parameters.values() if isinstance(value, (list, tuple))]
+        self.queries += 1
+        self.rows += max(list_lengths) if list_lengths else 1
+
+    def session(self, **kwargs):
+        return RecordingSession(self)
+
+    async def execute_query(self, query, parameters_=None, **kwargs):
+        self.transactions += 1
+        self.record(query, {**(parameters_ or {}), **{key: value for key, value in kwargs.items() if not key.endswith("_")}})
+        await asyncio.sleep(self.latency)
+        return [], None, []
+
+    async def close(self):
+        pass
+
+def load_nlp(model):
+    import spacy
+
+    try:
+        nlp = spacy.load(model)
+    except OSError:
+        # the model is not installed, a blank pipeline with the rule-based sentencizer still gives comparable tokens
+        logging.warning(f"spaCy model '{model}' not found, using a blank 'en' pipeline with sentencizer")
+        nlp = spacy.blank("en")
+        nlp.add_pipe("sentencizer")
+        model = "blank:en+sentencizer"
+    nlp.max_length = 10_000_000
+    return nlp, model
+
+def build_corpora(files, scales, seed):
+    """
+        Returns [(name, text)] for every file and scale. Scaled corpora are synthetic: the sentences
+        of the file are shuffled (seeded, so every run gets the same text) and repeated scale times.
+    """
+    corpora = []
+    for path in files:
+        with open(path, "r", encoding="utf-8") as file:
+            text = file.read()
+
+        for scale in scales:
+            if scale == 1:
+                corpora.append((path, text))
+                continue
+
+            lines = [line for line in text.splitlines() if line.strip()]
+            generator = random.Random(f"{seed}-{path}-{scale}")
+            scaled_lines = []
+            for _ in range(scale):
+                shuffled = list(lines)
+                generator.shuffle(shuffled)
+                scaled_lines.extend(shuffled)
+            corpora.append((f"{path} (synthetic x{scale})", "\n".join(scaled_lines)))
+    return corpora
+
+def get_peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def run_case(function_name, corpus_name, text, model, use_neo4j, use_memory, trace_memory, db_latency=0.0):
+    """Ingests one corpus with one function and returns the measurements."""
+    # imported here, so the case also works in a fresh (spawned) process
+    import helper
+    import helper_test
+    import ingestion_pipeline
+    from data_processor.tokenizers import SpacyTokenizer
+    from data_processor.token_filter import get_token_filter
+    from database.storage import InMemoryStorage, Neo4jStorage
+    from models.extraction_models import ExtractionCreateModel
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    nlp, model = load_nlp(model)
+    token_filter = get_token_filter()
+    # the legacy functions of helper.py write with a driver, the optimized ones with a graph storage
+    uses_storage = not hasattr(helper, function_name)
+    function = getattr(helper_test if hasattr(helper_test, function_name) else ingestion_pipeline, function_name) if uses_storage else getattr(helper, function_name)
+
+    if use_neo4j:
+        import dotenv
+        from neo4j import AsyncGraphDatabase
+
+        dotenv.load_dotenv()
+        driver = AsyncGraphDatabase.driver(os.getenv("DB_URI"), auth=(os.getenv("DB_USER"), os.getenv("DB_PASSWORD")))
+    else:
+        driver = RecordingDriver(db_latency)
+
+    target = driver
+    storage_name = "neo4j" if use_neo4j else "recording"
+    if uses_storage:
+        target = InMemoryStorage() if use_memory and not use_neo4j else Neo4jStorage(driver)
+        storage_name = "memory" if isinstance(target, InMemoryStorage) else storage_name
+
+    if trace_memory:
+        tracemalloc.start()
+
+    start_time = time.perf_counter()
+    doc = nlp(text)
+    sentences = [{"hlc_id": str(uuid.uuid4()), "text": sentence.text} for sentence in doc.sents if sentence.text.strip()]
+    segmentation_seconds = time.perf_counter() - start_time
+
+    extraction = ExtractionCreateModel(text=text, textual_identifier=f"benchmark {corpus_name}")
+    stats = {}
+    start_time = time.perf_counter()
+    # extraction_create prints every sentence, that would dominate the timings
+    with contextlib.redirect_stdout(io.StringIO()):
+        if function_name == "extraction_create_pipelined":
+            # segments the text itself, so its ingestion_seconds include the segmentation
+            asyncio.run(function(target, SpacyTokenizer(nlp), str(uuid.uuid4()), extraction, datetime.now().isoformat(), stats=stats, token_filter=token_filter))
+        else:
+            asyncio.run(function(target, nlp, str(uuid.uuid4()), extraction, datetime.now().isoformat(), sentences, [], stats=stats, token_filter=token_filter))
+    ingestion_seconds = time.perf_counter() - start_time
+
+    result = {
+        "corpus": corpus_name,
+        "function": function_name,
+        "model": model,
+        "storage": storage_name,
+        "characters": len(text),
+        "sentences": len(sentences),
+        "segmentation_seconds": round(segmentation_seconds, 4),
+        "ingestion_seconds": round(ingestion_seconds, 4),
+        "sentences_per_second": round(len(sentences) / ingestion_seconds, 1) if ingestion_seconds > 0 else None,
+        "write_stages": stats,
+        "queries": driver.queries if storage_name == "recording" else None,
+        "transactions": driver.transactions if storage_name == "recording" else None,
+        "rows": driver.rows if storage_name == "recording" else sum(stage["rows"] for stage in stats.values()),
+        "peak_rss_mb": get_peak_rss_mb()
+    }
+
+    if trace_memory:
+        result["tracemalloc_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+        tracemalloc.stop()
+
+    asyncio.run(driver.close())
+    return result
+
+def run_isolated(*args):
+    """Runs a case in a fresh process, so peak RSS belongs to this case only."""
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(run_case, args)
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Cases that are more than tolerance (fraction) slower than in the baseline."""
+    baseline_seconds = {(case["corpus"], case["function"]): case["ingestion_seconds"] for case in baseline["cases"] if "error" not in case}
+    regressions = []
+    for case in results["cases"]:
+        if "error" in case:
+            continue
+        previous = baseline_seconds.get((case["corpus"], case["function"]))
+        if previous and case["ingestion_seconds"] > previous * (1 + tolerance):
+            regressions.append({
+                "corpus": case["corpus"],
+                "function": case["function"],
+                "baseline_seconds": previous,
+                "seconds": case["ingestion_seconds"],
+                "slowdown": round(case["ingestion_seconds"] / previous, 2)
+            })
+    return regressions
+
+def get_graph_counts(storage):
+    """HLCs, HAS_CHAIN and RELATED_TO relationships (with their summed strength) of an in-memory storage."""
+    return {
+        "hlcs": len(storage.hlcs),
+        "has_chain": sum(len(chain) for chain in storage.chains.values()),
+        # stored in both directions
+        "related_to": sum(len(related) for related in storage.related.values()) // 2,
+        "related_to_strength": sum(sum(related.values()) for related in storage.related.values()) // 2,
+        "mlcs": len(storage.mlcs)
+    }
+
+def check_pipeline(block_characters=200):
+    """Counts of a single-shot and a pipelined ingestion of the same line-wrapped text, they have to be equal."""
+    import helper_test
+    import ingestion_pipeline
+    from data_processor.tokenizers import RegexTokenizer
+    from data_processor.token_filter import get_token_filter
+    from database.storage import InMemoryStorage
+    from models.extraction_models import ExtractionCreateModel
+
+    # wrapped at a fixed width like the text of a PDF page, sentences continue across line breaks
+    words = ["graphs", "store", "knowledge", "nodes", "between", "sentences", "and", "tokens", "with", "strength"]
+    sentences = [f"Sentence {index} about {words[index % len(words)]} and {words[(index * 3) % len(words)]} of {words[(index * 7) % len(words)]} in the graph." for index in range(40)]
+    text = textwrap.fill(" ".join(sentences), width=47)
+    tokenizer = RegexTokenizer()
+    token_filter = get_token_filter()
+    extraction = ExtractionCreateModel(text=text, textual_identifier="pipeline check", deduplicate_sentences=True)
+
+    async def ingest():
+        single_shot = InMemoryStorage()
+        sentences = helper_test.create_hlc_sentences(tokenizer.analyse(text))
+        await helper_test.extraction_create_with_tokenizer(single_shot, tokenizer, str(uuid.uuid4()), extraction, datetime.now().isoformat(), sentences, [], token_filter=token_filter)
+        pipelined = InMemoryStorage()
+        await ingestion_pipeline.extraction_create_pipelined(pipelined, tokenizer, str(uuid.uuid4()), extraction, datetime.now().isoformat(), token_filter=token_filter, block_characters=block_characters)
+        return get_graph_counts(single_shot), get_graph_counts(pipelined)
+
+    single_shot_counts, pipelined_counts = asyncio.run(ingest())
+    return {"single_shot": single_shot_counts, "pipelined": pipelined_counts, "equal": single_shot_counts == pipelined_counts}
+
+def run_benchmark(files, scales, functions, model, use_neo4j, use_memory, isolate, trace_memory, seed, db_latency=0.0):
+    cases = []
+    for corpus_name, text in build_corpora(files, scales, seed):
+        for function_name in functions:
+            logging.warning(f"Running {function_name} on {corpus_name}")
+            arguments = (function_name, corpus_name, text, model, use_neo4j, use_memory, trace_memory, db_latency)
+            try:
+                cases.append(run_isolated(*arguments) if isolate else run_case(*arguments))
+            except Exception as error:
+                # e.g. missing NLTK data, the other cases are still reported
+                logging.error(f"{function_name} failed on {corpus_name}: {error}")
+                cases.append({"corpus": corpus_name, "function": function_name, "error": f"{type(error).__name__}: {str(error).strip()}"})
+
+    return {
+        "created": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "driver": "neo4j" if use_neo4j else "recording",
+        "memory_storage": use_memory and not use_neo4j,
+        "isolated": isolate,
+        "db_latency": db_latency,
+        "seed": seed,
+        "cases": cases
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the ingestion functions end to end.")
+    parser.add_argument("--file", nargs="+", default=DEFAULT_FILES, help="Text files used as corpora")
+    parser.add_argument("--scale", nargs="+", type=int, default=[1], help="Synthetic corpora: the sentences of each file repeated (shuffled) this many times")
+    parser.add_argument("--function", nargs="+", default=INGESTION_FUNCTIONS, choices=INGESTION_FUNCTIONS, help="Ingestion functions to run")
+    parser.add_argument("--model", default="en_core_web_sm", help="spaCy model (falls back to a blank pipeline if not installed)")
+    parser.add_argument("--neo4j", action="store_true", help="Write into the Neo4j database from .env instead of the recording driver")
+    parser.add_argument("--memory", action="store_true", help="Write the optimized functions into the in-memory graph storage")
+    parser.add_argument("--db-latency", type=float, default=0.0, help="Seconds every query of the recording driver takes (simulated database round trip)")
+    parser.add_argument("--no-isolate", action="store_true", help="Run all cases in this process (peak RSS is then the maximum so far)")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also report the peak of Python allocations (slows down the run)")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the synthetic corpora")
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run, slower cases are reported as regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown against the baseline (0.2 = 20%%)")
+    parser.add_argument("--check-pipeline", action="store_true", help="Only check that pipelined and single-shot ingestion write the same graph")
+    args = parser.parse_args()
+
+    if args.check_pipeline:
+        check = check_pipeline()
+        print(json.dumps(check, indent=4))
+        sys.exit(0 if check["equal"] else 1)
+
+    results = run_benchmark(args.file, args.scale, args.function, args.model, args.neo4j, args.memory, not args.no_isolate, args.tracemalloc, args.seed, args.db_latency)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            results["regressions"] = compare_with_baseline(results, json.load(file), args.tolerance)
+        exit_code = 1 if results["regressions"] else 0
+
+    output = json.dumps(results, indent=4)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output)
+    print(output)
+    sys.exit(exit_code)
@@ -0,0 +1,36 @@
+import hashlib
+import os
+import re
+import unicodedata
+
+from data_processor.cooccurrence import get_cooccurrence_settings
+from data_processor.tokenizers import DEFAULT_TOKENIZER
+
+# POST /extractions returns the existing extraction for content that is already ingested (can be disabled per request)
+DEDUPLICATE_EXTRACTIONS = os.getenv("DEDUPLICATE_EXTRACTIONS", "true").lower() == "true"
+# sentences (HLCs) that already exist are linked instead of counted again (can be set per extraction)
+DEDUPLICATE_SENTENCES = os.getenv("DEDUPLICATE_SENTENCES", "false").lower() == "true"
+
+whitespace_pattern = re.compile(r"\s+")
+
+def normalize_text(text):
+    """Unicode NFC, whitespace runs collapsed to a single space and stripped. The case is kept, MLCs are case-sensitive."""
+    return whitespace_pattern.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+def get_text_hash(text):
+    """sha256 of the normalized text, used for HLCs."""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+def get_extraction_hash(extraction):
+    """
+        Content hash of an extraction: the normalized text together with the settings that change
+        the written graph (tokenizer, co-occurrence strategy and window). The same text with another
+        tokenizer is new content.
+    """
+    strategy, window_size = get_cooccurrence_settings(extraction)
+    tokenizer = getattr(extraction, "tokenizer", None) or DEFAULT_TOKENIZER
+    return get_text_hash(f"{tokenizer}|{strategy}|{window_size}|{extraction.text}")
+
+def should_deduplicate_sentences(extraction):
+    value = getattr(extraction, "deduplicate_sentences", None)
+    return DEDUPLICATE_SENTENCES if value is None else value
@@ -0,0 +1,141 @@
+import os
+
+import numpy as np
+
+# Strategies for the RELATED_TO relationships between the (filtered) MLCs of a sentence:
+# - sentence: every pair of tokens in the sentence (O(n^2) pairs per sentence)
+# - window: only pairs with at most window_size tokens in between (O(n*k))
+# - weighted_window: like window, but the strength is 1/distance instead of 1
+COOCCURRENCE_STRATEGIES = ["sentence", "window", "weighted_window"]
+
+DEFAULT_COOCCURRENCE_STRATEGY = os.getenv("COOCCURRENCE_STRATEGY", "sentence")
+DEFAULT_COOCCURRENCE_WINDOW = int(os.getenv("COOCCURRENCE_WINDOW", "5"))
+
+def get_cooccurrence_settings(extraction=None):
+    """
+        Returns (strategy, window_size) of an extraction, falls back to the global defaults
+        (COOCCURRENCE_STRATEGY and COOCCURRENCE_WINDOW in .env).
+    """
+    strategy = getattr(extraction, "cooccurrence_strategy", None) or DEFAULT_COOCCURRENCE_STRATEGY
+    window_size = getattr(extraction, "cooccurrence_window", None) or DEFAULT_COOCCURRENCE_WINDOW
+
+    if strategy not in COOCCURRENCE_STRATEGIES:
+        raise ValueError(f"Invalid co-occurrence strategy '{strategy}'. Choose from: {', '.join(COOCCURRENCE_STRATEGIES)}")
+    if window_size < 1:
+        raise ValueError("The co-occurrence window size must be at least 1")
+
+    return strategy, window_size
+
+def get_cooccurrence_pairs(tokens, strategy="sentence", window_size=DEFAULT_COOCCURRENCE_WINDOW):
+    """
+        Yields (token_a, token_b, weight) for all co-occurring tokens, in the order of the sentence.
+        The tokens should already be filtered (stopwords, signs).
+    """
+    token_count = len(tokens)
+    max_distance = token_count if strategy == "sentence" else window_size
+
+    for i in range(token_count):
+        for j in range(i + 1, min(i + max_distance + 1, token_count)):
+            weight = 1 / (j - i) if strategy == "weighted_window" else 1
+            yield tokens[i], tokens[j], weight
+
+def count_cooccurrences(tokens, counter, strategy="sentence", window_size=DEFAULT_COOCCURRENCE_WINDOW):
+    """
+        Adds the co-occurrence weights of a sentence to the counter. The pairs are sorted,
+        so (a, b) and (b, a) are counted as the same relationship.
+    """
+    for token_a, token_b, weight in get_cooccurrence_pairs(tokens, strategy, window_size):
+        pair = (token_a, token_b) if token_a <= token_b else (token_b, token_a)
+        counter[pair] += weight
+    return counter
+
+# pairs are reduced to unique keys whenever this many pairs are buffered, keeps the memory bounded
+VECTORIZED_REDUCE_THRESHOLD = 5_000_000
+
+def get_pair_indices(token_count, max_distance, pair_index_cache):
+    """Upper-triangle index pairs (i < j) of a sentence with at most max_distance between i and j (cached per length)."""
+    key = (token_count, max_distance)
+    if key not in pair_index_cache:
+        left, right = np.triu_indices(token_count, k=1)
+        if max_distance < token_count:
+            mask = (right - left) <= max_distance
+            left, right = left[mask], right[mask]
+        pair_index_cache[key] = (left, right)
+    return pair_index_cache[key]
+
+def reduce_pairs(keys, weights):
+    """Sums the weights of equal pair keys."""
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    return unique_keys, np.bincount(inverse, weights=weights, minlength=len(unique_keys))
+
+def count_cooccurrences_vectorized(sentences_tokens, strategy="sentence", window_size=DEFAULT_COOCCURRENCE_WINDOW):
+    """
+        Same result as calling count_cooccurrences for every sentence, but computed with NumPy
+        over all sentences at once: the tokens are interned into integer ids, sentences of the
+        same length are stacked into one matrix, the pairs are generated with upper-triangle
+        index arrays and aggregated with np.unique. Only the unique pairs are decoded back to strings.
+
+        Returns a dict {(token_a, token_b): weight} with token_a <= token_b.
+    """
+    # ids are assigned in sorted order, so comparing ids is the same as comparing the strings
+    vocabulary = sorted({token for tokens in sentences_tokens for token in tokens})
+    if not vocabulary:
+        return {}
+    token_ids = {token: index for index, token in enumerate(vocabulary)}
+    vocabulary_size = len(vocabulary)
+
+    all_ids = np.array([token_ids[token] for tokens in sentences_tokens for token in tokens], dtype=np.int64)
+    lengths = np.array([len(tokens) for tokens in sentences_tokens], dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+    pair_index_cache = {}
+    buffered_keys, buffered_weights = [], []
+    buffered_pairs = 0
+    reduced_keys, reduced_weights = [], []
+
+    for token_count in np.unique(lengths).tolist():
+        if token_count < 2:
+            continue
+
+        max_distance = token_count if strategy == "sentence" else window_size
+        left, right = get_pair_indices(token_count, max_distance, pair_index_cache)
+        if len(left) == 0:
+            continue
+
+        # one row per sentence of this length, processed in slices to bound the memory
+        sentence_starts = starts[lengths == token_count]
+        rows_per_slice = max(1, VECTORIZED_REDUCE_THRESHOLD // len(left))
+        for offset in range(0, len(sentence_starts), rows_per_slice):
+            ids = all_ids[sentence_starts[offset:offset + rows_per_slice, None] + np.arange(token_count)]
+            left_ids, right_ids = ids[:, left], ids[:, right]
+            keys = (np.minimum(left_ids, right_ids) * vocabulary_size + np.maximum(left_ids, right_ids)).ravel()
+            if strategy == "weighted_window":
+                weights = np.broadcast_to(1.0 / (right - left), left_ids.shape).ravel()
+            else:
+                weights = np.ones(len(keys))
+
+            buffered_keys.append(keys)
+            buffered_weights.append(weights)
+            buffered_pairs += len(keys)
+
+            if buffered_pairs >= VECTORIZED_REDUCE_THRESHOLD:
+                keys, weights = reduce_pairs(np.concatenate(buffered_keys), np.concatenate(buffered_weights))
+                reduced_keys.append(keys)
+                reduced_weights.append(weights)
+                buffered_keys, buffered_weights, buffered_pairs = [], [], 0
+
+    reduced_keys.extend(buffered_keys)
+    reduced_weights.extend(buffered_weights)
+    if not reduced_keys:
+        return {}
+
+    keys, weights = reduce_pairs(np.concatenate(reduced_keys), np.concatenate(reduced_weights))
+
+    # decode only the unique pairs
+    first_ids, second_ids = np.divmod(keys, vocabulary_size)
+    if strategy != "weighted_window":
+        weights = np.rint(weights).astype(np.int64)
+    return {
+        (vocabulary[first_id], vocabulary[second_id]): weight
+        for first_id, second_id, weight in zip(first_ids.tolist(), second_ids.tolist(), weights.tolist())
+    }
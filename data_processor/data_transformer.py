@@ -1,6 +1,5 @@
-import spacy
 import re
-from nltk.tokenize import word_tokenize, sent_tokenize
+from functools import lru_cache
 
 # function for converting a text into the relationships
 def get_low_level_concepts(text):
@@ -37,20 +36,24 @@ def get_german_stopwords():
 
     return stopwords
 
+@lru_cache(maxsize=None)
 def get_english_stopwords():
+    # the file is only read on the first call, a frozenset gives O(1) lookups
     with open("stopwords-en.txt", "r", encoding="utf-8") as file:
         stopwords = file.read().splitlines()
 
-    for i in range(len(stopwords)):
-        # if string starts with #, ignore it
-        if stopwords[i].startswith("#"):
-            continue
-        stopwords[i] = stopwords[i].strip()
+    # if string starts with #, ignore it
+    return frozenset(stopword.strip() for stopword in stopwords if not stopword.startswith("#"))
 
-    return stopwords
+# components needed for sentence segmentation (parser listens to tok2vec in the en_core_web_* models)
+SPACY_SENTENCE_COMPONENTS = {"tok2vec", "parser", "senter", "sentencizer"}
+
+def get_spacy_disabled_components(nlp, needed_components):
+    """Returns the pipeline components that are not needed and can be skipped by nlp.pipe."""
+    return [name for name in nlp.pipe_names if name not in needed_components]
 
 def get_spacy_sentences(nlp, text):
-    doc = nlp(text)
+    doc = next(nlp.pipe([text], disable=get_spacy_disabled_components(nlp, SPACY_SENTENCE_COMPONENTS)))
     sentences = [sent.text for sent in doc.sents]
     return sentences
 
@@ -60,36 +63,80 @@ def get_spacy_entities(nlp, text):
     return entities
 
 def get_spacy_tokens(nlp, text):
-    doc = nlp(text)
+    # token texts only depend on the tokenizer, the rest of the pipeline is not needed
+    doc = nlp.make_doc(text)
     tokens = [token.text for token in doc]
     return tokens
 
+def get_spacy_tokens_and_entities(nlp, text):
+    """Tokens and entities of a single parse, only the NER component is run."""
+    doc = next(nlp.pipe([text], disable=get_spacy_disabled_components(nlp, {"ner"})))
+    tokens = [token.text for token in doc]
+    entities = [(ent.text, ent.label_, ent.start_char, ent.end_char) for ent in doc.ents]
+    return tokens, entities
+
+def get_spacy_doc_analysis(doc):
+    """
+        Derives sentences, tokens, token offsets and entities from an already parsed Doc.
+        All character offsets are relative to the sentence. Entities are None if the NER component did not run.
+    """
+    with_entities = doc.has_annotation("ENT_IOB")
+    analysis = []
+    for sent in doc.sents:
+        analysis.append({
+            "text": sent.text,
+            "start_char": sent.start_char,
+            "end_char": sent.end_char,
+            "tokens": [token.text for token in sent],
+            "token_offsets": [(token.idx - sent.start_char, token.idx - sent.start_char + len(token.text)) for token in sent],
+            "entities": [(ent.text, ent.label_, ent.start_char - sent.start_char, ent.end_char - sent.start_char) for ent in sent.ents] if with_entities else None
+        })
+    return analysis
+
+def get_spacy_analysis(nlp, text, with_entities=False):
+    """
+        Parses the text exactly once and returns the sentences together with their tokens,
+        token offsets and (optionally) entities. Components not needed are disabled.
+    """
+    needed_components = SPACY_SENTENCE_COMPONENTS | ({"ner"} if with_entities else set())
+    doc = next(nlp.pipe([text], disable=get_spacy_disabled_components(nlp, needed_components)))
+    return get_spacy_doc_analysis(doc)
+
 def get_nltk_tokens(text):
+    # imported on first use, nltk is slow to import and only needed for the nltk tokenizer
+    from nltk.tokenize import word_tokenize
     words = word_tokenize(text)
     return words
 
 def get_nltk_sentences(text):
+    from nltk.tokenize import sent_tokenize
     sentences = sent_tokenize(text)
     return sentences
 
-def get_hlc_entities(session, text):
-    # get the text and id from entities in the database
-
-    result = session.run(
-        "MATCH (e:Entity) "
-        "return e.text as text, e.id as id"
-    )
-    entities = {record["id"]: record["text"] for record in result}
+async def get_hlc_entities(storage, text, entity_matcher=None):
+    """Entities whose text occurs in the text, once per entity with the offsets of the first occurrence."""
+    if entity_matcher is not None and entity_matcher.status == "ready":
+        # one pass over the text (Aho-Corasick), no query
+        matches = entity_matcher.find(text)
+    else:
+        # get the text and id from entities in the graph storage and filter them based on the text
+        entities = await storage.get_entity_texts()
+        matches = [(entity_id, entity_text, text.find(entity_text)) for entity_id, entity_text in entities.items() if entity_text and entity_text in text]
+        matches = [(entity_id, entity_text, start, start + len(entity_text)) for entity_id, entity_text, start in sorted(matches, key=lambda match: match[2])]
 
-    # filter the entities based on the text
     hlc_entities = []
-    for entity_id, entity_text in entities.items():
-        if entity_text in text:
-            hlc_entities.append({
-                "text": entity_text, 
-                "id": entity_id,
-                "recommended_by": "HLC",
-                })
+    found = set()
+    for entity_id, entity_text, start_char, end_char in matches:
+        if entity_id in found:
+            continue
+        found.add(entity_id)
+        hlc_entities.append({
+            "text": entity_text, 
+            "id": entity_id,
+            "start_char": start_char,
+            "end_char": end_char,
+            "recommended_by": "HLC",
+            })
     return hlc_entities
 
 def main():
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import os
+import time
+
+# entities created after the last build are matched by a plain scan, above this many the automaton is rebuilt (in a thread)
+ENTITY_MATCHER_PENDING = int(os.getenv("ENTITY_MATCHER_PENDING", "256"))
+
+class AhoCorasick:
+    """Aho-Corasick automaton, all patterns are added first, then build() creates the failure links."""
+
+    def __init__(self, patterns=()):
+        # one entry per state, state 0 is the root
+        self.children = [{}]        # character -> next state
+        self.fail = [0]             # longest proper suffix that is also a state
+        self.output_link = [0]      # next state on the fail chain that ends a pattern (0 = none)
+        self.outputs = [[]]         # [(key, pattern)] ending in the state
+        for key, pattern in patterns:
+            self.add(key, pattern)
+
+    def add(self, key, pattern):
+        state = 0
+        for character in pattern:
+            next_state = self.children[state].get(character)
+            if next_state is None:
+                next_state = len(self.children)
+                self.children.append({})
+                self.fail.append(0)
+                self.output_link.append(0)
+                self.outputs.append([])
+                self.children[state][character] = next_state
+            state = next_state
+        self.outputs[state].append((key, pattern))
+
+    def build(self):
+        """Failure and output links in breadth-first order, O(total length of the patterns)."""
+        queue = list(self.children[0].values())
+        for state in queue:
+            for character, next_state in self.children[state].items():
+                fallback = self.fail[state]
+                while fallback and character not in self.children[fallback]:
+                    fallback = self.fail[fallback]
+                # the children of the root fall back to the root
+                fail_state = self.children[fallback].get(character, 0) if state else 0
+                self.fail[next_state] = fail_state
+                self.output_link[next_state] = fail_state if self.outputs[fail_state] else self.output_link[fail_state]
+                queue.append(next_state)
+        return self
+
+    def find(self, text):
+        """All occurrences as [(key, pattern, start, end)], overlapping ones included."""
+        matches = []
+        state = 0
+        for position, character in enumerate(text):
+            while state and character not in self.children[state]:
+                state = self.fail[state]
+            state = self.children[state].get(character, 0)
+
+            match_state = state if self.outputs[state] else self.output_link[state]
+            while match_state:
+                for key, pattern in self.outputs[match_state]:
+                    matches.append((key, pattern, position + 1 - len(pattern), position + 1))
+                match_state = self.output_link[match_state]
+        return matches
+
+def build_automaton(entity_texts):
+    return AhoCorasick(entity_texts.items()).build()
+
+class EntityMatcher:
+    """
+        Finds the entities mentioned in a text with one pass over the text (Aho-Corasick over the texts
+        of all entities), independent of the number of entities in the workspace.
+
+        Built at startup from the graph storage (build). Entities created later (add) are matched by a
+        scan until ENTITY_MATCHER_PENDING of them are collected, then the automaton is rebuilt in a
+        thread and swapped in.
+    """
+
+    def __init__(self, pending_limit=None):
+        self.pending_limit = pending_limit or ENTITY_MATCHER_PENDING
+        self.entity_texts = {}      # entity id -> text
+        self.automaton = AhoCorasick().build()
+        self.pending = {}           # entity id -> text, not in the automaton yet
+        self.rebuild_task = None
+        self.status = "empty"
+        self.build_seconds = None
+
+    def add(self, entity_id, text):
+        """Adds an entity, entities without text or that are already known are ignored."""
+        if not text or entity_id in self.entity_texts:
+            return
+        self.entity_texts[entity_id] = text
+        self.pending[entity_id] = text
+        if len(self.pending) >= self.pending_limit and self.rebuild_task is None and self.status == "ready":
+            self.rebuild_task = asyncio.create_task(self.rebuild())
+
+    async def rebuild(self):
+        try:
+            entity_texts = dict(self.entity_texts)
+            self.automaton = await asyncio.to_thread(build_automaton, entity_texts)
+            for entity_id in entity_texts:
+                self.pending.pop(entity_id, None)
+        except Exception:
+            logging.exception("Rebuilding the entity matcher failed")
+        finally:
+            self.rebuild_task = None
+
+    def find(self, text):
+        """All occurrences as [(entity_id, entity_text, start_char, end_char)] in the order of the text."""
+        matches = self.automaton.find(text)
+        for entity_id, entity_text in self.pending.items():
+            start = text.find(entity_text)
+            while start != -1:
+                matches.append((entity_id, entity_text, start, start + len(entity_text)))
+                start = text.find(entity_text, start + 1)
+        if self.pending:
+            matches.sort(key=lambda match: (match[2], match[3]))
+        return matches
+
+    async def build(self, storage):
+        start_time = time.perf_counter()
+        self.status = "building"
+        try:
+            for entity_id, text in (await storage.get_entity_texts()).items():
+                self.add(entity_id, text)
+            await self.rebuild()
+        except Exception:
+            self.status = "failed"
+            raise
+        self.status = "ready"
+        self.build_seconds = round(time.perf_counter() - start_time, 3)
+
+    def get_stats(self):
+        return {
+            "status": self.status,
+            "build_seconds": self.build_seconds,
+            "entities": len(self.entity_texts),
+            "pending": len(self.pending),
+            "states": len(self.automaton.children)
+        }
@@ -0,0 +1,83 @@
+import hashlib
+import os
+import re
+from collections import defaultdict
+
+import numpy as np
+
+# hash functions per signature (a changed value recomputes the signatures of all extractions on the next startup)
+MINHASH_PERMUTATIONS = int(os.getenv("MINHASH_PERMUTATIONS", "128"))
+# words per shingle, shingles do not cross sentence boundaries
+MINHASH_SHINGLE_SIZE = int(os.getenv("MINHASH_SHINGLE_SIZE", "3"))
+
+# (a * x + b) mod p with x < p < 2^31 stays below 2^63, so it is computed in uint64 without overflow
+MERSENNE_PRIME = (1 << 31) - 1
+# shingles that are hashed at once, bounds the (permutations x shingles) matrix
+SIGNATURE_CHUNK_SIZE = 4096
+
+word_pattern = re.compile(r"\w+")
+
+def get_permutations(permutations=None):
+    """Coefficients (a, b) of the hash functions, fixed seed, so signatures of different processes and runs are comparable."""
+    generator = np.random.default_rng(1)
+    count = permutations or MINHASH_PERMUTATIONS
+    return (
+        generator.integers(1, MERSENNE_PRIME, size=count, dtype=np.uint64),
+        generator.integers(0, MERSENNE_PRIME, size=count, dtype=np.uint64)
+    )
+
+PERMUTATIONS = get_permutations()
+
+def get_shingles(text, size=None):
+    """Word n-grams (lower case) of a sentence, a sentence shorter than size is a single shingle."""
+    size = size or MINHASH_SHINGLE_SIZE
+    words = word_pattern.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def hash_shingle(shingle):
+    # stable across processes (unlike hash()), the signatures are stored in the graph
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little") % MERSENNE_PRIME
+
+def get_signature(texts):
+    """MinHash signature (list of MINHASH_PERMUTATIONS ints) of the shingles of all texts, None without shingles."""
+    shingles = set()
+    for text in texts:
+        shingles.update(get_shingles(text))
+    if not shingles:
+        return None
+
+    a, b = PERMUTATIONS
+    hashes = np.fromiter((hash_shingle(shingle) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+    signature = np.full(len(a), MERSENNE_PRIME, dtype=np.uint64)
+    for start in range(0, len(hashes), SIGNATURE_CHUNK_SIZE):
+        chunk = hashes[start:start + SIGNATURE_CHUNK_SIZE]
+        values = (a[:, None] * chunk[None, :] + b[:, None]) % MERSENNE_PRIME
+        np.minimum(signature, values.min(axis=1), out=signature)
+    return signature.tolist()
+
+def get_extraction_signatures(rows):
+    """{extraction_id: signature} of HLC rows or links ({extraction_id, text}) grouped by extraction."""
+    texts = defaultdict(list)
+    for row in rows:
+        if row.get("text"):
+            texts[row["extraction_id"]].append(row["text"])
+    signatures = {}
+    for extraction_id, extraction_texts in texts.items():
+        signature = get_signature(extraction_texts)
+        if signature is not None:
+            signatures[extraction_id] = signature
+    return signatures
+
+def merge_signatures(signature, other):
+    """Signature of the union of both shingle sets (a signature of another length is replaced)."""
+    if signature is None or len(signature) != len(other):
+        return list(other)
+    return [min(value, other_value) for value, other_value in zip(signature, other)]
+
+def estimate_similarity(signature, other):
+    """Estimated Jaccard similarity of the shingle sets: the share of equal values."""
+    if not signature or len(signature) != len(other):
+        return 0.0
+    return sum(value == other_value for value, other_value in zip(signature, other)) / len(signature)
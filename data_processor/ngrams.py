@@ -0,0 +1,37 @@
+from collections import Counter
+
+# n-gram sizes of the n-gram index (duograms, trigrams, quadruplograms)
+NGRAM_SIZES = (2, 3, 4)
+
+def get_ngrams(tokens):
+    """
+        Distinct n-grams of a sentence as phrases (words joined by a space), in the order of the sentence.
+        The tokens have to be filtered already (token_filter: no stopwords and signs), a stopword between two
+        words is skipped ("graphs of knowledge" -> "graphs knowledge"). Stopword MLCs are never part of an
+        n-gram, even if they got RELATED_TO relationships in another way (e.g. POST /relationships).
+    """
+    return list(dict.fromkeys(
+        " ".join(tokens[i:i + size])
+        for size in NGRAM_SIZES
+        for i in range(len(tokens) - size + 1)
+    ))
+
+def count_ngrams(hlc_rows):
+    """
+        Aggregates the "ngrams" of HLC rows into the rows of the n-gram index:
+        - global rows [{phrase, frequency}], frequency = number of HLCs containing the phrase
+        - extraction rows [{extraction_id, phrase, frequency}], the same per extraction
+    """
+    phrase_counts = Counter()
+    extraction_counts = Counter()
+    for row in hlc_rows:
+        for phrase in row.get("ngrams") or ():
+            phrase_counts[phrase] += 1
+            extraction_counts[(row["extraction_id"], phrase)] += 1
+
+    global_rows = [{"phrase": phrase, "frequency": frequency} for phrase, frequency in phrase_counts.items()]
+    extraction_rows = [
+        {"extraction_id": extraction_id, "phrase": phrase, "frequency": frequency}
+        for (extraction_id, phrase), frequency in extraction_counts.items()
+    ]
+    return global_rows, extraction_rows
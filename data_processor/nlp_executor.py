@@ -0,0 +1,244 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from fastapi import HTTPException
+
+from data_processor.data_transformer import get_spacy_entities, get_spacy_tokens, get_spacy_tokens_and_entities
+from data_processor.tokenizers import create_tokenizers, get_tokenizer
+
+SPACY_MODEL = os.getenv("SPACY_MODEL", "en_core_web_sm")
+# components that are not needed (sentences come from the parser, entities from ner), they are not loaded at all
+SPACY_EXCLUDE = [name.strip() for name in os.getenv("SPACY_EXCLUDE", "tagger,attribute_ruler,lemmatizer").split(",") if name.strip()]
+
+# interactive lane: threads sharing the loaded model, for short texts (queries, single HLCs)
+NLP_THREAD_WORKERS = int(os.getenv("NLP_THREAD_WORKERS", "2"))
+# document lane: processes with their own preloaded model, for long texts (0 = a single extra thread instead)
+NLP_PROCESS_WORKERS = int(os.getenv("NLP_PROCESS_WORKERS", "1"))
+# texts with at least this many characters go to the document lane
+NLP_PROCESS_THRESHOLD = int(os.getenv("NLP_PROCESS_THRESHOLD", "20000"))
+# tasks per lane that may be running or waiting, further callers wait for a free slot (backpressure)
+NLP_MAX_PENDING = int(os.getenv("NLP_MAX_PENDING", "32"))
+NLP_MAX_PENDING_DOCUMENTS = int(os.getenv("NLP_MAX_PENDING_DOCUMENTS", "8"))
+# seconds a request waits for a free slot before it is rejected (503)
+NLP_QUEUE_TIMEOUT = float(os.getenv("NLP_QUEUE_TIMEOUT", "10"))
+
+def task_analyse(nlp, tokenizers, tokenizer_name, text):
+    return get_tokenizer(tokenizers, tokenizer_name).analyse(text)
+
+def task_tokens(nlp, tokenizers, text):
+    return get_spacy_tokens(nlp, text)
+
+def task_tokens_and_entities(nlp, tokenizers, text):
+    return get_spacy_tokens_and_entities(nlp, text)
+
+def task_entities(nlp, tokenizers, text):
+    return get_spacy_entities(nlp, text)
+
+# name -> function(nlp, tokenizers, *args), names are sent to the worker processes instead of functions
+NLP_TASKS = {
+    "analyse": task_analyse,
+    "tokens": task_tokens,
+    "tokens_and_entities": task_tokens_and_entities,
+    "entities": task_entities,
+}
+
+def load_spacy_model(model_name, exclude=None):
+    """Loads the model without the excluded components, None gives a blank english pipeline with the rule-based sentencizer."""
+    # imported on first use, importing spacy alone takes about half a second
+    import spacy
+
+    if model_name is None:
+        nlp = spacy.blank("en")
+        nlp.add_pipe("sentencizer")
+        return nlp
+    return spacy.load(model_name, exclude=exclude or [])
+
+# model and tokenizers of a worker process, loaded once by init_worker
+worker_context = None
+
+def init_worker(model_name, exclude=None):
+    global worker_context
+    nlp = load_spacy_model(model_name, exclude)
+    worker_context = (nlp, create_tokenizers(nlp))
+    logging.info(f"NLP worker {os.getpid()} loaded model {model_name}")
+
+def run_worker_task(task, *args):
+    nlp, tokenizers = worker_context
+    return NLP_TASKS[task](nlp, tokenizers, *args)
+
+class NlpExecutorBusy(Exception):
+    """Raised when no slot got free within the queue timeout."""
+
+class NlpLane:
+    """Executor with a bounded number of pending tasks."""
+
+    def __init__(self, name, executor, max_pending):
+        self.name = name
+        self.executor = executor
+        self.max_pending = max_pending
+        self.slots = asyncio.Semaphore(max_pending)
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.seconds = 0.0
+
+    def release_if_acquired(self, acquire):
+        if not acquire.cancelled() and acquire.exception() is None:
+            self.slots.release()
+
+    async def acquire_slot(self, timeout):
+        """
+            True if a slot was acquired within timeout (None waits for a slot). No wait_for: on Python 3.11 it
+            can time out after the acquire succeeded, the slot would be lost for good.
+        """
+        if timeout is None:
+            await self.slots.acquire()
+            return True
+
+        acquire = asyncio.ensure_future(self.slots.acquire())
+        try:
+            await asyncio.wait({acquire}, timeout=timeout)
+        except asyncio.CancelledError:
+            acquire.cancel()
+            acquire.add_done_callback(self.release_if_acquired)
+            raise
+        if acquire.done():
+            return True
+        # an acquire that completes anyway gives its slot back
+        acquire.cancel()
+        acquire.add_done_callback(self.release_if_acquired)
+        return False
+
+    async def run(self, function, timeout, executor=None):
+        self.waiting += 1
+        try:
+            acquired = await self.acquire_slot(timeout)
+        finally:
+            self.waiting -= 1
+        if not acquired:
+            self.rejected += 1
+            raise NlpExecutorBusy(f"NLP {self.name} queue is full ({self.max_pending} tasks pending)")
+
+        self.running += 1
+        start_time = time.perf_counter()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(executor or self.executor, function)
+            self.completed += 1
+            return result
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.seconds += time.perf_counter() - start_time
+            self.running -= 1
+            self.slots.release()
+
+    def get_stats(self):
+        finished = self.completed + self.failed
+        return {
+            "max_pending": self.max_pending,
+            "waiting": self.waiting,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "average_seconds": round(self.seconds / finished, 4) if finished else None
+        }
+
+class NlpExecutor:
+    """
+        Runs spaCy/NLTK work off the event loop. Short texts go to a thread pool that shares the
+        loaded model, long documents to a process pool where every worker preloads the model, so
+        tokenizing a document does not hold the GIL for the interactive endpoints.
+    """
+
+    def __init__(self, nlp, tokenizers, model_name, exclude=None, thread_workers=None, process_workers=None, process_threshold=None,
+                 max_pending=None, max_pending_documents=None, queue_timeout=None):
+        self.nlp = nlp
+        self.tokenizers = tokenizers
+        self.model_name = model_name
+        self.process_threshold = process_threshold or NLP_PROCESS_THRESHOLD
+        self.queue_timeout = queue_timeout or NLP_QUEUE_TIMEOUT
+        self.process_workers = NLP_PROCESS_WORKERS if process_workers is None else process_workers
+
+        thread_pool = ThreadPoolExecutor(max_workers=thread_workers or NLP_THREAD_WORKERS, thread_name_prefix="nlp")
+        if self.process_workers > 0:
+            # spawn, a fork of the running server (event loop, driver threads) is not safe
+            document_pool = ProcessPoolExecutor(
+                max_workers=self.process_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker,
+                initargs=(model_name, exclude)
+            )
+        else:
+            document_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nlp-documents")
+
+        # batches of documents (run_batch) use the slots of the document lane
+        self.batch_pool = ThreadPoolExecutor(max_workers=max_pending_documents or NLP_MAX_PENDING_DOCUMENTS, thread_name_prefix="nlp-batches")
+        self.interactive = NlpLane("interactive", thread_pool, max_pending or NLP_MAX_PENDING)
+        self.documents = NlpLane("documents", document_pool, max_pending_documents or NLP_MAX_PENDING_DOCUMENTS)
+
+    def select_lane(self, text):
+        return self.documents if len(text) >= self.process_threshold else self.interactive
+
+    async def run(self, task, text, *args, block=False):
+        """
+            Runs a task of NLP_TASKS on the text. Waits up to queue_timeout seconds for a free slot and
+            raises NlpExecutorBusy otherwise, block=True waits without limit (background jobs).
+        """
+        timeout = None if block else self.queue_timeout
+        lane = self.select_lane(text)
+        if lane is self.documents and self.process_workers > 0:
+            function = partial(run_worker_task, task, *args, text)
+        else:
+            function = partial(NLP_TASKS[task], self.nlp, self.tokenizers, *args, text)
+        return await lane.run(function, timeout)
+
+    async def run_batch(self, function, block=False):
+        """
+            Runs a batch function of the main process (e.g. helper_test.prepare_bulk) with a slot of the document lane.
+            It runs in a thread of its own, it uses the loaded model and may start its own processes (nlp.pipe n_process).
+        """
+        timeout = None if block else self.queue_timeout
+        return await self.documents.run(function, timeout, executor=self.batch_pool)
+
+    async def analyse(self, tokenizer_name, text, block=False):
+        """Sentences and tokens of the text with the given tokenizer backend (see TokenizerBackend.analyse)."""
+        return await self.run("analyse", text, tokenizer_name, block=block)
+
+    async def tokens(self, text, block=False):
+        return await self.run("tokens", text, block=block)
+
+    async def tokens_and_entities(self, text, block=False):
+        return await self.run("tokens_and_entities", text, block=block)
+
+    async def entities(self, text, block=False):
+        return await self.run("entities", text, block=block)
+
+    def get_stats(self):
+        return {
+            "process_workers": self.process_workers,
+            "process_threshold": self.process_threshold,
+            "queue_timeout": self.queue_timeout,
+            "interactive": self.interactive.get_stats(),
+            "documents": self.documents.get_stats()
+        }
+
+    def shutdown(self):
+        self.interactive.executor.shutdown(wait=False, cancel_futures=True)
+        self.documents.executor.shutdown(wait=False, cancel_futures=True)
+        self.batch_pool.shutdown(wait=False, cancel_futures=True)
+
+def require_nlp(request):
+    """Raises 503 while the NLP pipeline is still loading (NLP_STARTUP=background) or if loading failed."""
+    status = getattr(request.app.state, "nlp_status", "ready")
+    if status != "ready":
+        detail = "NLP pipeline is still loading, see GET /ready" if status == "loading" else f"NLP pipeline is not available: {request.app.state.nlp_error}"
+        raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": "5"})
@@ -2,6 +2,12 @@ import time
 from docling.document_converter import DocumentConverter
 import os
 import json
+import argparse
+import hashlib
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
 
 def docling_test(source, filename, destination_folder):
     os.makedirs(destination_folder, exist_ok=True)
@@ -39,20 +45,139 @@ def docling_test(source, filename, destination_folder):
 
     return diff_time
 
+MANIFEST_FILE = "manifest.json"
+OUTPUT_FORMATS = ["md", "html", "json"]
+
+def get_content_hash(path):
+    """sha256 of the file content, renamed or duplicated PDFs get the same hash."""
+    content_hash = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            content_hash.update(block)
+    return content_hash.hexdigest()
+
+def get_output_paths(destination_folder, content_hash):
+    return {output_format: os.path.join(destination_folder, f"{content_hash}.{output_format}") for output_format in OUTPUT_FORMATS}
+
+def load_manifest(destination_folder):
+    manifest_path = os.path.join(destination_folder, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {"documents": {}, "runs": []}
+    with open(manifest_path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+def save_manifest(destination_folder, manifest):
+    # written to a temporary file first, an interrupted run never leaves a broken manifest
+    manifest_path = os.path.join(destination_folder, MANIFEST_FILE)
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(manifest, file, ensure_ascii=False, indent=4)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+# one converter per worker process, loading the docling models is the expensive part
+worker_converter = None
+
+def init_worker():
+    global worker_converter
+    worker_converter = DocumentConverter()
+
+def convert_document(source, content_hash, destination_folder):
+    """Converts one PDF with the converter of the worker, the outputs are named after the content hash."""
+    start_time = time.time()
+    result = worker_converter.convert(source)
+    outputs = get_output_paths(destination_folder, content_hash)
+
+    with open(outputs["md"], "w", encoding="utf-8") as f:
+        f.write(result.document.export_to_markdown())
+
+    with open(outputs["html"], "w", encoding="utf-8") as f:
+        f.write(result.document.export_to_html())
+
+    with open(outputs["json"], "w", encoding="utf-8") as f:
+        json.dump(result.document.export_to_dict(), f, ensure_ascii=False, indent=4)
+
+    return {"seconds": round(time.time() - start_time, 2), "outputs": {output_format: os.path.basename(path) for output_format, path in outputs.items()}}
+
+def convert_folder(folder_path, destination_folder, workers=None, recursive=False):
+    """
+    Converts all PDFs of the folder to markdown, html and json with a process pool.
+    Outputs are keyed by content hash and listed in manifest.json of the destination folder,
+    PDFs whose hash is already converted (also under another name) are skipped.
+    """
+    os.makedirs(destination_folder, exist_ok=True)
+    start_time = time.time()
+    manifest = load_manifest(destination_folder)
+    documents = manifest["documents"]
+
+    if recursive:
+        sources = [os.path.join(root, filename) for root, _, filenames in os.walk(folder_path) for filename in filenames if filename.lower().endswith(".pdf")]
+    else:
+        sources = [os.path.join(folder_path, filename) for filename in os.listdir(folder_path) if filename.lower().endswith(".pdf")]
+
+    # hash -> PDFs with this content, every content is converted once
+    pending = {}
+    for source in sorted(sources):
+        content_hash = get_content_hash(source)
+        document = documents.setdefault(content_hash, {"files": [], "status": "pending"})
+        if source not in document["files"]:
+            document["files"].append(source)
+
+        outputs_exist = all(os.path.exists(path) for path in get_output_paths(destination_folder, content_hash).values())
+        if document["status"] == "converted" and outputs_exist:
+            continue
+        pending.setdefault(content_hash, source)
+
+    skipped = len(sources) - len(pending)
+    print(f"{len(sources)} PDFs found, {len(pending)} to convert, {skipped} already converted or duplicates")
+    save_manifest(destination_folder, manifest)
+
+    converted = 0
+    failed = 0
+    if pending:
+        workers = workers or os.cpu_count() or 1
+        # spawn, every worker creates its own converter in init_worker
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending)), mp_context=multiprocessing.get_context("spawn"), initializer=init_worker) as pool:
+            futures = {pool.submit(convert_document, source, content_hash, destination_folder): content_hash for content_hash, source in pending.items()}
+            for future in as_completed(futures):
+                content_hash = futures[future]
+                document = documents[content_hash]
+                try:
+                    document.update(future.result())
+                    document.update({"status": "converted", "converted_at": datetime.now().isoformat(), "error": None})
+                    converted += 1
+                    print(f"Converted {pending[content_hash]} in {document['seconds']:.2f} seconds")
+                except Exception as error:
+                    logging.exception(f"Conversion of {pending[content_hash]} failed")
+                    document.update({"status": "failed", "error": str(error)})
+                    failed += 1
+                # after every document, an interrupted run keeps its progress
+                save_manifest(destination_folder, manifest)
+
+    run = {
+        "started_at": datetime.fromtimestamp(start_time).isoformat(),
+        "source": folder_path,
+        "found": len(sources),
+        "converted": converted,
+        "failed": failed,
+        "skipped": skipped,
+        "seconds": round(time.time() - start_time, 2)
+    }
+    manifest["runs"].append(run)
+    save_manifest(destination_folder, manifest)
+    return run
+
 if __name__ == "__main__":
     # docling_test("C:/Users/Zaphare/OneDrive - FHNW/0_MSC/0_Thesis/Research_Papers/KGG/KGG_3.pdf", "KGG_7", "C:/Users/Zaphare/OneDrive - FHNW/0_MSC/0_Thesis/Research_Papers/KGG/conversion")
 
-    time_tracker = {}
-
     # scan os folder and convert all pdf files
     folder_path_pc = "C:/Users/Zaphare/OneDrive - FHNW/0_MSC/0_Thesis/Research_Papers/KGG/"
     folder_path = "C:/Users/lukas/OneDrive - FHNW/0_MSC/0_Thesis/Research_Papers/KGG/"
 
-    for filename in os.listdir(folder_path):
-        if filename.endswith(".pdf"):
-            time_spent = docling_test(os.path.join(folder_path, filename), filename.replace(".pdf", ""), "C:/Users/lukas/OneDrive - FHNW/0_MSC/0_Thesis/Research_Papers/KGG/conversion")
-            time_tracker[filename] = time_spent
+    parser = argparse.ArgumentParser(description="Convert all PDFs of a folder with docling (incremental, keyed by content hash).")
+    parser.add_argument("--source", default=folder_path, help="Folder with the PDF files")
+    parser.add_argument("--destination", default=os.path.join(folder_path, "conversion"), help="Folder for the outputs and manifest.json")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: number of cores)")
+    parser.add_argument("--recursive", action="store_true", help="Also convert PDFs in subfolders")
+    args = parser.parse_args()
 
-    # Print the time taken for each file
-    for pdf_file, time_taken in time_tracker.items():
-        print(f"Time taken for {pdf_file}: {time_taken:.2f} seconds")
\ No newline at end of file
+    run = convert_folder(args.source, args.destination, workers=args.workers, recursive=args.recursive)
+    print(f"Converted {run['converted']}, failed {run['failed']}, skipped {run['skipped']} of {run['found']} PDFs in {run['seconds']:.2f} seconds")
@@ -0,0 +1,100 @@
+import asyncio
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# processes extracting pages, pypdf is pure Python so threads would not run in parallel
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+# pages per task, a worker opens the PDF once per task
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+
+def get_page_count(path):
+    # imported in the worker processes only, keeps the startup of the API fast
+    from pypdf import PdfReader
+
+    return len(PdfReader(path).pages)
+
+def extract_page_range(path, start, end):
+    """Text of the pages start..end-1 as [(page_number, text)], page numbers start at 1."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    return [(page_number + 1, reader.pages[page_number].extract_text() or "") for page_number in range(start, end)]
+
+def spool_upload(file):
+    """Copies an upload (file object) to a temporary PDF file, the worker processes read it from there."""
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as spooled_file:
+        shutil.copyfileobj(file, spooled_file, length=1024 * 1024)
+        return spooled_file.name
+
+def remove_spooled_file(path):
+    """Removes a file of spool_upload, a second call does nothing."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+class PdfExtractor:
+    """
+        Extracts the text of PDF pages in parallel with a process pool (created on first use).
+        Pages are yielded in order as soon as they are extracted, so long documents can be streamed.
+    """
+
+    def __init__(self, workers=None, pages_per_task=None):
+        self.workers = workers or PDF_WORKERS
+        self.pages_per_task = pages_per_task or PDF_PAGES_PER_TASK
+        self.pool = None
+
+    def get_pool(self):
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self.pool
+
+    def reset_pool(self, pool):
+        """Drops a pool with a dead worker (e.g. pypdf crashed on a PDF), the next call creates a new one."""
+        if self.pool is pool:
+            self.pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    async def iter_pages(self, path):
+        """
+            Yields (page_number, text, page_count) in page order. BrokenProcessPool if a worker died,
+            only this call fails, the following ones get a new pool.
+        """
+        loop = asyncio.get_running_loop()
+        pool = self.get_pool()
+        pending = []
+        try:
+            page_count = await loop.run_in_executor(pool, get_page_count, path)
+
+            ranges = [(start, min(start + self.pages_per_task, page_count)) for start in range(0, page_count, self.pages_per_task)]
+            # at most two tasks per worker are in flight, extracted pages wait in memory until they are yielded
+            max_in_flight = self.workers * 2
+            next_range = 0
+            while next_range < len(ranges) or pending:
+                while next_range < len(ranges) and len(pending) < max_in_flight:
+                    start, end = ranges[next_range]
+                    pending.append(loop.run_in_executor(pool, extract_page_range, path, start, end))
+                    next_range += 1
+
+                # the oldest task first, keeps the pages in order while the later ones run
+                for page_number, text in await pending.pop(0):
+                    yield page_number, text, page_count
+        except BrokenProcessPool:
+            self.reset_pool(pool)
+            raise
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def extract_text(self, path):
+        # a line break after every page, like the text of the sequential extraction
+        return "".join([text + "\n" async for _, text, _ in self.iter_pages(path)])
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
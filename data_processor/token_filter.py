@@ -0,0 +1,40 @@
+from functools import lru_cache
+
+from data_processor.data_transformer import get_english_stopwords
+
+# grammatical signs that are never used as MLCs in RELATED_TO relationships
+STOPSIGNS = frozenset({" ", ".", ",", ":", ";", "!", "?", "-", "_", "(", ")", "[", "]", "{", "}", "", "\n", "\"", "'", "/", "\n\n"})
+
+class TokenFilter:
+    """
+        Normalization and filter rules for tokens, shared by the ingestion (RELATED_TO relationships)
+        and the search. Built once, all checks are set lookups.
+    """
+
+    def __init__(self, stopwords, stopsigns=STOPSIGNS):
+        self.stopwords = frozenset(stopwords)
+        self.stopsigns = frozenset(stopsigns)
+
+    def is_relevant(self, token):
+        """True if the token is neither a sign nor a stopword (case-insensitive)."""
+        return token not in self.stopsigns and token.lower() not in self.stopwords
+
+    def filter(self, tokens):
+        """Removes signs and stopwords, keeps the original spelling and order."""
+        return [token for token in tokens if token not in self.stopsigns and token.lower() not in self.stopwords]
+
+    def remove_stopsigns(self, tokens):
+        return [token for token in tokens if token not in self.stopsigns]
+
+    def normalize(self, token):
+        return token.strip().lower()
+
+    def search_terms(self, tokens):
+        """Normalized (stripped, lower case) tokens without empty tokens and stopwords, used by /nodes/search."""
+        terms = (self.normalize(token) for token in tokens)
+        return [term for term in terms if term and term not in self.stopwords]
+
+@lru_cache(maxsize=None)
+def get_token_filter():
+    """The default (english) token filter, only built on the first call."""
+    return TokenFilter(get_english_stopwords())
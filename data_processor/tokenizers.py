@@ -0,0 +1,140 @@
+import os
+import re
+
+from data_processor.data_transformer import (
+    SPACY_SENTENCE_COMPONENTS,
+    get_nltk_sentences,
+    get_nltk_tokens,
+    get_spacy_analysis,
+    get_spacy_disabled_components,
+    get_spacy_doc_analysis,
+    get_spacy_sentences,
+    get_spacy_tokens,
+)
+
+# server default, can be overwritten per extraction with ExtractionCreateModel.tokenizer
+DEFAULT_TOKENIZER = os.getenv("TOKENIZER_BACKEND", "spacy")
+# the spacy backend also runs NER while ingesting, the entities are stored with the HLCs (see GET /hlc/{hlc_id})
+INGESTION_ENTITIES = os.getenv("INGESTION_ENTITIES", "true").lower() == "true"
+
+def get_token_offsets(text, tokens):
+    """
+        (start, end) of every token in the text, searched from left to right.
+        None if a token is not part of the text (e.g. NLTK replaces quotes).
+    """
+    offsets = []
+    position = 0
+    for token in tokens:
+        start = text.find(token, position)
+        if start == -1:
+            return None
+        offsets.append((start, start + len(token)))
+        position = start + len(token)
+    return offsets
+
+class TokenizerBackend:
+    """
+        Interface of a tokenizer backend. A backend splits a text into sentences (HLCs)
+        and sentences into tokens (MLCs).
+    """
+    name = None
+
+    def sentences(self, text):
+        raise NotImplementedError
+
+    def tokenize(self, text):
+        raise NotImplementedError
+
+    def analyse(self, text):
+        """
+            Sentences of the text together with their tokens: [{"text": ..., "tokens": [...], "token_offsets": [...]}].
+            Backends with NER also return the "entities" of every sentence.
+        """
+        analysis = []
+        for sentence in self.sentences(text):
+            tokens = self.tokenize(sentence)
+            analysis.append({"text": sentence, "tokens": tokens, "token_offsets": get_token_offsets(sentence, tokens)})
+        return analysis
+
+    def analyse_many(self, texts, batch_size=50, n_process=1):
+        """analyse for multiple texts, backends can override this to process batches."""
+        for text in texts:
+            yield self.analyse(text)
+
+class SpacyTokenizer(TokenizerBackend):
+    """spaCy pipeline (en_core_web_sm), sentences and tokens come from a single parse."""
+    name = "spacy"
+
+    def __init__(self, nlp):
+        self.nlp = nlp
+
+    def sentences(self, text):
+        return get_spacy_sentences(self.nlp, text)
+
+    def tokenize(self, text):
+        return get_spacy_tokens(self.nlp, text)
+
+    def analyse(self, text):
+        return get_spacy_analysis(self.nlp, text, with_entities=INGESTION_ENTITIES)
+
+    def analyse_many(self, texts, batch_size=50, n_process=1):
+        needed_components = SPACY_SENTENCE_COMPONENTS | ({"ner"} if INGESTION_ENTITIES else set())
+        disabled_components = get_spacy_disabled_components(self.nlp, needed_components)
+        for doc in self.nlp.pipe(texts, batch_size=batch_size, n_process=n_process, disable=disabled_components):
+            yield get_spacy_doc_analysis(doc)
+
+class NltkTokenizer(TokenizerBackend):
+    """NLTK punkt sentence splitter and word_tokenize (requires the punkt_tab data)."""
+    name = "nltk"
+
+    def sentences(self, text):
+        return get_nltk_sentences(text)
+
+    def tokenize(self, text):
+        return get_nltk_tokens(text)
+
+class RegexTokenizer(TokenizerBackend):
+    """
+        Fast rule-based tokenizer without a model: sentences end at . ! ? followed by whitespace
+        or at blank lines, tokens are words (incl. inner hyphens/apostrophes), numbers and single signs.
+    """
+    name = "regex"
+
+    sentence_pattern = re.compile(r"(?<=[.!?])\s+(?=\S)|\n\s*\n")
+    token_pattern = re.compile(r"\w+(?:[-'’.]\w+)*|[^\w\s]")
+
+    def sentences(self, text):
+        return [sentence.strip() for sentence in self.sentence_pattern.split(text) if sentence.strip()]
+
+    def tokenize(self, text):
+        return self.token_pattern.findall(text)
+
+# name -> factory(nlp), register additional backends with register_tokenizer
+TOKENIZER_BACKENDS = {}
+
+def register_tokenizer(name, factory):
+    """Registers a tokenizer backend. The factory gets the loaded spaCy model (or None) and returns a TokenizerBackend."""
+    TOKENIZER_BACKENDS[name] = factory
+
+def get_tokenizer_names():
+    return list(TOKENIZER_BACKENDS.keys())
+
+def create_tokenizer(name, nlp=None):
+    if name not in TOKENIZER_BACKENDS:
+        raise ValueError(f"Invalid tokenizer '{name}'. Choose from: {', '.join(get_tokenizer_names())}")
+    return TOKENIZER_BACKENDS[name](nlp)
+
+def create_tokenizers(nlp=None):
+    """Creates an instance of every registered backend, used at startup (app.state.tokenizers)."""
+    return {name: create_tokenizer(name, nlp) for name in TOKENIZER_BACKENDS}
+
+def get_tokenizer(tokenizers, name=None):
+    """Selects a backend by name (default: TOKENIZER_BACKEND) from the instances created by create_tokenizers."""
+    name = name or DEFAULT_TOKENIZER
+    if name not in tokenizers:
+        raise ValueError(f"Invalid tokenizer '{name}'. Choose from: {', '.join(tokenizers.keys())}")
+    return tokenizers[name]
+
+register_tokenizer("spacy", SpacyTokenizer)
+register_tokenizer("nltk", lambda nlp: NltkTokenizer())
+register_tokenizer("regex", lambda nlp: RegexTokenizer())
@@ -0,0 +1,85 @@
+import logging
+import os
+import time
+
+# upper bounds for a single transaction, a chunk is closed as soon as one of them is reached
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "5000"))
+WRITE_BATCH_MAX_BYTES = int(os.getenv("WRITE_BATCH_MAX_BYTES", str(4 * 1024 * 1024)))
+
+def estimate_size(value):
+    """Rough estimate of the size of a query parameter in bytes (strings dominate our rows)."""
+    if isinstance(value, str):
+        return len(value) + 8
+    if isinstance(value, dict):
+        return sum(len(key) + estimate_size(item) for key, item in value.items()) + 8
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(item) for item in value) + 8
+    return 8
+
+def chunk_rows(rows, batch_size=None, max_bytes=None):
+    """Splits rows into chunks of at most batch_size rows and (approximately) max_bytes."""
+    batch_size = batch_size or WRITE_BATCH_SIZE
+    max_bytes = max_bytes or WRITE_BATCH_MAX_BYTES
+
+    chunk = []
+    chunk_bytes = 0
+    for row in rows:
+        row_bytes = estimate_size(row)
+        if chunk and (len(chunk) >= batch_size or chunk_bytes + row_bytes > max_bytes):
+            yield chunk
+            chunk = []
+            chunk_bytes = 0
+        chunk.append(row)
+        chunk_bytes += row_bytes
+
+    if chunk:
+        yield chunk
+
+async def write_batched(driver, query, rows, parameter="rows", stage=None, stats=None, batch_size=None, max_bytes=None, **parameters):
+    """
+        Runs an UNWIND query for a (possibly huge) list of rows. The rows are split into chunks
+        and every chunk is committed in its own transaction, so the transaction memory stays flat.
+        The driver is the async neo4j driver, the event loop stays free while a chunk is written.
+
+        The rows are passed as $<parameter>, additional query parameters as keyword arguments.
+        If a stats dict is given, rows, chunks, seconds and rows/sec are stored under the stage name.
+    """
+    stage = stage or parameter
+    start_time = time.time()
+    row_count = 0
+    chunk_count = 0
+
+    async def run_chunk(tx, chunk):
+        result = await tx.run(query, {parameter: chunk, **parameters})
+        await result.consume()
+
+    async with driver.session(database="neo4j") as session:
+        for chunk in chunk_rows(rows, batch_size, max_bytes):
+            await session.execute_write(run_chunk, chunk)
+            row_count += len(chunk)
+            chunk_count += 1
+
+    seconds = time.time() - start_time
+    stage_stats = {
+        "rows": row_count,
+        "chunks": chunk_count,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(row_count / seconds, 1) if seconds > 0 else None
+    }
+    logging.info(f"Write stage '{stage}': {stage_stats}")
+
+    if stats is not None:
+        add_stage_stats(stats, stage, stage_stats)
+    return stage_stats
+
+def add_stage_stats(stats, stage, stage_stats):
+    """Accumulates the stats of a stage that is written multiple times (e.g. once per sentence)."""
+    if stage not in stats:
+        stats[stage] = dict(stage_stats)
+        return
+
+    total = stats[stage]
+    total["rows"] += stage_stats["rows"]
+    total["chunks"] += stage_stats["chunks"]
+    total["seconds"] = round(total["seconds"] + stage_stats["seconds"], 3)
+    total["rows_per_second"] = round(total["rows"] / total["seconds"], 1) if total["seconds"] > 0 else None
@@ -1,6 +1,7 @@
 from neo4j import GraphDatabase, RoutingControl
 import os
 from dotenv import load_dotenv
+from database.batch_writer import write_batched
 
 load_dotenv()
 
@@ -12,7 +13,7 @@ AUTH = (os.getenv("DB_USER"), os.getenv("DB_PASSWORD"))
 # HLC = High-Level Concept
 # E = Entity
 
-def add_node(driver, node_value, concept):
+async def add_node(driver, node_value, concept):
     """Available concepts: LLC, MLC, HLC, Entity"""
 
     # if concept not in ["LLC", "MLC", "HLC", "Entity"]:
@@ -21,22 +22,40 @@ def add_node(driver, node_value, concept):
     if concept not in ["MLC"]:
         raise ValueError("Invalid concept. Choose from: MLC")
 
-    driver.execute_query(
+    await driver.execute_query(
         "MERGE (a:" + concept + " {text: $value, id: $value}) " \
         "ON CREATE SET a.count = 1 " \
         "ON MATCH SET a.count = a.count + 1",
         value=node_value, database_="neo4j",
     )
 
-def add_nodes(driver, node_values, concept):
+async def add_nodes(driver, node_values, concept, stats=None):
     """
         Only available for MLC to create multiple in one query for optimization purposes.
+        Large lists are written in chunks (see database.batch_writer).
     """
 
-    driver.execute_query(
+    await write_batched(
+        driver,
         "UNWIND $values AS value "
         "MERGE (a:" + concept + " {text: value, id: value}) "
         "ON CREATE SET a.count = 1 "
         "ON MATCH SET a.count = a.count + 1",
-        values=node_values, database_="neo4j",
-    )
\ No newline at end of file
+        node_values, parameter="values", stage=concept, stats=stats
+    )
+
+async def add_nodes_with_counts(driver, node_counts, concept, stats=None):
+    """
+        Same as add_nodes, but the occurrences are already aggregated in python ({value: count}),
+        so every node is merged only once.
+    """
+
+    await write_batched(
+        driver,
+        "UNWIND $values AS value "
+        "MERGE (a:" + concept + " {text: value.text, id: value.text}) "
+        "ON CREATE SET a.count = value.count "
+        "ON MATCH SET a.count = a.count + value.count",
+        ({"text": text, "count": count} for text, count in node_counts.items()),
+        parameter="values", stage=concept, stats=stats
+    )
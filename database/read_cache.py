@@ -0,0 +1,97 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+# cached responses of the read routes (0 disables the cache) and seconds until an entry expires
+READ_CACHE_SIZE = int(os.getenv("READ_CACHE_SIZE", "512"))
+READ_CACHE_TTL = float(os.getenv("READ_CACHE_TTL", "30"))
+
+class ReadCache:
+    """
+        LRU cache for expensive graph reads (search, workspace views). Every write to the graph bumps the
+        write version, entries of an older version are not used anymore, so the cache never answers with
+        data from before a write of this process. The TTL covers writes of other processes.
+
+        Identical reads that run at the same time share one load (single flight).
+    """
+
+    def __init__(self, max_entries=None, ttl_seconds=None):
+        self.max_entries = READ_CACHE_SIZE if max_entries is None else max_entries
+        self.ttl_seconds = READ_CACHE_TTL if ttl_seconds is None else ttl_seconds
+        self.entries = OrderedDict()    # key -> (write version, expires at, value)
+        self.loads = {}                 # (key, write version) -> task of the running load
+        self.write_version = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def invalidate(self):
+        """Called after every write, the stale entries are dropped lazily (or evicted by newer ones)."""
+        self.write_version += 1
+
+    async def get(self, key, load):
+        """The cached value of key, else the result of the coroutine function load (shared by concurrent callers)."""
+        if self.max_entries <= 0:
+            return await load()
+
+        version = self.write_version
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry_version, expires_at, value = entry
+            if entry_version == version and expires_at > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self.entries[key]
+
+        load_key = (key, version)
+        task = self.loads.get(load_key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(load())
+            self.loads[load_key] = task
+            task.add_done_callback(lambda finished: self.store(key, version, finished))
+        else:
+            self.coalesced += 1
+        # a cancelled request does not cancel the load the others are waiting for
+        return await asyncio.shield(task)
+
+    def store(self, key, version, task):
+        self.loads.pop((key, version), None)
+        # errors (e.g. 404) are not cached, neither are results of a read that overlapped a write
+        if task.cancelled() or task.exception() is not None or version != self.write_version:
+            return
+        self.entries[key] = (version, time.monotonic() + self.ttl_seconds, task.result())
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_stats(self):
+        requests = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "write_version": self.write_version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.coalesced) / requests, 3) if requests else None
+        }
+
+def invalidate_read_cache(request):
+    """Bumps the write version of the app's read cache, used by every route that writes to the graph."""
+    read_cache = getattr(request.app.state, "read_cache", None)
+    if read_cache is not None:
+        read_cache.invalidate()
+
+async def cached_read(request, key, load):
+    """Result of load through the app's read cache (without cache if there is none)."""
+    read_cache = getattr(request.app.state, "read_cache", None)
+    if read_cache is None:
+        return await load()
+    return await read_cache.get(key, load)
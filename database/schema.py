@@ -0,0 +1,85 @@
+import logging
+
+from neo4j.exceptions import Neo4jError
+
+# Every statement uses IF NOT EXISTS, so the migration can run on every startup.
+# Bump SCHEMA_VERSION whenever statements are added to SCHEMA_STATEMENTS.
+SCHEMA_VERSION = 4
+
+SCHEMA_STATEMENTS = [
+    # uniqueness constraints (also create the backing range index used for lookups by id)
+    "CREATE CONSTRAINT mlc_id_unique IF NOT EXISTS FOR (n:MLC) REQUIRE n.id IS UNIQUE",
+    "CREATE CONSTRAINT hlc_id_unique IF NOT EXISTS FOR (n:HLC) REQUIRE n.id IS UNIQUE",
+    "CREATE CONSTRAINT extraction_id_unique IF NOT EXISTS FOR (n:Extraction) REQUIRE n.id IS UNIQUE",
+    "CREATE CONSTRAINT entity_id_unique IF NOT EXISTS FOR (n:Entity) REQUIRE n.id IS UNIQUE",
+
+    # range indexes for ORDER BY creation_time in /extractions and /workspace/recent-creations
+    "CREATE INDEX extraction_creation_time IF NOT EXISTS FOR (n:Extraction) ON (n.creation_time)",
+    "CREATE INDEX entity_creation_time IF NOT EXISTS FOR (n:Entity) ON (n.creation_time)",
+    "CREATE INDEX hlc_creation_time IF NOT EXISTS FOR (n:HLC) ON (n.creation_time)",
+
+    # v2: lookups by content hash for deduplicated ingestion
+    "CREATE INDEX extraction_content_hash IF NOT EXISTS FOR (n:Extraction) ON (n.content_hash)",
+    "CREATE INDEX hlc_content_hash IF NOT EXISTS FOR (n:HLC) ON (n.content_hash)",
+
+    # v3: full-text (Lucene) indexes for /nodes/search, see FULLTEXT_INDEXES
+    "CREATE FULLTEXT INDEX mlc_text_fulltext IF NOT EXISTS FOR (n:MLC) ON EACH [n.text]",
+    "CREATE FULLTEXT INDEX hlc_text_fulltext IF NOT EXISTS FOR (n:HLC) ON EACH [n.text]",
+    "CREATE FULLTEXT INDEX entity_text_fulltext IF NOT EXISTS FOR (n:Entity) ON EACH [n.text, n.textual_identifier]",
+    "CREATE FULLTEXT INDEX extraction_text_fulltext IF NOT EXISTS FOR (n:Extraction) ON EACH [n.text, n.textual_identifier]",
+
+    # v4: n-gram index, (:Extraction)-[:HAS_NGRAM {frequency}]->(:NGram {phrase, hlc_frequency}), see database.storage
+    "CREATE CONSTRAINT ngram_phrase_unique IF NOT EXISTS FOR (n:NGram) REQUIRE n.phrase IS UNIQUE",
+    "CREATE INDEX ngram_hlc_frequency IF NOT EXISTS FOR (n:NGram) ON (n.hlc_frequency)",
+    "CREATE INDEX has_ngram_frequency IF NOT EXISTS FOR ()-[r:HAS_NGRAM]-() ON (r.frequency)",
+]
+
+# label -> full-text index on its text (and textual_identifier)
+FULLTEXT_INDEXES = {
+    "MLC": "mlc_text_fulltext",
+    "HLC": "hlc_text_fulltext",
+    "Entity": "entity_text_fulltext",
+    "Extraction": "extraction_text_fulltext",
+}
+
+async def apply_schema(driver):
+    """
+        Creates all constraints and indexes required by the application and stores
+        the applied schema version on a (:SchemaVersion) node.
+
+        Returns the schema version that is applied in the database.
+    """
+    async with driver.session() as session:
+        failed = []
+        for statement in SCHEMA_STATEMENTS:
+            try:
+                result = await session.run(statement)
+                await result.consume()
+            except Neo4jError as error:
+                # e.g. a uniqueness constraint cannot be created while duplicates exist in the graph
+                logging.error(f"Schema statement failed: {statement} -> {error}")
+                failed.append(statement)
+
+        if failed:
+            logging.error(f"Graph schema version {SCHEMA_VERSION} not applied, {len(failed)} statements failed.")
+            result = await session.run("MATCH (s:SchemaVersion {id: 'schema'}) RETURN s.version AS version")
+            record = await result.single()
+            return record["version"] if record else None
+
+        # wait until the indexes are online, otherwise the first queries still scan the labels
+        result = await session.run("CALL db.awaitIndexes(300)")
+        await result.consume()
+
+        result = await session.run(
+            "MERGE (s:SchemaVersion {id: 'schema'}) "
+            "ON CREATE SET s.version = $version, s.applied_at = datetime() "
+            "ON MATCH SET s.applied_at = CASE WHEN s.version < $version THEN datetime() ELSE s.applied_at END, "
+            "s.version = CASE WHEN s.version < $version THEN $version ELSE s.version END "
+            "RETURN s.version AS version",
+            version=SCHEMA_VERSION
+        )
+        record = await result.single()
+
+    version = record["version"] if record else SCHEMA_VERSION
+    logging.info(f"Graph schema version {version} applied ({len(SCHEMA_STATEMENTS)} constraints/indexes checked).")
+    return version
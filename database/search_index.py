@@ -0,0 +1,306 @@
+import os
+import re
+import time
+from collections import defaultdict
+
+# labels that are kept in the in-process search index
+SEARCH_INDEX_LABELS = [label.strip() for label in os.getenv("SEARCH_INDEX_LABELS", "MLC,Entity,HLC,Extraction").split(",") if label.strip()]
+# texts up to this length also get a key without spaces/punctuation, so "brucelee" finds "Bruce Lee" and "kgg1" finds "kgg_1"
+SEARCH_INDEX_COMPACT_LENGTH = int(os.getenv("SEARCH_INDEX_COMPACT_LENGTH", "64"))
+# completions of a prefix that are looked at, the shortest words first
+SEARCH_INDEX_PREFIX_WORDS = int(os.getenv("SEARCH_INDEX_PREFIX_WORDS", "200"))
+# characters at the start of a term that have to be typed correctly for fuzzy matches (keeps typo lookups fast)
+SEARCH_INDEX_FUZZY_PREFIX = int(os.getenv("SEARCH_INDEX_FUZZY_PREFIX", "1"))
+
+# shown text of HLCs/extractions is cut, the full node is loaded from the graph storage
+DISPLAY_CHARACTERS = 120
+# scores of a matched query term, the best match per term counts
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.7
+INFIX_SCORE = 0.5
+FUZZY_SCORE = 0.4
+
+word_pattern = re.compile(r"\w+")
+compact_pattern = re.compile(r"[\W_]+")
+
+def get_words(text):
+    return word_pattern.findall(text.lower()) if text else []
+
+def get_compact_key(text):
+    """Lower case text without whitespace and punctuation."""
+    return compact_pattern.sub("", text.lower()) if text else ""
+
+def get_trigrams(word):
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+def get_max_distance(term):
+    """Typos allowed in a term: none for short terms, one up to 7 characters, else two."""
+    if len(term) <= 3:
+        return 0
+    return 1 if len(term) <= 7 else 2
+
+def get_next_row(term, character, previous_row, before_previous_row, previous_character):
+    """Edit distances of term[:i] to the word extended by character (optimal string alignment)."""
+    row = [previous_row[0] + 1]
+    for column in range(1, len(term) + 1):
+        cost = min(
+            row[column - 1] + 1,
+            previous_row[column] + 1,
+            previous_row[column - 1] + (term[column - 1] != character)
+        )
+        if before_previous_row is not None and column > 1 and term[column - 1] == previous_character and term[column - 2] == character:
+            cost = min(cost, before_previous_row[column - 2] + 1)
+        row.append(cost)
+    return row
+
+class PrefixTrie:
+    """Trie of the indexed words, for completions and typo-tolerant (Levenshtein) lookups."""
+
+    # key of the word that ends at a trie node, characters are never empty strings
+    END = ""
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, word):
+        node = self.root
+        for character in word:
+            node = node.setdefault(character, {})
+        node[self.END] = word
+
+    def remove(self, word):
+        path = [self.root]
+        for character in word:
+            node = path[-1].get(character)
+            if node is None:
+                return
+            path.append(node)
+        path[-1].pop(self.END, None)
+        # prune the branches that lead to no word anymore
+        for depth in range(len(word), 0, -1):
+            if path[depth]:
+                break
+            del path[depth - 1][word[depth - 1]]
+
+    def complete(self, prefix, limit):
+        """Up to limit words starting with prefix, the shortest first."""
+        node = self.root
+        for character in prefix:
+            node = node.get(character)
+            if node is None:
+                return []
+
+        words = []
+        level = [node]
+        while level and len(words) < limit:
+            next_level = []
+            for current in level:
+                for character, child in current.items():
+                    if character == self.END:
+                        words.append(child)
+                    else:
+                        next_level.append(child)
+            level = next_level
+        return words[:limit]
+
+    def find_similar(self, term, max_distance, prefix_length=0):
+        """
+            {word: edit distance} of the words within max_distance of term. Walks the trie with one
+            Levenshtein row per node, swapped neighbouring characters count as one edit ("grahp").
+            The first prefix_length characters have to match exactly, which skips most of the trie.
+        """
+        found = {}
+        node = self.root
+        row = list(range(len(term) + 1))
+        previous_row = None
+        previous_character = None
+        for character in term[:prefix_length]:
+            node = node.get(character)
+            if node is None:
+                return found
+            row, previous_row, previous_character = get_next_row(term, character, row, previous_row, previous_character), row, character
+
+        if self.END in node and row[-1] <= max_distance:
+            found[node[self.END]] = row[-1]
+
+        stack = [(child, character, row, previous_row, previous_character) for character, child in node.items() if character != self.END]
+        while stack:
+            node, character, previous_row, before_previous_row, previous_character = stack.pop()
+            row = get_next_row(term, character, previous_row, before_previous_row, previous_character)
+
+            if self.END in node and row[-1] <= max_distance:
+                found[node[self.END]] = row[-1]
+            # no word below this node can get closer than the best cell of the row
+            if min(row) <= max_distance:
+                stack.extend((child, next_character, row, previous_row, character) for next_character, child in node.items() if next_character != self.END)
+        return found
+
+class SearchIndex:
+    """
+        In-process index of the node texts for search-as-you-type. Words (and compact keys of short
+        texts) are kept in a prefix trie for completions and typos, and in character-trigram postings
+        for matches inside words. Only ids, labels and a short text are stored, the routes load the
+        full nodes from the graph storage.
+
+        Built at startup from the storage (build) and updated by the writes of the storage (add).
+    """
+
+    def __init__(self, labels=None):
+        self.labels = set(labels or SEARCH_INDEX_LABELS)
+        self.nodes = {}                         # node id -> (label, display text, keys)
+        self.postings = defaultdict(set)        # key -> node ids
+        self.trie = PrefixTrie()
+        self.trigrams = defaultdict(set)        # trigram -> keys
+        self.status = "empty"
+        self.build_seconds = None
+
+    def get_keys(self, text, textual_identifier):
+        keys = set()
+        for value in (text, textual_identifier):
+            if not value:
+                continue
+            keys.update(get_words(value))
+            if len(value) <= SEARCH_INDEX_COMPACT_LENGTH:
+                compact_key = get_compact_key(value)
+                if compact_key:
+                    keys.add(compact_key)
+        return keys
+
+    def add_key(self, key, node_id):
+        if key not in self.postings:
+            self.trie.add(key)
+            for trigram in get_trigrams(key):
+                self.trigrams[trigram].add(key)
+        self.postings[key].add(node_id)
+
+    def remove_key(self, key, node_id):
+        node_ids = self.postings.get(key)
+        if node_ids is None:
+            return
+        node_ids.discard(node_id)
+        if not node_ids:
+            del self.postings[key]
+            self.trie.remove(key)
+            for trigram in get_trigrams(key):
+                self.trigrams[trigram].discard(key)
+                if not self.trigrams[trigram]:
+                    del self.trigrams[trigram]
+
+    def add(self, node_id, label, text, textual_identifier=None):
+        """Adds or updates a node, nodes with labels that are not indexed are ignored."""
+        if label not in self.labels or node_id is None:
+            return
+        # the text of an MLC is its id, an MLC that is merged again does not change
+        if label == "MLC" and node_id in self.nodes:
+            return
+        keys = self.get_keys(text, textual_identifier)
+        old = self.nodes.get(node_id)
+        if old is not None:
+            for key in old[2] - keys:
+                self.remove_key(key, node_id)
+        for key in keys:
+            self.add_key(key, node_id)
+        display_text = text if text else textual_identifier
+        self.nodes[node_id] = (label, (display_text or "")[:DISPLAY_CHARACTERS], keys)
+
+    def remove(self, node_id):
+        old = self.nodes.pop(node_id, None)
+        if old is not None:
+            for key in old[2]:
+                self.remove_key(key, node_id)
+
+    def match_term(self, term, fuzzy):
+        """{key: score} of the indexed keys matching a query term."""
+        matches = {}
+        if term in self.postings:
+            matches[term] = EXACT_SCORE
+
+        for key in self.trie.complete(term, SEARCH_INDEX_PREFIX_WORDS):
+            if key not in matches:
+                # a longer completion is a weaker match
+                matches[key] = PREFIX_SCORE * (0.5 + 0.5 * len(term) / len(key))
+
+        # typos are only looked up for terms that are no word and no beginning of a word (the slow part)
+        typed_correctly = bool(matches)
+
+        trigrams = get_trigrams(term)
+        if trigrams:
+            # keys that contain all trigrams of the term, then the substring is checked
+            candidates = set.intersection(*(self.trigrams.get(trigram, set()) for trigram in trigrams))
+            for key in candidates:
+                if key not in matches and term in key:
+                    matches[key] = INFIX_SCORE * len(term) / len(key)
+
+        max_distance = get_max_distance(term) if fuzzy and not typed_correctly else 0
+        if max_distance:
+            for key, distance in self.trie.find_similar(term, max_distance, SEARCH_INDEX_FUZZY_PREFIX).items():
+                if key not in matches:
+                    matches[key] = FUZZY_SCORE * (1 - distance / len(term))
+        return matches
+
+    def score_nodes(self, terms, fuzzy):
+        """{node id: score}, every term has to match a key of the node."""
+        scores = None
+        for term in terms:
+            term_scores = {}
+            for key, score in self.match_term(term, fuzzy).items():
+                for node_id in self.postings[key]:
+                    if score > term_scores.get(node_id, 0):
+                        term_scores[node_id] = score
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {node_id: score + term_scores[node_id] for node_id, score in scores.items() if node_id in term_scores}
+            if not scores:
+                break
+        return scores or {}
+
+    def search(self, query, labels=None, skip=0, limit=10, fuzzy=True):
+        """
+            Nodes matching the query: [{"id", "label", "text", "score"}], the best first. Every word of the
+            query has to match a word of the node exactly, as prefix, inside a word or (fuzzy) with typos.
+            The query without spaces is matched against the compact keys as well ("bruce lee" -> "brucelee").
+        """
+        terms = get_words(query)
+        if not terms:
+            return []
+
+        scores = self.score_nodes(terms, fuzzy)
+        compact_query = get_compact_key(query)
+        if compact_query and (len(terms) > 1 or compact_query != terms[0]):
+            # counts like a match of every term
+            for node_id, score in self.score_nodes([compact_query], fuzzy).items():
+                scores[node_id] = max(scores.get(node_id, 0), score * len(terms))
+
+        labels = set(labels) if labels else None
+        results = []
+        for node_id, score in scores.items():
+            label, text, _ = self.nodes[node_id]
+            if labels is None or label in labels:
+                results.append({"id": node_id, "label": label, "text": text, "score": round(score, 4)})
+        # shorter texts first on equal scores (an MLC before the sentences containing it)
+        results.sort(key=lambda result: (-result["score"], len(result["text"])))
+        return results[skip:skip + limit]
+
+    async def build(self, storage):
+        """Loads all indexed nodes from the storage, writes that happen in the meantime are added as well."""
+        start_time = time.perf_counter()
+        self.status = "building"
+        try:
+            async for rows in storage.iter_search_nodes(sorted(self.labels)):
+                for row in rows:
+                    self.add(row["id"], row["label"], row.get("text"), row.get("textual_identifier"))
+        except Exception:
+            self.status = "failed"
+            raise
+        self.status = "ready"
+        self.build_seconds = round(time.perf_counter() - start_time, 3)
+
+    def get_stats(self):
+        return {
+            "status": self.status,
+            "build_seconds": self.build_seconds,
+            "nodes": len(self.nodes),
+            "keys": len(self.postings),
+            "trigrams": len(self.trigrams)
+        }
@@ -0,0 +1,95 @@
+import os
+import time
+from collections import defaultdict
+
+from data_processor.minhash import MINHASH_PERMUTATIONS, estimate_similarity
+
+# LSH bands of the MinHash signatures: 32 bands of 4 values find extractions from a Jaccard similarity of about 0.4
+LSH_BANDS = int(os.getenv("LSH_BANDS", "32"))
+
+class SimilarityIndex:
+    """
+        In-process LSH index over the MinHash signatures of the extractions (data_processor.minhash).
+        A signature is split into bands, extractions that share one band are candidates, only the
+        candidates are compared. "Which extractions are similar to X" does not look at the whole corpus.
+
+        Built at startup from the storage (build) and updated by the writes of the storage (add).
+    """
+
+    def __init__(self, bands=None, permutations=None):
+        self.permutations = permutations or MINHASH_PERMUTATIONS
+        self.bands = min(bands or LSH_BANDS, self.permutations)
+        self.rows = self.permutations // self.bands
+        self.signatures = {}                # extraction id -> signature
+        self.buckets = defaultdict(set)     # (band, values of the band) -> extraction ids
+        self.status = "empty"
+        self.build_seconds = None
+
+    def get_band_keys(self, signature):
+        return [(band, tuple(signature[band * self.rows:(band + 1) * self.rows])) for band in range(self.bands)]
+
+    def add(self, extraction_id, signature):
+        """Adds or replaces the signature of an extraction, signatures of another length are ignored."""
+        if signature is None or len(signature) != self.permutations:
+            return
+        self.remove(extraction_id)
+        self.signatures[extraction_id] = signature
+        for key in self.get_band_keys(signature):
+            self.buckets[key].add(extraction_id)
+
+    def remove(self, extraction_id):
+        signature = self.signatures.pop(extraction_id, None)
+        if signature is None:
+            return
+        for key in self.get_band_keys(signature):
+            extraction_ids = self.buckets.get(key)
+            if extraction_ids is not None:
+                extraction_ids.discard(extraction_id)
+                if not extraction_ids:
+                    del self.buckets[key]
+
+    def find_similar(self, extraction_id, limit=10, min_similarity=0.0):
+        """[{"extraction_id", "similarity"}] of the candidates, the most similar first. None if the extraction has no signature."""
+        signature = self.signatures.get(extraction_id)
+        if signature is None:
+            return None
+
+        candidates = set()
+        for key in self.get_band_keys(signature):
+            candidates.update(self.buckets.get(key, ()))
+        candidates.discard(extraction_id)
+
+        results = []
+        for candidate in candidates:
+            similarity = estimate_similarity(signature, self.signatures[candidate])
+            if similarity >= min_similarity:
+                results.append({"extraction_id": candidate, "similarity": round(similarity, 4)})
+        results.sort(key=lambda result: result["similarity"], reverse=True)
+        return results[:limit]
+
+    async def build(self, storage):
+        """Loads the signatures from the storage (missing ones are computed first), writes in the meantime are added as well."""
+        start_time = time.perf_counter()
+        self.status = "building"
+        try:
+            await storage.backfill_signatures()
+            async for rows in storage.iter_signatures():
+                for row in rows:
+                    # signatures written since the start of the build are newer
+                    if row["id"] not in self.signatures:
+                        self.add(row["id"], row["signature"])
+        except Exception:
+            self.status = "failed"
+            raise
+        self.status = "ready"
+        self.build_seconds = round(time.perf_counter() - start_time, 3)
+
+    def get_stats(self):
+        return {
+            "status": self.status,
+            "build_seconds": self.build_seconds,
+            "extractions": len(self.signatures),
+            "bands": self.bands,
+            "rows_per_band": self.rows,
+            "buckets": len(self.buckets)
+        }
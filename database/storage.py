@@ -0,0 +1,1130 @@
+import asyncio
+import logging
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+
+from fastapi import HTTPException
+
+from data_processor.content_hash import get_extraction_hash
+from database.batch_writer import add_stage_stats, write_batched
+from database.graph_helper import add_nodes_with_counts
+from database.schema import FULLTEXT_INDEXES
+from data_processor.minhash import MINHASH_PERMUTATIONS, get_extraction_signatures, get_signature, merge_signatures
+from data_processor.ngrams import count_ngrams, get_ngrams
+
+# neo4j (default) or memory, see create_storage
+DEFAULT_GRAPH_STORAGE = os.getenv("GRAPH_STORAGE", "neo4j")
+
+# properties that are only used inside the app (similarity index), never returned to the routes
+INTERNAL_PROPERTIES = ("minhash",)
+# Cypher map projection of an Extraction without the internal properties, the signature is not even transferred
+EXTRACTION_PROJECTION = "{.*, minhash: null}"
+
+def node_properties(node):
+    """Properties of a neo4j node (or projection) as a plain dict without INTERNAL_PROPERTIES (None stays None)."""
+    if node is None:
+        return None
+    return {key: value for key, value in dict(node).items() if key not in INTERNAL_PROPERTIES}
+
+lucene_special_pattern = re.compile(r'([+\-&|!(){}\[\]^"~*?:\\/])')
+
+def escape_lucene(term):
+    return lucene_special_pattern.sub(r"\\\1", term)
+
+def build_fulltext_query(text):
+    """
+        Lucene query for search while typing: every word of the text has to match, either as a whole
+        word (boosted) or as the beginning of a word. Special characters of the input are escaped.
+    """
+    terms = [escape_lucene(term) for term in text.lower().split()]
+    return " AND ".join(f"({term}^2 OR {term}*)" for term in terms)
+
+class GraphStorage:
+    """
+        Operations of the app on the graph (ingestion writes and the reads of the routes).
+        All operations are coroutines, nodes are returned as plain property dicts, so the
+        routes do not depend on the backend.
+
+        Rows of the write methods:
+        - extractions: {id, text, status, textual_identifier, source_id, content_hash}
+        - hlcs: {extraction_id, hlc_id, text, index, content_hash, analysis (JSON of tokens, offsets, entities), ngrams (phrases)}
+        - hlc links: {extraction_id, hlc_id, index, text}
+        - chains: {hlc_id, mlc_id, order}
+        - cooccurrences: {mlc1, mlc2, strength} with mlc1 <= mlc2
+    """
+    name = None
+    # in-process SearchIndex that is kept up to date by the writes (set by the app)
+    search_index = None
+    # in-process SimilarityIndex (LSH over the MinHash signatures of the extractions), also set by the app
+    similarity_index = None
+
+    def index_nodes(self, label, rows):
+        """Adds written nodes ({id, text, textual_identifier}) to the search index."""
+        if self.search_index is not None:
+            for row in rows:
+                self.search_index.add(row["id"], label, row.get("text"), row.get("textual_identifier"))
+
+    async def add_signatures(self, rows):
+        """
+        Adds the sentences of HLC rows or links ({extraction_id, text}) to the MinHash signatures of their
+        extractions (data_processor.minhash), the merged signatures are put into the similarity index.
+        """
+        signatures = await asyncio.to_thread(get_extraction_signatures, rows)
+        if not signatures:
+            return
+        merged = await self.store_signatures(signatures)
+        if self.similarity_index is not None:
+            for extraction_id, signature in merged.items():
+                self.similarity_index.add(extraction_id, signature)
+
+    # --- writes ---
+
+    async def create_extractions(self, rows, creation_time, stats=None):
+        raise NotImplementedError
+
+    async def upsert_extraction(self, extraction_id, extraction, creation_time):
+        """Creates the extraction (status initial) or updates the text/identifiers of an existing (queued) one."""
+        raise NotImplementedError
+
+    async def set_extraction_status(self, extraction_id, status):
+        raise NotImplementedError
+
+    async def create_hlcs(self, rows, creation_time, stats=None):
+        """Creates the HLCs and adds their n-grams to the n-gram index (global and per extraction)."""
+        raise NotImplementedError
+
+    async def link_hlcs(self, rows, stats=None):
+        """
+        Links existing HLCs (deduplicated sentences) to an extraction, their MLCs are not counted again.
+        Their n-grams are counted for the extraction, like the sentence would be if it was not deduplicated.
+        """
+        raise NotImplementedError
+
+    async def backfill_ngrams(self, token_filter, batch_size=1000):
+        """
+        Adds the HLCs that were ingested before the n-gram index existed to the index, returns their number.
+        Their MLC chains are filtered with token_filter, like the tokens at ingestion.
+        """
+        return 0
+
+    async def store_signatures(self, signatures):
+        """Merges {extraction_id: signature} into the stored signatures, returns the merged ones of the existing extractions."""
+        raise NotImplementedError
+
+    async def backfill_signatures(self, batch_size=500):
+        """Computes the signatures of extractions without one (ingested before, other MINHASH_PERMUTATIONS), returns their number."""
+        return 0
+
+    async def set_hlc_analysis(self, hlc_id, analysis):
+        """Stores the analysis (JSON) of an HLC that was ingested without one or is recomputed."""
+        raise NotImplementedError
+
+    async def merge_mlcs(self, mlc_counts, stats=None):
+        """Creates the MLCs or increases their count, mlc_counts is {text: occurrences}."""
+        raise NotImplementedError
+
+    async def create_chains(self, rows, stats=None):
+        raise NotImplementedError
+
+    async def upsert_cooccurrences(self, rows, stats=None):
+        """Creates RELATED_TO relationships or adds the strength to existing ones."""
+        raise NotImplementedError
+
+    async def create_extraction(self, extraction_id, extraction, creation_time, status):
+        """Creates a single Extraction node only, the HLCs and MLCs are added by the ingestion."""
+        await self.create_extractions([extraction_row(extraction_id, extraction, status)], creation_time)
+
+    # --- reads ---
+
+    async def get_extractions(self, limit=10):
+        """Newest extractions first."""
+        raise NotImplementedError
+
+    async def get_extraction(self, extraction_id):
+        """{"extraction", "hlcs": [{id, text}] in order, "entities"} or None."""
+        raise NotImplementedError
+
+    async def get_extraction_status(self, extraction_id):
+        """Status of the extraction, None if it does not exist."""
+        raise NotImplementedError
+
+    async def find_extractions_by_hash(self, content_hashes):
+        """{content_hash: extraction} of already ingested extractions (the oldest per hash, failed ones are ignored)."""
+        raise NotImplementedError
+
+    async def find_extraction_by_hash(self, content_hash):
+        return (await self.find_extractions_by_hash([content_hash])).get(content_hash)
+
+    async def find_hlcs_by_hash(self, content_hashes):
+        """{content_hash: hlc_id} of existing HLCs."""
+        raise NotImplementedError
+
+    async def get_hlc(self, hlc_id):
+        """{"hlc", "chain": [{id, type, text}] in order, "extractions", "entities"} or None."""
+        raise NotImplementedError
+
+    async def search_nodes(self, query, labels, skip=0, limit=20):
+        """
+        Full-text search in text/textual_identifier of the nodes with the given labels (see build_fulltext_query).
+        Returns [{"node", "labels", "score"}], the best matches first.
+        """
+        raise NotImplementedError
+
+    async def find_mlcs_by_terms(self, terms, neighbors=50):
+        """
+        MLCs whose text (lower case) is one of the terms with at most `neighbors` connected HLCs and entities each.
+        Returns [{"mlc", "score", "hlcs", "entities"}].
+        """
+        raise NotImplementedError
+
+    async def iter_search_nodes(self, labels, batch_size=5000):
+        """Yields lists of {id, label, text, textual_identifier} of all nodes with the labels, used to build the search index."""
+        raise NotImplementedError
+        yield
+
+    async def iter_signatures(self, batch_size=5000):
+        """Yields lists of {id, signature} of all extractions with a signature, used to build the similarity index."""
+        raise NotImplementedError
+        yield
+
+    async def get_nodes(self, node_ids):
+        """{node id: properties} of the nodes, node_ids is {label: [ids]}."""
+        raise NotImplementedError
+
+    async def get_entity_texts(self):
+        """{entity_id: text} of all entities."""
+        raise NotImplementedError
+
+    async def get_mlc_neighborhood(self, mlc_id, limit=20):
+        """{"mlc", "relationships_with_neighbors" (strongest RELATED_TO first), "other_connections", "hlcs", "extractions"} or None."""
+        raise NotImplementedError
+
+    async def get_important_mlcs(self, extraction_id=None, limit=20):
+        """[{"mlc", "labels", "strength"}], MLCs with the most RELATED_TO relationships."""
+        raise NotImplementedError
+
+    async def get_recent_creations(self, limit=20):
+        """[{"node", "labels"}], newest Extractions and Entities."""
+        raise NotImplementedError
+
+    async def get_ngrams(self, extraction_id=None, min_frequency=2, limit=50):
+        """
+        [{"extraction_id", "phrase", "frequency"}], frequency = number of HLCs of the extraction containing the phrase.
+        Phrases are n-grams of the HLC tokens without stopwords and signs (data_processor.ngrams).
+        """
+        raise NotImplementedError
+
+    async def get_top_ngrams(self, min_frequency=2, limit=50):
+        """[{"phrase", "frequency"}] over the whole graph, frequency = number of HLCs containing the phrase."""
+        raise NotImplementedError
+
+    async def compare_extractions(self, extraction_id_1, extraction_id_2, limit=50):
+        """Common n-grams of two extractions: [{"phrase", "extraction1_freq", "extraction2_freq", "total_frequency"}]."""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+def extraction_row(extraction_id, extraction, status):
+    return {
+        "id": extraction_id,
+        "text": extraction.text,
+        "status": status,
+        "textual_identifier": extraction.textual_identifier if extraction.textual_identifier else None,
+        "source_id": extraction.source_id if extraction.source_id else None,
+        "content_hash": get_extraction_hash(extraction)
+    }
+
+# MLC chains of HLCs that are not in the n-gram index yet (ingested before it existed), paged by id.
+# The chains are filtered with the token filter of the ingestion (see data_processor.ngrams).
+HLC_SEQUENCES_WITHOUT_NGRAMS = """
+    MATCH (hlc:HLC)
+    WHERE hlc.id > $after AND hlc.ngrams IS NULL
+    WITH hlc
+    ORDER BY hlc.id
+    LIMIT $limit
+    CALL {
+        WITH hlc
+        OPTIONAL MATCH (hlc)-[r:HAS_CHAIN]->(mlc:MLC)
+        WITH mlc, r
+        ORDER BY r.order ASC
+        RETURN COLLECT(mlc.text) AS seq
+    }
+    RETURN hlc.id AS hlc_id, seq
+"""
+
+class Neo4jStorage(GraphStorage):
+    """Cypher implementation on the async neo4j driver, the writes are chunked by the batch writer."""
+    name = "neo4j"
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    async def create_extractions(self, rows, creation_time, stats=None):
+        await write_batched(
+            self.driver,
+            """
+            UNWIND $extractions AS ex
+            CREATE (e:Extraction {id: ex.id, text: ex.text, creation_time: $creation_time, status: ex.status, textual_identifier: ex.textual_identifier, source_id: ex.source_id, content_hash: ex.content_hash})
+            """,
+            rows, parameter="extractions", stage="Extraction", stats=stats,
+            creation_time=creation_time
+        )
+        self.index_nodes("Extraction", rows)
+
+    async def upsert_extraction(self, extraction_id, extraction, creation_time):
+        await self.driver.execute_query(
+            "MERGE (e:Extraction {id: $extraction_id}) "
+            "ON CREATE SET e.status = 'initial' "
+            "SET e.text = $text, e.creation_time = $creation_time, e.textual_identifier = $textual_identifier, e.source_id = $source_id, e.content_hash = $content_hash",
+            extraction_id=extraction_id, text=extraction.text, creation_time=creation_time, content_hash=get_extraction_hash(extraction),
+            textual_identifier=extraction.textual_identifier if extraction.textual_identifier else None,
+            source_id=extraction.source_id if extraction.source_id else None,
+            database_="neo4j",
+        )
+        self.index_nodes("Extraction", [{"id": extraction_id, "text": extraction.text, "textual_identifier": extraction.textual_identifier}])
+
+    async def set_extraction_status(self, extraction_id, status):
+        await self.driver.execute_query(
+            "MATCH (e:Extraction {id: $extraction_id}) "
+            "SET e.status = $status",
+            extraction_id=extraction_id, status=status, database_="neo4j",
+        )
+
+    async def create_hlcs(self, rows, creation_time, stats=None):
+        await write_batched(
+            self.driver,
+            """
+            UNWIND $sentences AS s
+            MATCH (e:Extraction {id: s.extraction_id})
+            CREATE (hlc:HLC {id: s.hlc_id, text: s.text, creation_time: $creation_time, content_hash: s.content_hash, analysis: s.analysis, ngrams: s.ngrams})
+            CREATE (e)-[:HAS_HLC {order: s.index}]->(hlc)
+            """,
+            rows, parameter="sentences", stage="HLC", stats=stats,
+            creation_time=creation_time
+        )
+        self.index_nodes("HLC", [{"id": row["hlc_id"], "text": row["text"]} for row in rows])
+        await self.add_ngrams(*count_ngrams(rows), stats=stats)
+        await self.add_signatures(rows)
+
+    async def add_ngrams(self, global_rows, extraction_rows, stats=None):
+        """Adds the frequencies of count_ngrams to the NGram nodes and the HAS_NGRAM relationships of the extractions."""
+        await write_batched(
+            self.driver,
+            """
+            UNWIND $ngrams AS g
+            MERGE (n:NGram {phrase: g.phrase})
+            ON CREATE SET n.hlc_frequency = g.frequency
+            ON MATCH SET n.hlc_frequency = n.hlc_frequency + g.frequency
+            """,
+            global_rows, parameter="ngrams", stage="NGram", stats=stats
+        )
+        await write_batched(
+            self.driver,
+            """
+            UNWIND $ngrams AS g
+            MATCH (e:Extraction {id: g.extraction_id})
+            MATCH (n:NGram {phrase: g.phrase})
+            MERGE (e)-[r:HAS_NGRAM]->(n)
+            ON CREATE SET r.frequency = g.frequency
+            ON MATCH SET r.frequency = r.frequency + g.frequency
+            """,
+            extraction_rows, parameter="ngrams", stage="HAS_NGRAM", stats=stats
+        )
+
+    async def link_hlcs(self, rows, stats=None):
+        await write_batched(
+            self.driver,
+            """
+            UNWIND $links AS link
+            MATCH (e:Extraction {id: link.extraction_id})
+            MATCH (hlc:HLC {id: link.hlc_id})
+            CREATE (e)-[:HAS_HLC {order: link.index}]->(hlc)
+            """,
+            rows, parameter="links", stage="HLC_LINK", stats=stats
+        )
+        # the NGram nodes exist, they were created with the HLC
+        await write_batched(
+            self.driver,
+            """
+            UNWIND $links AS link
+            MATCH (e:Extraction {id: link.extraction_id})
+            MATCH (hlc:HLC {id: link.hlc_id})
+            UNWIND COALESCE(hlc.ngrams, []) AS phrase
+            MATCH (n:NGram {phrase: phrase})
+            MERGE (e)-[r:HAS_NGRAM]->(n)
+            ON CREATE SET r.frequency = 1
+            ON MATCH SET r.frequency = r.frequency + 1
+            """,
+            rows, parameter="links", stage="HAS_NGRAM", stats=stats
+        )
+        await self.add_signatures(rows)
+
+    async def store_signatures(self, signatures):
+        records, _, _ = await self.driver.execute_query(
+            """
+            UNWIND $rows AS row
+            MATCH (e:Extraction {id: row.extraction_id})
+            SET e.minhash = CASE
+                WHEN e.minhash IS NULL OR SIZE(e.minhash) <> SIZE(row.signature) THEN row.signature
+                ELSE [i IN RANGE(0, SIZE(row.signature) - 1) | CASE WHEN row.signature[i] < e.minhash[i] THEN row.signature[i] ELSE e.minhash[i] END]
+            END
+            RETURN e.id AS extraction_id, e.minhash AS signature
+            """,
+            rows=[{"extraction_id": extraction_id, "signature": signature} for extraction_id, signature in signatures.items()],
+            database_="neo4j",
+        )
+        return {record["extraction_id"]: record["signature"] for record in records}
+
+    async def backfill_signatures(self, batch_size=500):
+        total = 0
+        after = ""
+        while True:
+            records, _, _ = await self.driver.execute_query(
+                "MATCH (e:Extraction) "
+                "WHERE e.id > $after AND (e.minhash IS NULL OR SIZE(e.minhash) <> $permutations) "
+                "WITH e ORDER BY e.id LIMIT $limit "
+                "OPTIONAL MATCH (e)-[:HAS_HLC]->(hlc:HLC) "
+                "RETURN e.id AS extraction_id, COLLECT(hlc.text) AS texts "
+                "ORDER BY extraction_id",
+                after=after, permutations=MINHASH_PERMUTATIONS, limit=batch_size, database_="neo4j",
+            )
+            if not records:
+                return total
+            after = records[-1]["extraction_id"]
+            signatures = await asyncio.to_thread(
+                lambda: {record["extraction_id"]: get_signature(record["texts"]) for record in records}
+            )
+            # extractions without sentences (queued, failed) get their signature from the ingestion
+            rows = [{"extraction_id": extraction_id, "signature": signature} for extraction_id, signature in signatures.items() if signature is not None]
+            await self.driver.execute_query(
+                "UNWIND $rows AS row "
+                "MATCH (e:Extraction {id: row.extraction_id}) "
+                "SET e.minhash = row.signature",
+                rows=rows, database_="neo4j",
+            )
+            total += len(rows)
+
+    async def backfill_ngrams(self, token_filter, batch_size=1000):
+        total = 0
+        after = ""
+        while True:
+            records, _, _ = await self.driver.execute_query(
+                HLC_SEQUENCES_WITHOUT_NGRAMS,
+                after=after, limit=batch_size, database_="neo4j",
+            )
+            if not records:
+                return total
+            after = records[-1]["hlc_id"]
+            rows = [{"hlc_id": record["hlc_id"], "ngrams": get_ngrams(token_filter.filter(record["seq"]))} for record in records]
+            # one transaction per batch, the HLC is marked together with the frequencies it adds
+            # (counted once per extraction relationship, like in add_ngrams and link_hlcs)
+            await self.driver.execute_query(
+                """
+                UNWIND $rows AS row
+                MATCH (hlc:HLC {id: row.hlc_id})
+                WHERE hlc.ngrams IS NULL
+                SET hlc.ngrams = row.ngrams
+                WITH hlc, row
+                UNWIND row.ngrams AS phrase
+                MERGE (n:NGram {phrase: phrase})
+                ON CREATE SET n.hlc_frequency = 1
+                ON MATCH SET n.hlc_frequency = n.hlc_frequency + 1
+                WITH hlc, n
+                MATCH (e:Extraction)-[:HAS_HLC]->(hlc)
+                MERGE (e)-[r:HAS_NGRAM]->(n)
+                ON CREATE SET r.frequency = 1
+                ON MATCH SET r.frequency = r.frequency + 1
+                """,
+                rows=rows, database_="neo4j",
+            )
+            total += len(rows)
+            logging.info(f"N-gram index: {total} HLCs added")
+
+    async def set_hlc_analysis(self, hlc_id, analysis):
+        await self.driver.execute_query(
+            "MATCH (hlc:HLC {id: $hlc_id}) "
+            "SET hlc.analysis = $analysis",
+            hlc_id=hlc_id, analysis=analysis, database_="neo4j",
+        )
+
+    async def merge_mlcs(self, mlc_counts, stats=None):
+        await add_nodes_with_counts(self.driver, mlc_counts, "MLC", stats=stats)
+        self.index_nodes("MLC", [{"id": text, "text": text} for text in mlc_counts])
+
+    async def create_chains(self, rows, stats=None):
+        await write_batched(
+            self.driver,
+            """
+            UNWIND $chain_data AS data
+            MATCH (hlc:HLC {id: data.hlc_id})
+            MATCH (mlc:MLC {id: data.mlc_id})
+            CREATE (hlc)-[r:HAS_CHAIN]->(mlc)
+            SET r.order = data.order
+            """,
+            rows, parameter="chain_data", stage="HAS_CHAIN", stats=stats
+        )
+
+    async def upsert_cooccurrences(self, rows, stats=None):
+        await write_batched(
+            self.driver,
+            """
+            UNWIND $relationships AS rel
+            MATCH (a:MLC {id: rel.mlc1})
+            MATCH (b:MLC {id: rel.mlc2})
+            MERGE (a)-[r:RELATED_TO]-(b)
+            ON CREATE SET r.strength = rel.strength
+            ON MATCH SET r.strength = r.strength + rel.strength
+            """,
+            rows, parameter="relationships", stage="RELATED_TO", stats=stats
+        )
+
+    async def get_extractions(self, limit=10):
+        records, _, _ = await self.driver.execute_query(
+            "MATCH (e:Extraction) "
+            f"RETURN e {EXTRACTION_PROJECTION} AS e "
+            "ORDER BY e.creation_time DESC "
+            "LIMIT $limit",
+            limit=limit, database_="neo4j",
+        )
+        return [node_properties(record["e"]) for record in records]
+
+    async def get_extraction(self, extraction_id):
+        records, _, _ = await self.driver.execute_query(
+            "MATCH (e:Extraction {id: $extraction_id})-[r:HAS_HLC]->(hlc:HLC) "
+            "WITH e, hlc, r.order AS pos "
+            "ORDER BY pos "
+            "WITH e, collect({id: hlc.id, text: hlc.text}) AS hlc_list "
+            "OPTIONAL MATCH (e)-[:HAS_ENTITY]->(entity:Entity) "
+            "RETURN "
+              f"e {EXTRACTION_PROJECTION} AS extraction, "
+                "hlc_list, "
+                "collect(entity) as entities ",
+            extraction_id=extraction_id, database_="neo4j",
+        )
+        if not records:
+            return None
+
+        record = records[0]
+        return {
+            "extraction": node_properties(record["extraction"]),
+            "hlcs": record["hlc_list"],
+            "entities": [node_properties(entity) for entity in record["entities"]]
+        }
+
+    async def get_extraction_status(self, extraction_id):
+        records, _, _ = await self.driver.execute_query(
+            "MATCH (e:Extraction {id: $extraction_id}) RETURN e.status AS status",
+            extraction_id=extraction_id, database_="neo4j",
+        )
+        return records[0]["status"] if records else None
+
+    async def find_extractions_by_hash(self, content_hashes):
+        records, _, _ = await self.driver.execute_query(
+            "UNWIND $content_hashes AS content_hash "
+            "MATCH (e:Extraction {content_hash: content_hash}) "
+            "WHERE coalesce(e.status, '') <> 'failed' "
+            "WITH content_hash, e ORDER BY e.creation_time ASC "
+            f"RETURN content_hash, collect(e {EXTRACTION_PROJECTION})[0] AS extraction",
+            content_hashes=list(set(content_hashes)), database_="neo4j",
+        )
+        return {record["content_hash"]: node_properties(record["extraction"]) for record in records}
+
+    async def find_hlcs_by_hash(self, content_hashes):
+        records, _, _ = await self.driver.execute_query(
+            "UNWIND $content_hashes AS content_hash "
+            "MATCH (hlc:HLC {content_hash: content_hash}) "
+            "RETURN content_hash, min(hlc.id) AS hlc_id",
+            content_hashes=list(set(content_hashes)), database_="neo4j",
+        )
+        return {record["content_hash"]: record["hlc_id"] for record in records}
+
+    async def get_hlc(self, hlc_id):
+        # get HLC node by id and connected MLCs and connected distinct Extraction
+        records, _, _ = await self.driver.execute_query(
+            "MATCH (hlc:HLC {id: $hlc_id}) "
+            "OPTIONAL MATCH (hlc)<-[:HAS_HLC]-(e:Extraction) "
+            "OPTIONAL MATCH (hlc)-[:HAS_ENTITY]->(entity:Entity) "
+            "OPTIONAL MATCH (hlc)-[r:HAS_CHAIN]->(chain_item) "
+            f"WITH hlc, collect(DISTINCT e {EXTRACTION_PROJECTION}) as extractions, collect(DISTINCT entity) as entities, chain_item, r.order as pos "
+            "ORDER BY pos "
+            "RETURN hlc, collect({id: chain_item.id, type: head(labels(chain_item)), text: chain_item.text}) as chain, extractions, entities",
+            hlc_id=hlc_id, database_="neo4j",
+        )
+        if not records:
+            return None
+
+        record = records[0]
+        return {
+            "hlc": node_properties(record["hlc"]),
+            "chain": record["chain"],
+            "extractions": [node_properties(extraction) for extraction in record["extractions"]],
+            "entities": [node_properties(entity) for entity in record["entities"]]
+        }
+
+    async def search_nodes(self, query, labels, skip=0, limit=20):
+        lucene_query = build_fulltext_query(query)
+        if not lucene_query:
+            return []
+        # every index returns its best skip + limit nodes, the page is cut from the merged ranking
+        records, _, _ = await self.driver.execute_query(
+            "UNWIND $indexes AS index_name "
+            "CALL db.index.fulltext.queryNodes(index_name, $query, {limit: $skip + $limit}) YIELD node, score "
+            "RETURN node, labels(node) AS labels, score "
+            "ORDER BY score DESC SKIP $skip LIMIT $limit",
+            indexes=[FULLTEXT_INDEXES[label] for label in labels], query=lucene_query, skip=skip, limit=limit, database_="neo4j",
+        )
+        return [{"node": node_properties(record["node"]), "labels": record["labels"], "score": record["score"]} for record in records]
+
+    async def find_mlcs_by_terms(self, terms, neighbors=50):
+        if not terms:
+            return []
+        # the index finds the candidates (case-insensitive), the exact comparison only runs on them.
+        # CALL { WITH mlc ... } instead of the scoped CALL (mlc) { ... }, which needs Neo4j 5.23
+        records, _, _ = await self.driver.execute_query(
+            "CALL db.index.fulltext.queryNodes($index_name, $query) YIELD node AS mlc, score "
+            "WHERE toLower(mlc.text) IN $terms "
+            "CALL { "
+            "  WITH mlc "
+            "  OPTIONAL MATCH (mlc)<-[:HAS_CHAIN]-(hlc:HLC) "
+            "  WITH DISTINCT hlc LIMIT $neighbors "
+            "  RETURN collect(hlc) AS hlcs "
+            "} "
+            "CALL { "
+            "  WITH mlc "
+            "  OPTIONAL MATCH (mlc)<-[:COMBINATION_OF]-(entity:Entity) "
+            "  WITH DISTINCT entity LIMIT $neighbors "
+            "  RETURN collect(entity) AS entities "
+            "} "
+            "RETURN mlc, score, hlcs, entities",
+            index_name=FULLTEXT_INDEXES["MLC"], query=" OR ".join(f'"{escape_lucene(term)}"' for term in terms),
+            terms=terms, neighbors=neighbors, database_="neo4j",
+        )
+        return [
+            {
+                "mlc": node_properties(record["mlc"]),
+                "score": record["score"],
+                "hlcs": [node_properties(hlc) for hlc in record["hlcs"]],
+                "entities": [node_properties(entity) for entity in record["entities"]]
+            }
+            for record in records
+        ]
+
+    async def iter_search_nodes(self, labels, batch_size=5000):
+        for label in labels:
+            if label not in FULLTEXT_INDEXES:
+                raise ValueError(f"Invalid label '{label}'")
+            # paged by id (uniqueness constraint index), no long running transaction
+            after = ""
+            while True:
+                records, _, _ = await self.driver.execute_query(
+                    f"MATCH (n:{label}) WHERE n.id > $after "
+                    "RETURN n.id AS id, n.text AS text, n.textual_identifier AS textual_identifier "
+                    "ORDER BY n.id LIMIT $batch_size",
+                    after=after, batch_size=batch_size, database_="neo4j",
+                )
+                if not records:
+                    break
+                yield [{"label": label, **record.data()} for record in records]
+                after = records[-1]["id"]
+
+    async def iter_signatures(self, batch_size=5000):
+        after = ""
+        while True:
+            records, _, _ = await self.driver.execute_query(
+                "MATCH (e:Extraction) WHERE e.id > $after AND e.minhash IS NOT NULL "
+                "RETURN e.id AS id, e.minhash AS signature "
+                "ORDER BY e.id LIMIT $batch_size",
+                after=after, batch_size=batch_size, database_="neo4j",
+            )
+            if not records:
+                break
+            yield [record.data() for record in records]
+            after = records[-1]["id"]
+
+    async def get_nodes(self, node_ids):
+        labels = [label for label, ids in node_ids.items() if ids]
+        for label in labels:
+            if label not in FULLTEXT_INDEXES:
+                raise ValueError(f"Invalid label '{label}'")
+        if not labels:
+            return {}
+        # one round trip, every part uses the id index of its label
+        records, _, _ = await self.driver.execute_query(
+            " UNION ALL ".join(f"MATCH (n:{label}) WHERE n.id IN $ids[{index}] RETURN n" for index, label in enumerate(labels)),
+            ids=[list(node_ids[label]) for label in labels], database_="neo4j",
+        )
+        return {record["n"]["id"]: node_properties(record["n"]) for record in records}
+
+    async def get_entity_texts(self):
+        records, _, _ = await self.driver.execute_query(
+            "MATCH (e:Entity) "
+            "return e.text as text, e.id as id",
+            database_="neo4j",
+        )
+        return {record["id"]: record["text"] for record in records}
+
+    async def get_mlc_neighborhood(self, mlc_id, limit=20):
+        records, _, _ = await self.driver.execute_query(
+            """
+                MATCH (mlc:MLC {id: $mlc_id})
+                CALL(mlc) {
+                    OPTIONAL MATCH (mlc)-[r:RELATED_TO]-(x)
+                    WITH mlc, x, sum(r.strength) AS totalStrength
+                    ORDER BY totalStrength DESC
+                    LIMIT $limit
+                    WITH mlc, collect({strength: totalStrength, rel_type: 'RELATED_TO',
+                                    neighbor: x, neighbor_type: LABELS(x)[0]}) AS relationships_with_neighbors
+                    OPTIONAL MATCH (mlc)-[other_r]-(other_node)
+                    WHERE TYPE(other_r) <> 'RELATED_TO' AND TYPE(other_r) <> 'HAS_CHAIN'
+                    RETURN relationships_with_neighbors,
+                        collect({rel_type: TYPE(other_r),
+                                    neighbor: other_node,
+                                    neighbor_type: LABELS(other_node)[0]}) AS other_connections
+                }
+
+                CALL(mlc) {
+                    OPTIONAL MATCH(mlc)-[:HAS_CHAIN]-(hlc:HLC)
+                    OPTIONAL MATCH(hlc)-[:HAS_HLC]-(extraction:Extraction)
+                    RETURN collect(DISTINCT hlc) as hlcs, collect(DISTINCT {id: extraction.id, textual_identifier: extraction.textual_identifier}) as extractions
+                }
+
+                RETURN mlc, relationships_with_neighbors, hlcs, extractions, other_connections
+            """,
+            parameters_={"mlc_id": mlc_id, "limit": limit}, database_="neo4j",
+        )
+        if not records:
+            return None
+
+        record = records[0]
+        return {
+            "mlc": node_properties(record["mlc"]),
+            "relationships_with_neighbors": [
+                {**item, "neighbor": node_properties(item["neighbor"])} for item in record["relationships_with_neighbors"]
+            ],
+            "other_connections": [
+                {**item, "neighbor": node_properties(item["neighbor"])} for item in record["other_connections"]
+            ],
+            "hlcs": [node_properties(hlc) for hlc in record["hlcs"]],
+            "extractions": record["extractions"]
+        }
+
+    async def get_important_mlcs(self, extraction_id=None, limit=20):
+        if extraction_id:
+            # If extraction_id is provided, filter MLCs related to that extraction
+            records, _, _ = await self.driver.execute_query(
+                "MATCH (mlc)-[r:RELATED_TO]-(x) "
+                "MATCH (e:Extraction {id: $extraction_id})-[:HAS_HLC]->(hlc:HLC)-[:HAS_CHAIN]->(mlc:MLC) "
+                "WITH mlc, count(r) as rels "
+                "ORDER BY rels DESC "
+                "LIMIT $limit "
+                "RETURN mlc, rels",
+                extraction_id=extraction_id, limit=limit, database_="neo4j",
+            )
+        else:
+            # Otherwise, find the most related MLCs in the entire database
+            records, _, _ = await self.driver.execute_query(
+                "MATCH (mlc:MLC)-[r:RELATED_TO]-(x) "
+                "WITH mlc, count(r) as rels "
+                "ORDER BY rels DESC "
+                "LIMIT $limit "
+                "RETURN mlc, rels",
+                limit=limit, database_="neo4j",
+            )
+        return [{"mlc": node_properties(record["mlc"]), "labels": list(record["mlc"].labels), "strength": record["rels"]} for record in records]
+
+    async def get_recent_creations(self, limit=20):
+        records, _, _ = await self.driver.execute_query(
+            "MATCH (n) "
+            "WHERE n:Extraction OR n:Entity "
+            "RETURN n "
+            "ORDER BY n.creation_time DESC "
+            "LIMIT $limit",
+            limit=limit, database_="neo4j",
+        )
+        return [{"node": node_properties(record["n"]), "labels": list(record["n"].labels)} for record in records]
+
+    async def get_ngrams(self, extraction_id=None, min_frequency=2, limit=50):
+        # lookups in the n-gram index, the index on HAS_NGRAM.frequency serves the order without an extraction
+        match = "MATCH (e:Extraction {id: $extraction_id})-[r:HAS_NGRAM]->(n:NGram) " if extraction_id else "MATCH (e:Extraction)-[r:HAS_NGRAM]->(n:NGram) "
+        records, _, _ = await self.driver.execute_query(
+            match +
+            "WHERE r.frequency >= $min_frequency "
+            "RETURN e.id AS extraction, n.phrase AS phrase, r.frequency AS frequency "
+            "ORDER BY frequency DESC "
+            "LIMIT $limit",
+            extraction_id=extraction_id, min_frequency=min_frequency, limit=limit, database_="neo4j",
+        )
+        return [{"extraction_id": record["extraction"], "phrase": record["phrase"], "frequency": record["frequency"]} for record in records]
+
+    async def get_top_ngrams(self, min_frequency=2, limit=50):
+        records, _, _ = await self.driver.execute_query(
+            "MATCH (n:NGram) "
+            "WHERE n.hlc_frequency >= $min_frequency "
+            "RETURN n.phrase AS phrase, n.hlc_frequency AS frequency "
+            "ORDER BY frequency DESC "
+            "LIMIT $limit",
+            min_frequency=min_frequency, limit=limit, database_="neo4j",
+        )
+        return [{"phrase": record["phrase"], "frequency": record["frequency"]} for record in records]
+
+    async def compare_extractions(self, extraction_id_1, extraction_id_2, limit=50):
+        # shared phrases are the NGram nodes both extractions point to (two MATCH clauses, an extraction can be compared with itself)
+        records, _, _ = await self.driver.execute_query(
+            "MATCH (:Extraction {id: $extraction_id_1})-[r1:HAS_NGRAM]->(n:NGram) "
+            "MATCH (:Extraction {id: $extraction_id_2})-[r2:HAS_NGRAM]->(n) "
+            "RETURN n.phrase AS phrase, r1.frequency AS extraction1_freq, r2.frequency AS extraction2_freq, "
+            "r1.frequency + r2.frequency AS total_frequency "
+            "ORDER BY total_frequency DESC "
+            "LIMIT $limit",
+            extraction_id_1=extraction_id_1, extraction_id_2=extraction_id_2, limit=limit, database_="neo4j",
+        )
+        return [
+            {
+                "phrase": record["phrase"],
+                "extraction1_freq": record["extraction1_freq"],
+                "extraction2_freq": record["extraction2_freq"],
+                "total_frequency": record["total_frequency"]
+            }
+            for record in records
+        ]
+
+    async def close(self):
+        await self.driver.close()
+
+class InMemoryStorage(GraphStorage):
+    """
+        Dict-backed graph for benchmarks, tests and small local workspaces. Nothing is persisted.
+        Entities are not supported (the entity routes need Neo4j), so entity results are always empty.
+    """
+    name = "memory"
+
+    def __init__(self):
+        # the storage may be shared by event loops in different threads (e.g. benchmarks)
+        self.lock = threading.RLock()
+        self.extractions = {}                       # id -> properties
+        self.extraction_hlcs = defaultdict(list)    # extraction id -> [(order, hlc id)]
+        self.hlcs = {}                              # id -> properties
+        self.hlc_hashes = {}                        # content hash -> first hlc id
+        self.hlc_extractions = defaultdict(set)     # hlc id -> extraction ids
+        self.chains = defaultdict(list)             # hlc id -> [(order, mlc id)]
+        self.mlc_hlcs = defaultdict(set)            # mlc id -> hlc ids
+        self.mlcs = {}                              # id -> properties
+        self.related = defaultdict(dict)            # mlc id -> {mlc id: strength}, both directions
+        self.ngrams = Counter()                     # phrase -> HLCs containing it
+        self.extraction_ngrams = defaultdict(Counter)   # extraction id -> {phrase: HLCs of the extraction containing it}
+        self.signatures = {}                        # extraction id -> MinHash signature
+
+    def record_stats(self, stats, stage, rows):
+        if stats is not None:
+            add_stage_stats(stats, stage, {"rows": rows, "chunks": 1, "seconds": 0.0, "rows_per_second": None})
+
+    async def create_extractions(self, rows, creation_time, stats=None):
+        rows = list(rows)
+        with self.lock:
+            for row in rows:
+                self.extractions[row["id"]] = {**row, "creation_time": creation_time}
+        self.record_stats(stats, "Extraction", len(rows))
+        self.index_nodes("Extraction", rows)
+
+    async def upsert_extraction(self, extraction_id, extraction, creation_time):
+        with self.lock:
+            properties = self.extractions.setdefault(extraction_id, {"id": extraction_id, "status": "initial"})
+            properties.update(extraction_row(extraction_id, extraction, properties["status"]))
+            properties["creation_time"] = creation_time
+        self.index_nodes("Extraction", [properties])
+
+    async def set_extraction_status(self, extraction_id, status):
+        with self.lock:
+            if extraction_id in self.extractions:
+                self.extractions[extraction_id]["status"] = status
+
+    async def create_hlcs(self, rows, creation_time, stats=None):
+        rows = list(rows)
+        with self.lock:
+            for row in rows:
+                # like the MATCH in Cypher, HLCs of unknown extractions are skipped
+                if row["extraction_id"] not in self.extractions:
+                    continue
+                self.hlcs[row["hlc_id"]] = {"id": row["hlc_id"], "text": row["text"], "creation_time": creation_time, "content_hash": row.get("content_hash"), "analysis": row.get("analysis"), "ngrams": row.get("ngrams")}
+                self.extraction_hlcs[row["extraction_id"]].append((row["index"], row["hlc_id"]))
+                self.hlc_extractions[row["hlc_id"]].add(row["extraction_id"])
+                if row.get("content_hash"):
+                    self.hlc_hashes.setdefault(row["content_hash"], row["hlc_id"])
+            global_rows, extraction_rows = count_ngrams(row for row in rows if row["extraction_id"] in self.extractions)
+            for ngram in global_rows:
+                self.ngrams[ngram["phrase"]] += ngram["frequency"]
+            for ngram in extraction_rows:
+                self.extraction_ngrams[ngram["extraction_id"]][ngram["phrase"]] += ngram["frequency"]
+        self.record_stats(stats, "HLC", len(rows))
+        self.index_nodes("HLC", [self.hlcs[row["hlc_id"]] for row in rows if row["hlc_id"] in self.hlcs])
+        await self.add_signatures(rows)
+
+    async def link_hlcs(self, rows, stats=None):
+        rows = list(rows)
+        with self.lock:
+            for row in rows:
+                if row["extraction_id"] not in self.extractions or row["hlc_id"] not in self.hlcs:
+                    continue
+                self.extraction_hlcs[row["extraction_id"]].append((row["index"], row["hlc_id"]))
+                self.hlc_extractions[row["hlc_id"]].add(row["extraction_id"])
+                self.extraction_ngrams[row["extraction_id"]].update(self.hlcs[row["hlc_id"]].get("ngrams") or ())
+        self.record_stats(stats, "HLC_LINK", len(rows))
+        await self.add_signatures(rows)
+
+    async def store_signatures(self, signatures):
+        merged = {}
+        with self.lock:
+            for extraction_id, signature in signatures.items():
+                if extraction_id in self.extractions:
+                    self.signatures[extraction_id] = merged[extraction_id] = merge_signatures(self.signatures.get(extraction_id), signature)
+        return merged
+
+    async def iter_signatures(self, batch_size=5000):
+        with self.lock:
+            rows = [{"id": extraction_id, "signature": signature} for extraction_id, signature in self.signatures.items()]
+        for start in range(0, len(rows), batch_size):
+            yield rows[start:start + batch_size]
+
+    async def set_hlc_analysis(self, hlc_id, analysis):
+        with self.lock:
+            if hlc_id in self.hlcs:
+                self.hlcs[hlc_id]["analysis"] = analysis
+
+    async def merge_mlcs(self, mlc_counts, stats=None):
+        with self.lock:
+            for text, count in mlc_counts.items():
+                if text in self.mlcs:
+                    self.mlcs[text]["count"] += count
+                else:
+                    self.mlcs[text] = {"text": text, "id": text, "count": count}
+        self.record_stats(stats, "MLC", len(mlc_counts))
+        self.index_nodes("MLC", [{"id": text, "text": text} for text in mlc_counts])
+
+    async def create_chains(self, rows, stats=None):
+        rows = list(rows)
+        with self.lock:
+            for row in rows:
+                if row["hlc_id"] not in self.hlcs or row["mlc_id"] not in self.mlcs:
+                    continue
+                self.chains[row["hlc_id"]].append((row["order"], row["mlc_id"]))
+                self.mlc_hlcs[row["mlc_id"]].add(row["hlc_id"])
+        self.record_stats(stats, "HAS_CHAIN", len(rows))
+
+    async def upsert_cooccurrences(self, rows, stats=None):
+        rows = list(rows)
+        with self.lock:
+            for row in rows:
+                mlc1, mlc2 = row["mlc1"], row["mlc2"]
+                if mlc1 not in self.mlcs or mlc2 not in self.mlcs:
+                    continue
+                self.related[mlc1][mlc2] = self.related[mlc1].get(mlc2, 0) + row["strength"]
+                if mlc1 != mlc2:
+                    self.related[mlc2][mlc1] = self.related[mlc2].get(mlc1, 0) + row["strength"]
+        self.record_stats(stats, "RELATED_TO", len(rows))
+
+    async def get_extractions(self, limit=10):
+        with self.lock:
+            extractions = sorted(self.extractions.values(), key=lambda extraction: extraction["creation_time"] or "", reverse=True)
+            return [dict(extraction) for extraction in extractions[:limit]]
+
+    async def get_extraction(self, extraction_id):
+        with self.lock:
+            # same as the Cypher MATCH: extractions without HLCs are not found
+            if extraction_id not in self.extractions or not self.extraction_hlcs[extraction_id]:
+                return None
+            return {
+                "extraction": dict(self.extractions[extraction_id]),
+                "hlcs": [{"id": hlc_id, "text": self.hlcs[hlc_id]["text"]} for _, hlc_id in sorted(self.extraction_hlcs[extraction_id])],
+                "entities": []
+            }
+
+    async def get_extraction_status(self, extraction_id):
+        with self.lock:
+            extraction = self.extractions.get(extraction_id)
+            return extraction["status"] if extraction else None
+
+    async def find_extractions_by_hash(self, content_hashes):
+        content_hashes = set(content_hashes)
+        found = {}
+        with self.lock:
+            extractions = sorted(self.extractions.values(), key=lambda extraction: extraction["creation_time"] or "")
+            for extraction in extractions:
+                content_hash = extraction.get("content_hash")
+                if content_hash in content_hashes and content_hash not in found and extraction["status"] != "failed":
+                    found[content_hash] = dict(extraction)
+        return found
+
+    async def find_hlcs_by_hash(self, content_hashes):
+        with self.lock:
+            return {content_hash: self.hlc_hashes[content_hash] for content_hash in set(content_hashes) if content_hash in self.hlc_hashes}
+
+    async def get_hlc(self, hlc_id):
+        with self.lock:
+            if hlc_id not in self.hlcs:
+                return None
+            return {
+                "hlc": dict(self.hlcs[hlc_id]),
+                "chain": [{"id": mlc_id, "type": "MLC", "text": self.mlcs[mlc_id]["text"]} for _, mlc_id in sorted(self.chains[hlc_id])],
+                "extractions": [dict(self.extractions[extraction_id]) for extraction_id in self.hlc_extractions[hlc_id]],
+                "entities": []
+            }
+
+    async def search_nodes(self, query, labels, skip=0, limit=20):
+        # scans all nodes, scored like the index: 2 per whole word, 1 per word prefix, every word has to match
+        terms = query.lower().split()
+        if not terms:
+            return []
+        node_sets = {"MLC": self.mlcs, "HLC": self.hlcs, "Extraction": self.extractions}
+        matches = []
+        with self.lock:
+            for label in labels:
+                for node in node_sets.get(label, {}).values():
+                    words = set(re.findall(r"\w+", f"{node.get('text') or ''} {node.get('textual_identifier') or ''}".lower()))
+                    score = 0
+                    for term in terms:
+                        if term in words:
+                            score += 2
+                        elif any(word.startswith(term) for word in words):
+                            score += 1
+                        else:
+                            score = 0
+                            break
+                    if score:
+                        matches.append({"node": dict(node), "labels": [label], "score": float(score)})
+        matches.sort(key=lambda match: match["score"], reverse=True)
+        return matches[skip:skip + limit]
+
+    async def find_mlcs_by_terms(self, terms, neighbors=50):
+        terms = set(terms)
+        with self.lock:
+            return [
+                {
+                    "mlc": dict(mlc),
+                    "score": 1.0,
+                    "hlcs": [dict(self.hlcs[hlc_id]) for hlc_id in list(self.mlc_hlcs[mlc_id])[:neighbors]],
+                    "entities": []
+                }
+                for mlc_id, mlc in self.mlcs.items()
+                if mlc["text"].lower() in terms
+            ]
+
+    async def iter_search_nodes(self, labels, batch_size=5000):
+        node_sets = {"MLC": self.mlcs, "HLC": self.hlcs, "Extraction": self.extractions}
+        for label in labels:
+            with self.lock:
+                rows = [
+                    {"id": node["id"], "label": label, "text": node.get("text"), "textual_identifier": node.get("textual_identifier")}
+                    for node in node_sets.get(label, {}).values()
+                ]
+            for start in range(0, len(rows), batch_size):
+                yield rows[start:start + batch_size]
+
+    async def get_nodes(self, node_ids):
+        node_sets = {"MLC": self.mlcs, "HLC": self.hlcs, "Extraction": self.extractions}
+        with self.lock:
+            return {
+                node_id: dict(node_sets[label][node_id])
+                for label, ids in node_ids.items()
+                for node_id in ids
+                if node_id in node_sets.get(label, {})
+            }
+
+    async def get_entity_texts(self):
+        return {}
+
+    async def get_mlc_neighborhood(self, mlc_id, limit=20):
+        with self.lock:
+            if mlc_id not in self.mlcs:
+                return None
+
+            neighbors = sorted(self.related[mlc_id].items(), key=lambda item: item[1], reverse=True)[:limit]
+            hlc_ids = self.mlc_hlcs[mlc_id]
+            extraction_ids = {extraction_id for hlc_id in hlc_ids for extraction_id in self.hlc_extractions[hlc_id]}
+            return {
+                "mlc": dict(self.mlcs[mlc_id]),
+                "relationships_with_neighbors": [
+                    {"strength": strength, "rel_type": "RELATED_TO", "neighbor": dict(self.mlcs[neighbor_id]), "neighbor_type": "MLC"}
+                    for neighbor_id, strength in neighbors
+                ],
+                "other_connections": [],
+                "hlcs": [dict(self.hlcs[hlc_id]) for hlc_id in hlc_ids],
+                "extractions": [
+                    {"id": extraction_id, "textual_identifier": self.extractions[extraction_id].get("textual_identifier")}
+                    for extraction_id in extraction_ids
+                ]
+            }
+
+    async def get_important_mlcs(self, extraction_id=None, limit=20):
+        with self.lock:
+            if extraction_id:
+                # like the Cypher query, every occurrence in the extraction counts all relationships of the MLC
+                occurrences = Counter(
+                    mlc_id
+                    for _, hlc_id in self.extraction_hlcs.get(extraction_id, [])
+                    for _, mlc_id in self.chains[hlc_id]
+                )
+                strengths = {mlc_id: len(self.related[mlc_id]) * count for mlc_id, count in occurrences.items() if self.related.get(mlc_id)}
+            else:
+                strengths = {mlc_id: len(neighbors) for mlc_id, neighbors in self.related.items() if neighbors}
+
+            important = sorted(strengths.items(), key=lambda item: item[1], reverse=True)[:limit]
+            return [{"mlc": dict(self.mlcs[mlc_id]), "labels": ["MLC"], "strength": strength} for mlc_id, strength in important]
+
+    async def get_recent_creations(self, limit=20):
+        return [{"node": extraction, "labels": ["Extraction"]} for extraction in await self.get_extractions(limit)]
+
+    async def get_ngrams(self, extraction_id=None, min_frequency=2, limit=50):
+        with self.lock:
+            extraction_ids = [extraction_id] if extraction_id else list(self.extraction_ngrams.keys())
+            ngrams = [
+                {"extraction_id": current_id, "phrase": phrase, "frequency": frequency}
+                for current_id in extraction_ids
+                for phrase, frequency in self.extraction_ngrams.get(current_id, {}).items()
+                if frequency >= min_frequency
+            ]
+        ngrams.sort(key=lambda ngram: ngram["frequency"], reverse=True)
+        return ngrams[:limit]
+
+    async def get_top_ngrams(self, min_frequency=2, limit=50):
+        with self.lock:
+            return [{"phrase": phrase, "frequency": frequency} for phrase, frequency in self.ngrams.most_common(limit) if frequency >= min_frequency]
+
+    async def compare_extractions(self, extraction_id_1, extraction_id_2, limit=50):
+        with self.lock:
+            phrases_1 = dict(self.extraction_ngrams.get(extraction_id_1, {}))
+            phrases_2 = dict(self.extraction_ngrams.get(extraction_id_2, {}))
+
+        intersections = [
+            {
+                "phrase": phrase,
+                "extraction1_freq": phrases_1[phrase],
+                "extraction2_freq": phrases_2[phrase],
+                "total_frequency": phrases_1[phrase] + phrases_2[phrase]
+            }
+            for phrase in phrases_1.keys() & phrases_2.keys()
+        ]
+        intersections.sort(key=lambda intersection: intersection["total_frequency"], reverse=True)
+        return intersections[:limit]
+
+def get_neo4j_driver(request):
+    """Driver for the routes that still use Cypher directly (entities, relationships, search), 501 without Neo4j."""
+    driver = getattr(request.app.state, "driver", None)
+    if driver is None:
+        raise HTTPException(status_code=501, detail="This endpoint requires the neo4j graph storage (GRAPH_STORAGE=neo4j)")
+    return driver
+
+GRAPH_STORAGES = ["neo4j", "memory"]
+
+def create_storage(name=None, driver=None):
+    """Creates the storage selected by GRAPH_STORAGE (neo4j needs a driver)."""
+    name = name or DEFAULT_GRAPH_STORAGE
+    if name == "neo4j":
+        if driver is None:
+            raise ValueError("The neo4j graph storage requires a driver")
+        return Neo4jStorage(driver)
+    if name == "memory":
+        return InMemoryStorage()
+    raise ValueError(f"Invalid graph storage '{name}'. Choose from: {', '.join(GRAPH_STORAGES)}")
@@ -2,18 +2,22 @@ from datetime import datetime
 
 from neo4j import GraphDatabase
 from models.extraction_models import ExtractionResponseModel, Entity
+from database.batch_writer import write_batched
 from database.graph_helper import add_node, add_nodes
-from data_processor.data_transformer import get_english_stopwords, get_spacy_tokens
+from data_processor.cooccurrence import get_cooccurrence_pairs, get_cooccurrence_settings
+from data_processor.data_transformer import get_spacy_tokens
+from data_processor.token_filter import get_token_filter
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def extraction_create(driver, spacy_context, extraction_id, extraction, creation_time, sentences, entities_recommended):
-    stopsigns = [" ", ".", ",", ":", ";", "!", "?", "-", "_", "(", ")", "[", "]", "{", "}", "", "\n", "\"", "'", "/", "\n\n"]
+async def extraction_create(driver, spacy_context, extraction_id, extraction, creation_time, sentences, entities_recommended, stats=None, token_filter=None):
+    token_filter = token_filter or get_token_filter()
+    cooccurrence_strategy, cooccurrence_window = get_cooccurrence_settings(extraction)
 
-    with driver.session() as session:
-        session.run(
+    async with driver.session() as session:
+        result = await session.run(
             "CREATE (e:Extraction {id: $extraction_id, text: $text, creation_time: $creation_time, status: 'initial', textual_identifier: $textual_identifier, source_id: $source_id})",
             extraction_id=extraction_id,
             text=extraction.text,
@@ -21,10 +25,11 @@ def extraction_create(driver, spacy_context, extraction_id, extraction, creation
             textual_identifier=extraction.textual_identifier if extraction.textual_identifier else None,
             source_id=extraction.source_id if extraction.source_id else None
         )
+        await result.consume()
 
         for index, sentence in enumerate(sentences):
             print("Processing sentence:", sentence)
-            session.run(
+            result = await session.run(
                 "MERGE (e:Extraction {id: $extraction_id}) "  # Finds or creates if missing
                 "CREATE (hlc:HLC {id: $hlc_id, text: $text, creation_time: $creation_time}) "
                 "CREATE (e)-[:HAS_HLC {order: $index}]->(hlc)",
@@ -34,6 +39,7 @@ def extraction_create(driver, spacy_context, extraction_id, extraction, creation
                 extraction_id=extraction_id,
                 index=index
             )
+            await result.consume()
 
             spacy_tokens = get_spacy_tokens(spacy_context, sentence["text"])
             print("Spacy tokens for sentence:", spacy_tokens)
@@ -51,21 +57,22 @@ def extraction_create(driver, spacy_context, extraction_id, extraction, creation
                 #     continue
                 #-----
                 # add_node(driver, token, "MLC")
-            add_nodes(driver, spacy_tokens, "MLC")
+            await add_nodes(driver, spacy_tokens, "MLC", stats=stats)
 
             # create relationships between MLCs and HLC including the correct order
             
             tokens_with_order = [{"mlc_id": id, "order": idx} for idx, id in enumerate(spacy_tokens)]
             print("Tokens with order for HLC:", tokens_with_order)
 
-            result = session.run(
+            await write_batched(
+                driver,
                 """MATCH (hlc:HLC {id: $hlc_id})
                 UNWIND $tokens_with_order AS token_data
                 MATCH (mlc:MLC {id: token_data.mlc_id})
                 CREATE (hlc)-[r:HAS_CHAIN]->(mlc)
                 SET r.order = token_data.order""",
-                hlc_id=sentence["hlc_id"],
-                tokens_with_order=tokens_with_order
+                tokens_with_order, parameter="tokens_with_order", stage="HAS_CHAIN", stats=stats,
+                hlc_id=sentence["hlc_id"]
             )
 
             # if result:
@@ -74,28 +81,24 @@ def extraction_create(driver, spacy_context, extraction_id, extraction, creation
             #     print("No relationships created between HLC and MLCs.")
 
             # remove stopwords from spacy_tokens --> they will not be used for RELATED_TO relationships
-            stopwords = get_english_stopwords()
-            spacy_tokens = [token for token in spacy_tokens if (token.lower() not in stopwords) and (token not in stopsigns)]
+            spacy_tokens = token_filter.filter(spacy_tokens)
 
             # create all relationships locally in python first, then push all at once to the database
-            relationships = []
-            for i in range(len(spacy_tokens)):
-                for j in range(i + 1, len(spacy_tokens)):
-                    if i != j:
-                        relationships.append((spacy_tokens[i], spacy_tokens[j]))
-
-            # push all relationships to the database using a single query --> I think this does not work...
-            if relationships:
-                session.run(
-                    """
-                    WITH $relationships AS relationships
-                    UNWIND relationships AS rel
-                    MATCH (a:MLC {id: rel[0]}), (b:MLC {id: rel[1]})
-                    MERGE (a)-[r:RELATED_TO]->(b)
-                    ON CREATE SET r.strength = 1
-                    ON MATCH SET r.strength = r.strength + 1""",
-                    relationships=relationships
-                )
+            # (all pairs of the sentence or a sliding window, see data_processor.cooccurrence)
+            relationships = list(get_cooccurrence_pairs(spacy_tokens, cooccurrence_strategy, cooccurrence_window))
+
+            # push all relationships to the database in chunked queries
+            await write_batched(
+                driver,
+                """
+                WITH $relationships AS relationships
+                UNWIND relationships AS rel
+                MATCH (a:MLC {id: rel[0]}), (b:MLC {id: rel[1]})
+                MERGE (a)-[r:RELATED_TO]->(b)
+                ON CREATE SET r.strength = rel[2]
+                ON MATCH SET r.strength = r.strength + rel[2]""",
+                relationships, parameter="relationships", stage="RELATED_TO", stats=stats
+            )
 
 
             # create relationships for each MLC in the sentence to each other MLC in the sentence
@@ -127,7 +130,7 @@ def extraction_create(driver, spacy_context, extraction_id, extraction, creation
 
     return response
 
-def extraction_create_calculate_in_ram(driver, spacy_context, extraction_id, extraction, creation_time, sentences, entities_recommended):
+async def extraction_create_calculate_in_ram(driver, spacy_context, extraction_id, extraction, creation_time, sentences, entities_recommended, stats=None, token_filter=None):
     """
         This function calculates all relationships in RAM before sending it in batches 
         to the database.
@@ -135,14 +138,15 @@ def extraction_create_calculate_in_ram(driver, spacy_context, extraction_id, ext
         This function could be even more optimized by using async requests to Neo4j and
         calculate relationships in the meantime - fully utilizing the parallel options.
     """
-    # set stopsigns
-    stopsigns = [" ", ".", ",", ":", ";", "!", "?", "-", "_", "(", ")", "[", "]", "{", "}", "", "\n", "\"", "'", "/", "\n\n"]
-    with driver.session() as session:
+    # stopwords and stopsigns are filtered by the shared token filter
+    token_filter = token_filter or get_token_filter()
+    cooccurrence_strategy, cooccurrence_window = get_cooccurrence_settings(extraction)
+    async with driver.session() as session:
         # create extraction in DB and retrieve ID
 
         logging.info(f"Creating extraction with ID: {extraction_id} and text: {extraction.text}")
 
-        session.run(
+        result = await session.run(
             "CREATE (e:Extraction {id: $extraction_id, text: $text, creation_time: $creation_time, status: 'initial', textual_identifier: $textual_identifier, source_id: $source_id})",
             extraction_id=extraction_id,
             text=extraction.text,
@@ -150,6 +154,7 @@ def extraction_create_calculate_in_ram(driver, spacy_context, extraction_id, ext
             textual_identifier=extraction.textual_identifier if extraction.textual_identifier else None,
             source_id=extraction.source_id if extraction.source_id else None
         )
+        await result.consume()
 
         logging.info(f"Extraction created with ID: {extraction_id}")
 
@@ -173,20 +178,20 @@ def extraction_create_calculate_in_ram(driver, spacy_context, extraction_id, ext
 
 
         # check if the MLCs exists, if not, create them and retrieve all ids - in one query
-        add_nodes(driver, all_mlcs, "MLC")
+        await add_nodes(driver, all_mlcs, "MLC", stats=stats)
 
         logging.info(f"All MLCs loaded: {len(all_mlcs)} MLCs")
 
         logging.info(f"Creating HLCs and add relation to Extraction")
         sentences_with_index = [{"hlc_id": sentence["hlc_id"], "text": sentence["text"], "index": index} for index, sentence in enumerate(sentences)]
         # create HLCs and relate them to the Extraction
-        session.run(
+        await write_batched(
+            driver,
             "UNWIND $sentences AS sentence "
             "MERGE (e:Extraction {id: $extraction_id}) "  # Finds or creates if missing
             "CREATE (hlc:HLC {id: sentence.hlc_id, text: sentence.text, creation_time: $creation_time}) "
-            "CREATE (e)-[:HAS_HLC {order: sentence.index}]->(hlc)"
-            "RETURN hlc",
-            sentences=sentences_with_index,
+            "CREATE (e)-[:HAS_HLC {order: sentence.index}]->(hlc)",
+            sentences_with_index, parameter="sentences", stage="HLC", stats=stats,
             creation_time=creation_time,
             extraction_id=extraction_id
         )
@@ -197,40 +202,37 @@ def extraction_create_calculate_in_ram(driver, spacy_context, extraction_id, ext
             tokens_with_order = [{"mlc_id": id, "order": idx} for idx, id in enumerate(enhanced_sentence["mlcs"])]
             logging.info(f"Creating relationships between HLC {enhanced_sentence['hlc_id']} and MLCs with order: {tokens_with_order}")
 
-            result = session.run(
+            await write_batched(
+                driver,
                 """MATCH (hlc:HLC {id: $hlc_id})
                 UNWIND $tokens_with_order AS token_data
                 MATCH (mlc:MLC {id: token_data.mlc_id})
                 CREATE (hlc)-[r:HAS_CHAIN]->(mlc)
                 SET r.order = token_data.order""",
-                hlc_id=enhanced_sentence["hlc_id"],
-                tokens_with_order=tokens_with_order
+                tokens_with_order, parameter="tokens_with_order", stage="HAS_CHAIN", stats=stats,
+                hlc_id=enhanced_sentence["hlc_id"]
             )
 
-            stopwords = get_english_stopwords()
-            spacy_tokens = [token for token in spacy_tokens if (token.lower() not in stopwords) and (token not in stopsigns)]
+            spacy_tokens = token_filter.filter(enhanced_sentence["mlcs"])
 
             # create all relationships locally in python first, then push all at once to the database
-            relationships = []
-            for i in range(len(spacy_tokens)):
-                for j in range(i + 1, len(spacy_tokens)):
-                    if i != j:
-                        relationships.append((spacy_tokens[i], spacy_tokens[j]))
-
-            # push all relationships to the database using a single query --> I think this does not work...
-            if relationships:
-                session.run(
-                    """
-                    WITH $relationships AS relationships
-                    UNWIND relationships AS rel
-                    MATCH (a:MLC {id: rel[0]}), (b:MLC {id: rel[1]})
-                    MERGE (a)-[r:RELATED_TO]->(b)
-                    ON CREATE SET r.strength = 1
-                    ON MATCH SET r.strength = r.strength + 1""",
-                    relationships=relationships
-                )
-
-                print("Extraction created with ID:", extraction_id)
+            # (all pairs of the sentence or a sliding window, see data_processor.cooccurrence)
+            relationships = list(get_cooccurrence_pairs(spacy_tokens, cooccurrence_strategy, cooccurrence_window))
+
+            # push all relationships to the database in chunked queries
+            await write_batched(
+                driver,
+                """
+                WITH $relationships AS relationships
+                UNWIND relationships AS rel
+                MATCH (a:MLC {id: rel[0]}), (b:MLC {id: rel[1]})
+                MERGE (a)-[r:RELATED_TO]->(b)
+                ON CREATE SET r.strength = rel[2]
+                ON MATCH SET r.strength = r.strength + rel[2]""",
+                relationships, parameter="relationships", stage="RELATED_TO", stats=stats
+            )
+
+        print("Extraction created with ID:", extraction_id)
 
     response = ExtractionResponseModel(
         extraction_id=extraction_id,
@@ -246,9 +248,10 @@ def extraction_create_calculate_in_ram(driver, spacy_context, extraction_id, ext
 
     return response
 
-def remove_all_nodes(driver):
-    with driver.session() as session:
-        session.run("MATCH (n) DETACH DELETE n")
+async def remove_all_nodes(driver):
+    async with driver.session() as session:
+        result = await session.run("MATCH (n) DETACH DELETE n")
+        await result.consume()
 
 
 if __name__ == "__main__":
@@ -1,134 +1,94 @@
+import asyncio
+import json
 import logging
+import os
+import uuid
 from collections import Counter
-from datetime import datetime
-from neo4j import GraphDatabase
-from database.graph_helper import add_node, add_nodes
-from data_processor.data_transformer import get_english_stopwords, get_spacy_tokens, get_nltk_tokens
+from functools import partial
+from data_processor.content_hash import get_text_hash, should_deduplicate_sentences
+from data_processor.cooccurrence import count_cooccurrences_vectorized, get_cooccurrence_settings
+from data_processor.ngrams import get_ngrams
+from data_processor.tokenizers import NltkTokenizer, SpacyTokenizer, get_tokenizer
+from data_processor.token_filter import get_token_filter
 import time
+from database.storage import extraction_row
 from models.extraction_models import ExtractionResponseModel
 
-def extraction_create_optimized(driver, nlp, extraction_id, extraction, creation_time, sentences, entities_recommended):
+# tokens, token offsets and entities of the ingestion are stored on the HLC, GET /hlc/{hlc_id} serves them without spaCy
+PERSIST_HLC_ANALYSIS = os.getenv("PERSIST_HLC_ANALYSIS", "true").lower() == "true"
+
+def get_hlc_analysis(sentence):
+    """
+        Compact JSON of the analysis of a sentence (stored as a single HLC property, Neo4j has no nested properties):
+        {"tokens": [...], "token_offsets": [[start, end]] or null, "entities": [[text, label, start, end]] or null}.
+        Entities are null if the tokenizer backend has no NER.
+    """
+    if not PERSIST_HLC_ANALYSIS or sentence.get("tokens") is None:
+        return None
+    return json.dumps({
+        "tokens": sentence["tokens"],
+        "token_offsets": sentence.get("token_offsets"),
+        "entities": sentence.get("entities")
+    }, separators=(",", ":"), ensure_ascii=False)
+
+def load_hlc_analysis(value):
+    return json.loads(value) if value else None
+
+def create_hlc_sentences(analysed_sentences):
+    """HLCs of the sentences of a tokenizer analysis, with a new id and the analysis that is stored with them."""
+    return [
+        {"hlc_id": str(uuid.uuid4()), "text": sentence["text"], "tokens": sentence["tokens"], "analysis": get_hlc_analysis(sentence)}
+        for sentence in analysed_sentences
+    ]
+
+async def extraction_create_with_tokenizer(storage, tokenizer, extraction_id, extraction, creation_time, sentences, entities_recommended, stats=None, token_filter=None):
     """
     This function computes all nodes and relationships in RAM before sending them
-    in a minimal number of batched queries to the database.
+    in a minimal number of batched writes to the graph storage (database.storage). For Neo4j,
+    large parameter lists are split into chunks by the batch writer, the write stats per stage are added to stats.
+
+    The sentences are tokenized with the given tokenizer backend (data_processor.tokenizers),
+    unless they already contain their "tokens". Tokenization and counting run in a worker thread,
+    so the event loop keeps serving requests in the meantime.
+
+    With sentence deduplication (extraction.deduplicate_sentences / DEDUPLICATE_SENTENCES), sentences
+    that already exist as HLCs are only linked, their MLCs and co-occurrences are not counted again.
     """
     logging.info(f"Starting optimized extraction for ID: {extraction_id}")
-    stopsigns = {" ", ".", ",", ":", ";", "!", "?", "-", "_", "(", ")", "[", "]", "{", "}", "", "\n", "\"", "'", "/", "\n\n"}
-    stopwords = get_english_stopwords()
 
-    time_spend_on_task = {}
+    hlc_links = []
+    if should_deduplicate_sentences(extraction):
+        sentences, hlc_links = await link_known_sentences(storage, extraction_id, sentences, {})
 
     # --- (1) PREPARE ALL DATA IN PYTHON ---
-    
-    all_mlcs = []
-    enhanced_sentences = []
-    hlc_to_mlc_chain = []
-    # Using a Counter is highly efficient for aggregating relationship strengths
-    related_to_strength_counter = Counter()
-
-    for index, sentence in enumerate(sentences):
-        start_time = time.time()
-        spacy_tokens = get_spacy_tokens(nlp, sentence["text"])
-        time_spend_on_task["tokenization"] = time.time() - start_time
-        after_tokenization = time.time()
-
-        # Store all MLCs for bulk creation later
-        all_mlcs.extend(spacy_tokens)
-        
-        # Prepare sentence data with tokens for the response object
-        enhanced_sentences.append({
-            "hlc_id": sentence["hlc_id"],
-            "text": sentence["text"],
-            "index": index,
-            "mlcs": spacy_tokens
-        })
-        
-        # Prepare data for (HLC)-[:HAS_CHAIN]->(MLC) relationships
-        for order, token in enumerate(spacy_tokens):
-            hlc_to_mlc_chain.append({
-                "hlc_id": sentence["hlc_id"],
-                "mlc_id": token,
-                "order": order
-            })
+    enhanced_sentences, mlc_counter, hlc_to_mlc_chain, mlc_to_mlc_relationships = await asyncio.to_thread(
+        prepare_extraction, tokenizer, extraction_id, extraction, sentences, token_filter
+    )
 
-        # Prepare data for (MLC)-[:RELATED_TO]->(MLC) relationships
-        # Filter out stopwords and signs for these relationships
-        filtered_tokens = [token for token in spacy_tokens if token.lower() not in stopwords and token not in stopsigns]
-        
-        # Generate all unique pairs within the sentence
-        for i in range(len(filtered_tokens)):
-            for j in range(i + 1, len(filtered_tokens)):
-                # Sorting the pair ensures that (a, b) and (b, a) are treated as the same relationship
-                pair = tuple(sorted((filtered_tokens[i], filtered_tokens[j])))
-                related_to_strength_counter[pair] += 1
+    # --- (2) EXECUTE MINIMAL DATABASE QUERIES ---
 
-        rest = time.time() - after_tokenization
-        time_spend_on_task["rest"] = rest
+    # Query 1: Create the main Extraction node (may already exist with status 'queued' if it is ingested as a job)
+    await storage.upsert_extraction(extraction_id, extraction, creation_time)
+    logging.info("Step 1/5: Extraction node created.")
 
-    logging.info(f"Time spent on task for extraction {extraction_id}: {time_spend_on_task}")
+    # Query 2: Bulk create all unique MLC nodes from the entire text
+    await storage.merge_mlcs(mlc_counter, stats=stats)
+    logging.info(f"Step 2/5: {len(mlc_counter)} unique MLC nodes created.")
 
-    # Convert the counter to the format needed for the Cypher query: [{'mlc1': 'a', 'mlc2': 'b', 'strength': 2}]
-    mlc_to_mlc_relationships = [
-        {"mlc1": pair[0], "mlc2": pair[1], "strength": strength}
-        for pair, strength in related_to_strength_counter.items()
-    ]
+    # Query 3: Bulk create all HLC nodes and link them to the Extraction node
+    sentences_with_index = [hlc_row(extraction_id, s) for s in enhanced_sentences]
+    await storage.create_hlcs(sentences_with_index, creation_time, stats=stats)
+    if hlc_links:
+        await storage.link_hlcs(hlc_links, stats=stats)
+    logging.info(f"Step 3/5: {len(sentences_with_index)} HLC nodes created and {len(hlc_links)} existing HLCs linked to the Extraction.")
 
-    # --- (2) EXECUTE MINIMAL DATABASE QUERIES ---
+    # Query 4: Bulk create all (HLC)-[:HAS_CHAIN]->(MLC) relationships
+    await storage.create_chains(hlc_to_mlc_chain, stats=stats)
+    logging.info(f"Step 4/5: {len(hlc_to_mlc_chain)} HAS_CHAIN relationships created.")
 
-    with driver.session() as session:
-        # Query 1: Create the main Extraction node
-        session.run(
-            "CREATE (e:Extraction {id: $extraction_id, text: $text, creation_time: $creation_time, status: 'initial', textual_identifier: $textual_identifier, source_id: $source_id})",
-            extraction_id=extraction_id, text=extraction.text, creation_time=creation_time,
-            textual_identifier=extraction.textual_identifier if extraction.textual_identifier else None,
-            source_id=extraction.source_id if extraction.source_id else None
-        )
-        logging.info("Step 1/5: Extraction node created.")
-
-        # Query 2: Bulk create all unique MLC nodes from the entire text
-        add_nodes(driver, all_mlcs, "MLC")
-        logging.info(f"Step 2/5: {len(set(all_mlcs))} unique MLC nodes created.")
-
-        # Query 3: Bulk create all HLC nodes and link them to the Extraction node
-        sentences_with_index = [{"hlc_id": s["hlc_id"], "text": s["text"], "index": s["index"]} for s in enhanced_sentences]
-        session.run(
-            """
-            MATCH (e:Extraction {id: $extraction_id})
-            UNWIND $sentences AS s
-            CREATE (hlc:HLC {id: s.hlc_id, text: s.text, creation_time: $creation_time})
-            CREATE (e)-[:HAS_HLC {order: s.index}]->(hlc)
-            """,
-            extraction_id=extraction_id, sentences=sentences_with_index, creation_time=creation_time
-        )
-        logging.info(f"Step 3/5: {len(sentences_with_index)} HLC nodes and their relationships to Extraction created.")
-
-        # Query 4: Bulk create all (HLC)-[:HAS_CHAIN]->(MLC) relationships
-        session.run(
-            """
-            UNWIND $chain_data AS data
-            MATCH (hlc:HLC {id: data.hlc_id})
-            MATCH (mlc:MLC {id: data.mlc_id})
-            CREATE (hlc)-[r:HAS_CHAIN]->(mlc)
-            SET r.order = data.order
-            """,
-            chain_data=hlc_to_mlc_chain
-        )
-        logging.info(f"Step 4/5: {len(hlc_to_mlc_chain)} HAS_CHAIN relationships created.")
-
-        # Query 5: Bulk create/update all (MLC)-[:RELATED_TO]->(MLC) relationships
-        if mlc_to_mlc_relationships:
-            session.run(
-                """
-                UNWIND $relationships AS rel
-                MATCH (a:MLC {id: rel.mlc1})
-                MATCH (b:MLC {id: rel.mlc2})
-                MERGE (a)-[r:RELATED_TO]-(b)
-                ON CREATE SET r.strength = rel.strength
-                ON MATCH SET r.strength = r.strength + rel.strength
-                """,
-                relationships=mlc_to_mlc_relationships
-            )
-        logging.info(f"Step 5/5: {len(mlc_to_mlc_relationships)} RELATED_TO relationships created/updated.")
+    # Query 5: Bulk create/update all (MLC)-[:RELATED_TO]->(MLC) relationships
+    await storage.upsert_cooccurrences(mlc_to_mlc_relationships, stats=stats)
+    logging.info(f"Step 5/5: {len(mlc_to_mlc_relationships)} RELATED_TO relationships created/updated.")
 
     logging.info(f"Extraction {extraction_id} created successfully.")
 
@@ -140,52 +100,90 @@ def extraction_create_optimized(driver, nlp, extraction_id, extraction, creation
         source_id=extraction.source_id if extraction.source_id else None,
         status="initial",
         text=extraction.text,
-        sentences=enhanced_sentences,
+        sentences=sorted(enhanced_sentences + [{"hlc_id": link["hlc_id"], "text": link["text"], "index": link["index"]} for link in hlc_links], key=lambda s: s["index"]),
         entities_recommended=entities_recommended,
         relationships=None,
         creation_time=creation_time
     )
     return response
 
-# test function to check the nltk --> could be written much better, especially for the future if it should be configurable... for now, just a quick test
-def extraction_create_optimized_nltk(driver, nlp, extraction_id, extraction, creation_time, sentences, entities_recommended):
+def hlc_row(extraction_id, sentence):
+    return {
+        "extraction_id": extraction_id,
+        "hlc_id": sentence["hlc_id"],
+        "text": sentence["text"],
+        "index": sentence["index"],
+        "content_hash": get_text_hash(sentence["text"]),
+        "analysis": sentence.get("analysis"),
+        "ngrams": sentence.get("ngrams")
+    }
+
+async def link_known_sentences(storage, extraction_id, sentences, known_hashes, start_index=0):
     """
-    This function computes all nodes and relationships in RAM before sending them
-    in a minimal number of batched queries to the database.
+    Sentence deduplication: sentences whose content hash already exists as HLC (in the storage or earlier
+    in the same extraction, known_hashes {content_hash: hlc_id}) are linked to that HLC instead of being created.
+    Returns (new_sentences, hlc_links), every sentence gets its "index" in the extraction.
     """
-    logging.info(f"Starting optimized extraction for ID: {extraction_id}")
-    stopsigns = {" ", ".", ",", ":", ";", "!", "?", "-", "_", "(", ")", "[", "]", "{", "}", "", "\n", "\"", "'", "/", "\n\n"}
-    stopwords = get_english_stopwords()
+    hashes = []
+    for index, sentence in enumerate(sentences, start=start_index):
+        sentence["index"] = index
+        hashes.append(get_text_hash(sentence["text"]))
+
+    known_hashes.update(await storage.find_hlcs_by_hash([content_hash for content_hash in hashes if content_hash not in known_hashes]))
+
+    new_sentences = []
+    hlc_links = []
+    for sentence, content_hash in zip(sentences, hashes):
+        if content_hash in known_hashes:
+            hlc_links.append({"extraction_id": extraction_id, "hlc_id": known_hashes[content_hash], "index": sentence["index"], "text": sentence["text"]})
+        else:
+            known_hashes[content_hash] = sentence["hlc_id"]
+            new_sentences.append(sentence)
+    return new_sentences, hlc_links
+
+def prepare_extraction(tokenizer, extraction_id, extraction, sentences, token_filter=None, start_index=0):
+    """
+    CPU part of extraction_create_with_tokenizer: tokens, MLC counts, HAS_CHAIN rows and RELATED_TO rows.
+    Returns (enhanced_sentences, mlc_counter, hlc_to_mlc_chain, mlc_to_mlc_relationships).
+    start_index is the index of the first sentence, if only a part of the extraction is prepared (ingestion_pipeline).
+    """
+    token_filter = token_filter or get_token_filter()
+    cooccurrence_strategy, cooccurrence_window = get_cooccurrence_settings(extraction)
 
     time_spend_on_task = {}
 
-    # --- (1) PREPARE ALL DATA IN PYTHON ---
-    
     all_mlcs = []
     enhanced_sentences = []
     hlc_to_mlc_chain = []
-    # Using a Counter is highly efficient for aggregating relationship strengths
-    related_to_strength_counter = Counter()
+    # filtered tokens per sentence, the pairs are counted for all sentences at once (vectorized)
+    filtered_sentences = []
 
-    for index, sentence in enumerate(sentences):
+    for index, sentence in enumerate(sentences, start=start_index):
         start_time = time.time()
-        nltk_tokens = get_nltk_tokens(sentence["text"])
-        time_spend_on_task["tokenization"] = time.time() - start_time
+        # tokens are already available if the sentences come from tokenizer.analyse (e.g. a single spacy parse)
+        tokens = sentence["tokens"] if sentence.get("tokens") is not None else tokenizer.tokenize(sentence["text"])
+        time_spend_on_task["tokenization"] = time_spend_on_task.get("tokenization", 0) + time.time() - start_time
         after_tokenization = time.time()
 
         # Store all MLCs for bulk creation later
-        all_mlcs.extend(nltk_tokens)
+        all_mlcs.extend(tokens)
+
+        # Filter out stopwords and signs for the RELATED_TO relationships and the n-grams
+        filtered_tokens = token_filter.filter(tokens)
         
         # Prepare sentence data with tokens for the response object
         enhanced_sentences.append({
             "hlc_id": sentence["hlc_id"],
             "text": sentence["text"],
-            "index": index,
-            "mlcs": nltk_tokens
+            # set by link_known_sentences if deduplicated sentences are left out
+            "index": sentence.get("index", index),
+            "mlcs": tokens,
+            "analysis": sentence.get("analysis"),
+            "ngrams": get_ngrams(filtered_tokens)
         })
         
         # Prepare data for (HLC)-[:HAS_CHAIN]->(MLC) relationships
-        for order, token in enumerate(nltk_tokens):
+        for order, token in enumerate(tokens):
             hlc_to_mlc_chain.append({
                 "hlc_id": sentence["hlc_id"],
                 "mlc_id": token,
@@ -193,18 +191,15 @@ def extraction_create_optimized_nltk(driver, nlp, extraction_id, extraction, cre
             })
 
         # Prepare data for (MLC)-[:RELATED_TO]->(MLC) relationships
-        # Filter out stopwords and signs for these relationships
-        filtered_tokens = [token for token in nltk_tokens if token.lower() not in stopwords and token not in stopsigns]
-        
-        # Generate all unique pairs within the sentence
-        for i in range(len(filtered_tokens)):
-            for j in range(i + 1, len(filtered_tokens)):
-                # Sorting the pair ensures that (a, b) and (b, a) are treated as the same relationship
-                pair = tuple(sorted((filtered_tokens[i], filtered_tokens[j])))
-                related_to_strength_counter[pair] += 1
+        filtered_sentences.append(filtered_tokens)
 
-        rest = time.time() - after_tokenization
-        time_spend_on_task["rest"] = rest
+        time_spend_on_task["rest"] = time_spend_on_task.get("rest", 0) + time.time() - after_tokenization
+
+    # Generate the co-occurring pairs of all sentences (all pairs or a sliding window, see data_processor.cooccurrence)
+    # The pairs are sorted, so (a, b) and (b, a) are treated as the same relationship
+    start_time = time.time()
+    related_to_strength_counter = count_cooccurrences_vectorized(filtered_sentences, cooccurrence_strategy, cooccurrence_window)
+    time_spend_on_task["cooccurrence"] = time.time() - start_time
 
     logging.info(f"Time spent on task for extraction {extraction_id}: {time_spend_on_task}")
 
@@ -214,76 +209,139 @@ def extraction_create_optimized_nltk(driver, nlp, extraction_id, extraction, cre
         for pair, strength in related_to_strength_counter.items()
     ]
 
-    # --- (2) EXECUTE MINIMAL DATABASE QUERIES ---
+    return enhanced_sentences, Counter(all_mlcs), hlc_to_mlc_chain, mlc_to_mlc_relationships
 
-    with driver.session() as session:
-        # Query 1: Create the main Extraction node
-        session.run(
-            "CREATE (e:Extraction {id: $extraction_id, text: $text, creation_time: $creation_time, status: 'initial', textual_identifier: $textual_identifier, source_id: $source_id})",
-            extraction_id=extraction_id, text=extraction.text, creation_time=creation_time,
-            textual_identifier=extraction.textual_identifier if extraction.textual_identifier else None,
-            source_id=extraction.source_id if extraction.source_id else None
-        )
-        logging.info("Step 1/5: Extraction node created.")
-
-        # Query 2: Bulk create all unique MLC nodes from the entire text
-        add_nodes(driver, all_mlcs, "MLC")
-        logging.info(f"Step 2/5: {len(set(all_mlcs))} unique MLC nodes created.")
-
-        # Query 3: Bulk create all HLC nodes and link them to the Extraction node
-        sentences_with_index = [{"hlc_id": s["hlc_id"], "text": s["text"], "index": s["index"]} for s in enhanced_sentences]
-        session.run(
-            """
-            MATCH (e:Extraction {id: $extraction_id})
-            UNWIND $sentences AS s
-            CREATE (hlc:HLC {id: s.hlc_id, text: s.text, creation_time: $creation_time})
-            CREATE (e)-[:HAS_HLC {order: s.index}]->(hlc)
-            """,
-            extraction_id=extraction_id, sentences=sentences_with_index, creation_time=creation_time
-        )
-        logging.info(f"Step 3/5: {len(sentences_with_index)} HLC nodes and their relationships to Extraction created.")
-
-        # Query 4: Bulk create all (HLC)-[:HAS_CHAIN]->(MLC) relationships
-        session.run(
-            """
-            UNWIND $chain_data AS data
-            MATCH (hlc:HLC {id: data.hlc_id})
-            MATCH (mlc:MLC {id: data.mlc_id})
-            CREATE (hlc)-[r:HAS_CHAIN]->(mlc)
-            SET r.order = data.order
-            """,
-            chain_data=hlc_to_mlc_chain
-        )
-        logging.info(f"Step 4/5: {len(hlc_to_mlc_chain)} HAS_CHAIN relationships created.")
-
-        # Query 5: Bulk create/update all (MLC)-[:RELATED_TO]->(MLC) relationships
-        if mlc_to_mlc_relationships:
-            session.run(
-                """
-                UNWIND $relationships AS rel
-                MATCH (a:MLC {id: rel.mlc1})
-                MATCH (b:MLC {id: rel.mlc2})
-                MERGE (a)-[r:RELATED_TO]-(b)
-                ON CREATE SET r.strength = rel.strength
-                ON MATCH SET r.strength = r.strength + rel.strength
-                """,
-                relationships=mlc_to_mlc_relationships
-            )
-        logging.info(f"Step 5/5: {len(mlc_to_mlc_relationships)} RELATED_TO relationships created/updated.")
+async def extraction_create_optimized(storage, nlp, extraction_id, extraction, creation_time, sentences, entities_recommended, stats=None, token_filter=None):
+    """
+    Optimized extraction using the spaCy tokenizer, see extraction_create_with_tokenizer.
+    """
+    return await extraction_create_with_tokenizer(storage, SpacyTokenizer(nlp), extraction_id, extraction, creation_time, sentences, entities_recommended, stats=stats, token_filter=token_filter)
 
-    logging.info(f"Extraction {extraction_id} created successfully.")
+# test function to check the nltk tokenizer - kept for the speed comparisons, the backend can be selected per extraction now
+async def extraction_create_optimized_nltk(storage, nlp, extraction_id, extraction, creation_time, sentences, entities_recommended, stats=None, token_filter=None):
+    """
+    Optimized extraction using the NLTK tokenizer, see extraction_create_with_tokenizer.
+    """
+    # always tokenize with nltk, even if the sentences already contain tokens of another backend
+    sentences = [{"hlc_id": sentence["hlc_id"], "text": sentence["text"]} for sentence in sentences]
+    return await extraction_create_with_tokenizer(storage, NltkTokenizer(), extraction_id, extraction, creation_time, sentences, entities_recommended, stats=stats, token_filter=token_filter)
 
-    # --- (3) RETURN RESPONSE ---
+async def extraction_create_bulk(storage, tokenizers, extractions, creation_time, batch_size=50, n_process=1, stats=None, token_filter=None, nlp_executor=None):
+    """
+    Ingests multiple extractions at once. The texts are tokenized in batches per tokenizer
+    backend (nlp.pipe for spaCy, tokenizers as created by data_processor.tokenizers.create_tokenizers),
+    MLC counts and RELATED_TO strengths are aggregated over all documents in RAM and the
+    whole batch is written with a fixed number of UNWIND queries (independent of the number of documents).
+    Sentences are not deduplicated here, duplicated documents are filtered by the bulk route.
+    With an nlp_executor the tokenization takes a slot of its document lane (NlpExecutorBusy if none gets free).
+    """
+    logging.info(f"Starting bulk extraction for {len(extractions)} documents")
+    start_time = time.time()
+
+    # --- (1) TOKENIZE ALL DOCUMENTS IN BATCHES (worker thread) ---
+    prepare = partial(prepare_bulk, tokenizers, extractions, batch_size, n_process, token_filter)
+    if nlp_executor:
+        prepared = await nlp_executor.run_batch(prepare)
+    else:
+        prepared = await asyncio.to_thread(prepare)
+    documents, extraction_rows, hlc_rows, hlc_to_mlc_chain, mlc_counter, mlc_to_mlc_relationships = prepared
+    tokenization_time = time.time() - start_time
+
+    # --- (2) WRITE THE WHOLE BATCH WITH 5 (CHUNKED) QUERIES ---
+
+    await storage.create_extractions(extraction_rows, creation_time, stats=stats)
+    logging.info(f"Step 1/5: {len(extraction_rows)} Extraction nodes created.")
+
+    await storage.merge_mlcs(mlc_counter, stats=stats)
+    logging.info(f"Step 2/5: {len(mlc_counter)} unique MLC nodes created/updated.")
+
+    await storage.create_hlcs(hlc_rows, creation_time, stats=stats)
+    logging.info(f"Step 3/5: {len(hlc_rows)} HLC nodes and their relationships to Extractions created.")
+
+    await storage.create_chains(hlc_to_mlc_chain, stats=stats)
+    logging.info(f"Step 4/5: {len(hlc_to_mlc_chain)} HAS_CHAIN relationships created.")
+
+    await storage.upsert_cooccurrences(mlc_to_mlc_relationships, stats=stats)
+    logging.info(f"Step 5/5: {len(mlc_to_mlc_relationships)} RELATED_TO relationships created/updated.")
+
+    total_time = time.time() - start_time
+    total_tokens = sum(document["tokens"] for document in documents)
+
+    summary = {
+        "documents": len(documents),
+        "sentences": len(hlc_rows),
+        "tokens": total_tokens,
+        "unique_mlcs": len(mlc_counter),
+        "related_to_pairs": len(mlc_to_mlc_relationships),
+        "tokenization_seconds": round(tokenization_time, 3),
+        "write_seconds": round(total_time - tokenization_time, 3),
+        "total_seconds": round(total_time, 3),
+        "documents_per_second": round(len(documents) / total_time, 2) if total_time > 0 else None,
+        "tokens_per_second": round(total_tokens / total_time, 2) if total_time > 0 else None
+    }
+    logging.info(f"Bulk extraction finished: {summary}")
+
+    return documents, summary
+
+def prepare_bulk(tokenizers, extractions, batch_size=50, n_process=1, token_filter=None):
+    """
+    CPU part of extraction_create_bulk. Returns (documents, extraction_rows, hlc_rows,
+    hlc_to_mlc_chain, mlc_counter, mlc_to_mlc_relationships).
+    """
+    token_filter = token_filter or get_token_filter()
 
-    response = ExtractionResponseModel(
-        extraction_id=extraction_id,
-        textual_identifier=extraction.textual_identifier if extraction.textual_identifier else None,
-        source_id=extraction.source_id if extraction.source_id else None,
-        status="initial",
-        text=extraction.text,
-        sentences=enhanced_sentences,
-        entities_recommended=entities_recommended,
-        relationships=None,
-        creation_time=creation_time
-    )
-    return response
\ No newline at end of file
+    extraction_rows = []
+    hlc_rows = []
+    hlc_to_mlc_chain = []
+    mlc_counter = Counter()
+    filtered_sentences = {}
+    documents = []
+
+    # documents are grouped by their tokenizer, so every backend can process its texts in batches
+    tokenizer_groups = {}
+    for position, extraction in enumerate(extractions):
+        tokenizer_groups.setdefault(getattr(extraction, "tokenizer", None), []).append(position)
+
+    analyses = [None] * len(extractions)
+    for tokenizer_name, positions in tokenizer_groups.items():
+        tokenizer = get_tokenizer(tokenizers, tokenizer_name)
+        texts = [extractions[position].text for position in positions]
+        for position, analysis in zip(positions, tokenizer.analyse_many(texts, batch_size=batch_size, n_process=n_process)):
+            analyses[position] = analysis
+
+    for extraction, analysed_sentences in zip(extractions, analyses):
+        extraction_id = str(uuid.uuid4())
+        cooccurrence_strategy, cooccurrence_window = get_cooccurrence_settings(extraction)
+
+        extraction_rows.append(extraction_row(extraction_id, extraction, "initial"))
+
+        for index, sentence in enumerate(analysed_sentences):
+            hlc_id = str(uuid.uuid4())
+            tokens = sentence["tokens"]
+            filtered_tokens = token_filter.filter(tokens)
+            hlc_rows.append(hlc_row(extraction_id, {"hlc_id": hlc_id, "text": sentence["text"], "index": index, "analysis": get_hlc_analysis(sentence), "ngrams": get_ngrams(filtered_tokens)}))
+
+            mlc_counter.update(tokens)
+            for order, token in enumerate(tokens):
+                hlc_to_mlc_chain.append({"hlc_id": hlc_id, "mlc_id": token, "order": order})
+
+            # grouped by co-occurrence settings, documents of the batch may use different strategies
+            filtered_sentences.setdefault((cooccurrence_strategy, cooccurrence_window), []).append(filtered_tokens)
+
+        documents.append({
+            "extraction_id": extraction_id,
+            "textual_identifier": extraction.textual_identifier if extraction.textual_identifier else None,
+            "sentences": len(analysed_sentences),
+            "tokens": sum(len(sentence["tokens"]) for sentence in analysed_sentences)
+        })
+
+    related_to_strength_counter = Counter()
+    for (cooccurrence_strategy, cooccurrence_window), sentences_tokens in filtered_sentences.items():
+        related_to_strength_counter.update(count_cooccurrences_vectorized(sentences_tokens, cooccurrence_strategy, cooccurrence_window))
+
+    mlc_to_mlc_relationships = [
+        {"mlc1": pair[0], "mlc2": pair[1], "strength": strength}
+        for pair, strength in related_to_strength_counter.items()
+    ]
+
+    return documents, extraction_rows, hlc_rows, hlc_to_mlc_chain, mlc_counter, mlc_to_mlc_relationships
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from data_processor.tokenizers import get_tokenizer
+from helper_test import create_hlc_sentences, extraction_create_with_tokenizer
+from ingestion_pipeline import PIPELINE_THRESHOLD, extraction_create_pipelined
+
+# status flow of an ingestion job (also stored as status on the Extraction node)
+JOB_STAGES = ["queued", "tokenizing", "writing", "done"]
+
+# jobs waiting for a worker, every job keeps its full text in memory (0 = unbounded)
+INGESTION_QUEUE_SIZE = int(os.getenv("INGESTION_QUEUE_SIZE", "1000"))
+
+class IngestionQueueFull(Exception):
+    """Raised when the ingestion queue holds INGESTION_QUEUE_SIZE jobs (answered with 503 by the app)."""
+
+class IngestionQueue:
+    """
+        Queue for extraction ingestion jobs. The POST request only enqueues the job,
+        a pool of workers tokenizes and writes the extractions in the background.
+    """
+
+    def __init__(self, storage, tokenizers, token_filter, concurrency=None, max_finished_jobs=1000, nlp_executor=None, read_cache=None, max_queued=None):
+        self.storage = storage
+        # cached reads are invalidated whenever a job changes the graph
+        self.read_cache = read_cache
+        self.tokenizers = tokenizers
+        self.nlp_executor = nlp_executor
+        self.token_filter = token_filter
+        self.concurrency = concurrency or int(os.getenv("INGESTION_WORKERS", "2"))
+        self.max_finished_jobs = max_finished_jobs
+        self.queue = asyncio.Queue(maxsize=INGESTION_QUEUE_SIZE if max_queued is None else max_queued)
+        self.jobs = OrderedDict()
+        self.workers = []
+
+    def start(self):
+        self.workers = [asyncio.create_task(self.worker(index)) for index in range(self.concurrency)]
+        logging.info(f"Ingestion queue started with {self.concurrency} workers")
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def check_capacity(self):
+        if self.queue.full():
+            raise IngestionQueueFull(f"Ingestion queue is full ({self.queue.maxsize} jobs waiting)")
+
+    async def enqueue(self, extraction_id, extraction, creation_time):
+        """Creates the queued Extraction node and submits the job, raises IngestionQueueFull before writing anything if the queue is full."""
+        self.check_capacity()
+        await self.storage.create_extraction(extraction_id, extraction, creation_time, "queued")
+        try:
+            return self.submit(extraction_id, extraction, creation_time)
+        except IngestionQueueFull:
+            # the last slot was taken while the node was written
+            await self.storage.set_extraction_status(extraction_id, "failed")
+            raise
+
+    def submit(self, extraction_id, extraction, creation_time):
+        """Registers the job and puts it into the queue, returns the job status (IngestionQueueFull if the queue is full)."""
+        job = {
+            "extraction_id": extraction_id,
+            "status": "queued",
+            "progress": 0.0,
+            "sentences": None,
+            "tokens": None,
+            "error": None,
+            "queued_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "timings": {},
+            "write_stats": {},
+            "pipeline": None,
+            # not part of the status response
+            "extraction": extraction,
+            "creation_time": creation_time
+        }
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise IngestionQueueFull(f"Ingestion queue is full ({self.queue.maxsize} jobs waiting)")
+        self.jobs[extraction_id] = job
+        return self.get_status(extraction_id)
+
+    def get_status(self, extraction_id):
+        job = self.jobs.get(extraction_id)
+        if job is None:
+            return None
+
+        status = {key: value for key, value in job.items() if key not in ("extraction", "creation_time", "stage_started_at")}
+        status["queue_size"] = self.queue.qsize()
+        return status
+
+    async def set_stage(self, job, stage):
+        """Moves the job to the next stage and records the time spent in the previous one."""
+        now = time.time()
+        previous_stage = job["status"]
+        job["timings"][previous_stage] = round(now - job.get("stage_started_at", job["queued_at"]), 3)
+        job["stage_started_at"] = now
+        job["status"] = stage
+        if stage in JOB_STAGES:
+            job["progress"] = JOB_STAGES.index(stage) / (len(JOB_STAGES) - 1)
+        await self.storage.set_extraction_status(job["extraction_id"], stage)
+        if self.read_cache is not None:
+            self.read_cache.invalidate()
+
+    async def run_job(self, job):
+        """Tokenization runs in the NLP executor (or a worker thread), the writes use the async storage on the event loop."""
+        extraction = job["extraction"]
+
+        tokenizer = get_tokenizer(self.tokenizers, extraction.tokenizer)
+
+        await self.set_stage(job, "tokenizing")
+        if len(extraction.text) >= PIPELINE_THRESHOLD:
+            await self.run_pipelined_job(job, tokenizer)
+            return
+
+        if self.nlp_executor:
+            # block: background jobs wait for a free slot instead of failing when the NLP queue is full
+            analysed_sentences = await self.nlp_executor.analyse(tokenizer.name, extraction.text, block=True)
+        else:
+            analysed_sentences = await asyncio.to_thread(tokenizer.analyse, extraction.text)
+        if not analysed_sentences:
+            raise ValueError(f"System could not split text into sentences based on {tokenizer.name} processing.")
+
+        sentences = create_hlc_sentences(analysed_sentences)
+        job["sentences"] = len(sentences)
+        job["tokens"] = sum(len(sentence["tokens"]) for sentence in sentences)
+
+        await self.set_stage(job, "writing")
+        await extraction_create_with_tokenizer(self.storage, tokenizer, job["extraction_id"], extraction, job["creation_time"], sentences, [], stats=job["write_stats"], token_filter=self.token_filter)
+
+        await self.set_stage(job, "done")
+
+    async def run_pipelined_job(self, job, tokenizer):
+        """Long texts: blocks are tokenized while the previous ones are written (ingestion_pipeline)."""
+        extraction = job["extraction"]
+        job["pipeline"] = {}
+        response = await extraction_create_pipelined(
+            self.storage, tokenizer, job["extraction_id"], extraction, job["creation_time"],
+            stats=job["write_stats"], token_filter=self.token_filter, nlp_executor=self.nlp_executor,
+            pipeline_stats=job["pipeline"], on_writing=lambda: self.set_stage(job, "writing")
+        )
+        job["sentences"] = len(response.sentences)
+        job["tokens"] = job["pipeline"]["tokenize"]["rows"]
+        await self.set_stage(job, "done")
+
+    async def worker(self, index):
+        while True:
+            job = await self.queue.get()
+            job["started_at"] = time.time()
+            try:
+                await self.run_job(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                logging.exception(f"Ingestion job {job['extraction_id']} failed")
+                job["error"] = str(error)
+                try:
+                    await self.set_stage(job, "failed")
+                except Exception:
+                    logging.exception(f"Could not set status 'failed' for extraction {job['extraction_id']}")
+                    job["status"] = "failed"
+            finally:
+                job["finished_at"] = time.time()
+                job["extraction"] = None  # free the text, the status is kept
+                self.queue.task_done()
+                self.forget_finished_jobs()
+
+    def forget_finished_jobs(self):
+        finished = [extraction_id for extraction_id, job in self.jobs.items() if job["status"] in ("done", "failed")]
+        for extraction_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self.jobs[extraction_id]
@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import os
+import time
+
+from data_processor.content_hash import should_deduplicate_sentences
+from helper_test import create_hlc_sentences, hlc_row, link_known_sentences, prepare_extraction
+from models.extraction_models import ExtractionResponseModel
+
+# characters per block that is tokenized at once, blocks are cut at paragraph/line boundaries
+PIPELINE_BLOCK_CHARACTERS = int(os.getenv("PIPELINE_BLOCK_CHARACTERS", "50000"))
+# items between two stages, a full queue pauses the stage before it (bounded memory)
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+# the ingestion queue uses the pipeline for texts with at least this many characters
+PIPELINE_THRESHOLD = int(os.getenv("PIPELINE_THRESHOLD", "100000"))
+
+PIPELINE_STAGES = ["segment", "tokenize", "aggregate", "write"]
+
+def split_text_blocks(text, block_characters=None):
+    """
+        Yields blocks of at most block_characters, joined they are the text again (also whitespace-only blocks).
+        A block ends at the last blank line, else at the last line break, else at the last space before the limit.
+        A sentence can still be cut, the tokenize stage carries the last sentence of a block over to the next one.
+    """
+    block_characters = block_characters or PIPELINE_BLOCK_CHARACTERS
+    position = 0
+    while position < len(text):
+        end = position + block_characters
+        if end >= len(text):
+            cut = len(text)
+        else:
+            cut = -1
+            for separator in ("\n\n", "\n", " "):
+                cut = text.rfind(separator, position + 1, end)
+                if cut != -1:
+                    cut += len(separator)
+                    break
+            if cut == -1:
+                cut = end
+        yield text[position:cut]
+        position = cut
+
+def get_last_sentence_start(block, analysed_sentences):
+    """Start of the last sentence of the analysis in the block, None if it is not found (the block is not carried over)."""
+    last_sentence = analysed_sentences[-1]
+    if last_sentence.get("start_char") is not None:
+        return last_sentence["start_char"]
+    start = block.rfind(last_sentence["text"])
+    return start if start != -1 else None
+
+class StageCounter:
+    """
+        Throughput of a pipeline stage, busy time does not include waiting for the queues.
+        Rows are characters (segment), tokens (tokenize), sentences (aggregate) and written rows (write).
+    """
+
+    def __init__(self):
+        self.items = 0
+        self.rows = 0
+        self.busy_seconds = 0.0
+
+    def add(self, start_time, rows=0):
+        self.items += 1
+        self.rows += rows
+        self.busy_seconds += time.perf_counter() - start_time
+
+    def get_stats(self):
+        return {
+            "items": self.items,
+            "rows": self.rows,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "rows_per_second": round(self.rows / self.busy_seconds, 1) if self.busy_seconds > 0 else None
+        }
+
+async def extraction_create_pipelined(storage, tokenizer, extraction_id, extraction, creation_time, entities_recommended=None, stats=None,
+                                      token_filter=None, nlp_executor=None, block_characters=None, queue_size=None, pipeline_stats=None, on_writing=None):
+    """
+    Ingests a long text as a pipeline: segment -> tokenize -> aggregate -> write, connected by bounded queues.
+    While block N is written to the graph storage, block N+1 is tokenized, so the wall-clock time is
+    roughly max(CPU, DB) instead of CPU + DB. All writes are additive (MLC counts, RELATED_TO strengths).
+    The last sentence of a block may be cut by the block boundary, it is tokenized again at the front of
+    the next block, so the sentences end where the tokenizer ends them and the graph is the same as with
+    extraction_create_with_tokenizer (a statistical sentence splitter like spaCy's can still decide differently
+    with less context around a boundary).
+
+    The throughput per stage is stored in pipeline_stats (if given), on_writing is awaited when the first
+    batch is written to the graph (e.g. to move an ingestion job to 'writing'), tokenization may still run.
+    """
+    queue_size = queue_size or PIPELINE_QUEUE_SIZE
+    deduplicate_sentences = should_deduplicate_sentences(extraction)
+    # content hash -> hlc id of the sentences seen so far, a sentence repeated in a later block is linked too
+    known_hashes = {}
+    blocks = asyncio.Queue(maxsize=queue_size)
+    sentence_batches = asyncio.Queue(maxsize=queue_size)
+    write_batches = asyncio.Queue(maxsize=queue_size)
+    counters = {stage: StageCounter() for stage in PIPELINE_STAGES}
+    enhanced_sentences = []
+    pipeline_start = time.perf_counter()
+
+    logging.info(f"Starting pipelined extraction for ID: {extraction_id}")
+
+    async def segment():
+        start_time = time.perf_counter()
+        for block in split_text_blocks(extraction.text, block_characters):
+            counters["segment"].add(start_time, len(block))
+            await blocks.put(block)
+            start_time = time.perf_counter()
+        await blocks.put(None)
+
+    async def tokenize():
+        sentence_count = 0
+        # the possibly incomplete last sentence of the previous block
+        carry = ""
+        last_block = False
+        while not last_block:
+            block = await blocks.get()
+            last_block = block is None
+            block = carry + (block or "")
+            carry = ""
+            if not block.strip():
+                carry = block
+                continue
+            start_time = time.perf_counter()
+            if nlp_executor:
+                # block: waits for a free slot instead of failing when the NLP queue is full
+                analysed_sentences = await nlp_executor.analyse(tokenizer.name, block, block=True)
+            else:
+                analysed_sentences = await asyncio.to_thread(tokenizer.analyse, block)
+            # a single sentence longer than a block is cut, it would be tokenized again with every block
+            if not last_block and len(analysed_sentences) > 1:
+                last_sentence_start = get_last_sentence_start(block, analysed_sentences)
+                if last_sentence_start is not None:
+                    carry = block[last_sentence_start:]
+                    analysed_sentences = analysed_sentences[:-1]
+            sentences = create_hlc_sentences(analysed_sentences)
+            counters["tokenize"].add(start_time, sum(len(sentence["tokens"]) for sentence in sentences))
+            if sentences:
+                await sentence_batches.put((sentence_count, sentences))
+                sentence_count += len(sentences)
+        await sentence_batches.put(None)
+        if sentence_count == 0:
+            raise ValueError(f"System could not split text into sentences based on {tokenizer.name} processing.")
+
+    async def aggregate():
+        while (batch := await sentence_batches.get()) is not None:
+            start_index, sentences = batch
+            start_time = time.perf_counter()
+            sentences_count = len(sentences)
+            hlc_links = []
+            if deduplicate_sentences:
+                sentences, hlc_links = await link_known_sentences(storage, extraction_id, sentences, known_hashes, start_index)
+            prepared = await asyncio.to_thread(prepare_extraction, tokenizer, extraction_id, extraction, sentences, token_filter, start_index)
+            counters["aggregate"].add(start_time, sentences_count)
+            await write_batches.put((prepared, hlc_links))
+        await write_batches.put(None)
+
+    async def write():
+        # the Extraction node first (may already exist with status 'queued' if it is ingested as a job)
+        start_time = time.perf_counter()
+        await storage.upsert_extraction(extraction_id, extraction, creation_time)
+        counters["write"].add(start_time, 1)
+
+        first_batch = True
+        while (batch := await write_batches.get()) is not None:
+            if first_batch and on_writing:
+                await on_writing()
+            first_batch = False
+            (sentences, mlc_counter, hlc_to_mlc_chain, mlc_to_mlc_relationships), hlc_links = batch
+            start_time = time.perf_counter()
+            # same order as extraction_create_with_tokenizer: nodes before the relationships between them
+            await storage.merge_mlcs(mlc_counter, stats=stats)
+            hlc_rows = [hlc_row(extraction_id, s) for s in sentences]
+            await storage.create_hlcs(hlc_rows, creation_time, stats=stats)
+            # linked HLCs are created in this or an earlier batch, or already stored
+            if hlc_links:
+                await storage.link_hlcs(hlc_links, stats=stats)
+            await storage.create_chains(hlc_to_mlc_chain, stats=stats)
+            await storage.upsert_cooccurrences(mlc_to_mlc_relationships, stats=stats)
+            counters["write"].add(start_time, len(mlc_counter) + len(hlc_rows) + len(hlc_links) + len(hlc_to_mlc_chain) + len(mlc_to_mlc_relationships))
+            enhanced_sentences.extend(sentences)
+            enhanced_sentences.extend({"hlc_id": link["hlc_id"], "text": link["text"], "index": link["index"]} for link in hlc_links)
+
+    def get_summary():
+        wall_seconds = time.perf_counter() - pipeline_start
+        busy_seconds = sum(counter.busy_seconds for counter in counters.values())
+        summary = {stage: counter.get_stats() for stage, counter in counters.items()}
+        summary["wall_seconds"] = round(wall_seconds, 3)
+        # > 1 if stages ran at the same time
+        summary["overlap"] = round(busy_seconds / wall_seconds, 2) if wall_seconds > 0 else None
+        return summary
+
+    tasks = [asyncio.create_task(stage()) for stage in (segment, tokenize, aggregate, write)]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        # a failed stage stops the others, they could wait forever on a full or empty queue
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    finally:
+        summary = get_summary()
+        if pipeline_stats is not None:
+            pipeline_stats.update(summary)
+
+    logging.info(f"Pipelined extraction {extraction_id} created successfully: {summary}")
+
+    return ExtractionResponseModel(
+        extraction_id=extraction_id,
+        textual_identifier=extraction.textual_identifier if extraction.textual_identifier else None,
+        source_id=extraction.source_id if extraction.source_id else None,
+        status="initial",
+        text=extraction.text,
+        sentences=sorted(enhanced_sentences, key=lambda s: s["index"]),
+        entities_recommended=entities_recommended or [],
+        relationships=None,
+        creation_time=creation_time
+    )
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Literal, Optional, List
 
 class Entity(BaseModel):
     """ Model for an entity in the extraction task. """
@@ -38,9 +38,14 @@ class ExtractionResponseModel(BaseModel):
     relationships: Optional[List[str]] = Field(None, description="List of relationships present in extraction")
     creation_time: Optional[str] = Field(None, description="Creation time of the extraction task")
     entities: Optional[List[Entity]] = Field(None, description="List of entities already existing in the extraction")
+    deduplicated: Optional[bool] = Field(None, description="True if the same content was already ingested and the existing extraction is returned")
 
 class ExtractionCreateModel(BaseModel):
     """ Model for creating a new extraction task. """
     text: str = Field(..., description="Text to be processed for extraction")
     textual_identifier: Optional[str] = Field(None, description="Optional textual identifier for the extraction task")
     source_id: Optional[str] = Field(None, description="Optional source identifier for the extraction task")
+    cooccurrence_strategy: Optional[Literal["sentence", "window", "weighted_window"]] = Field(None, description="Strategy for RELATED_TO relationships: all pairs of a sentence, a sliding window or a distance-weighted window (default from COOCCURRENCE_STRATEGY)")
+    cooccurrence_window: Optional[int] = Field(None, ge=1, description="Window size in tokens for the window strategies (default from COOCCURRENCE_WINDOW)")
+    tokenizer: Optional[str] = Field(None, description="Tokenizer backend for sentences and tokens, e.g. spacy, nltk or regex (default from TOKENIZER_BACKEND, see GET /tokenizers)")
+    deduplicate_sentences: Optional[bool] = Field(None, description="Link sentences that already exist as HLCs instead of creating and counting them again (default from DEDUPLICATE_SENTENCES)")
@@ -1,6 +1,8 @@
 from datetime import datetime
 import uuid
 from fastapi import APIRouter, HTTPException, Request
+from database.read_cache import invalidate_read_cache
+from database.storage import get_neo4j_driver
 from models.entity_models import Entity as EntityModelForGeneration, EntityLinkingCreate
 
 router = APIRouter()
@@ -14,7 +16,7 @@ async def create_entity(request: Request, entity: EntityModelForGeneration):
     entity_id = str(uuid.uuid4())
     # get current time
     creation_time = datetime.now().isoformat()
-    driver = request.app.state.driver
+    driver = get_neo4j_driver(request)
 
     # if from hlc
     # -> remove old relationships to MLCs
@@ -24,9 +26,9 @@ async def create_entity(request: Request, entity: EntityModelForGeneration):
     if entity.from_hlc:
         if(entity.hlc_id == None):
             raise HTTPException(status_code=400, detail="HLC ID is required for entity creation from HLC")
-        with driver.session() as session:
+        async with driver.session() as session:
             # just add entity to HLC and Extraction
-            session.run(
+            await session.run(
                 "MERGE (hlc:HLC {id: $hlc_id}) "  # Ensure HLC exists
                 "MERGE (e:Extraction)-[:HAS_HLC]->(hlc) "  # Ensure Extraction exists
                 "MERGE (entity:Entity {id: $entity_id}) "
@@ -45,8 +47,8 @@ async def create_entity(request: Request, entity: EntityModelForGeneration):
         # if entity has MLC token IDs, create relationships to MLCs
         if entity.mlc_token_ids:
             for mlc_id in entity.mlc_token_ids:
-                with driver.session() as session:
-                    session.run(
+                async with driver.session() as session:
+                    await session.run(
                         "MATCH (entity:Entity {id: $entity_id}) "
                         "MATCH (mlc:MLC {id: $mlc_id}) "
                         "MERGE (entity)-[:COMBINATION_OF]->(mlc)",
@@ -57,8 +59,8 @@ async def create_entity(request: Request, entity: EntityModelForGeneration):
         print("[FROM-HLC-VIEW] Entity created from HLC with ID:", entity_id)
     else:
         # if not from hlc, just create entity
-        with driver.session() as session:
-            session.run(
+        async with driver.session() as session:
+            await session.run(
                 "CREATE (entity:Entity {id: $entity_id, text: $text, textual_identifier: $textual_identifier, creation_time: $creation_time})",
                 entity_id=entity_id,
                 text=entity.text,
@@ -67,6 +69,11 @@ async def create_entity(request: Request, entity: EntityModelForGeneration):
             )
         print("Entity created with ID:", entity_id)
 
+    request.app.state.storage.index_nodes("Entity", [{"id": entity_id, "text": entity.text, "textual_identifier": entity.textual_identifier}])
+    if getattr(request.app.state, "entity_matcher", None) is not None:
+        request.app.state.entity_matcher.add(entity_id, entity.text)
+    invalidate_read_cache(request)
+
     return {"id": entity_id, "text": entity.text, "textual_identifier": entity.textual_identifier, "creation_time": creation_time}
 
 @router.get("/entities/{entity_id}")
@@ -74,8 +81,8 @@ async def get_entity(request: Request, entity_id: str):
     """
     Retrieve a specific entity by its ID.
     """
-    driver = request.app.state.driver
-    with driver.session() as session:
+    driver = get_neo4j_driver(request)
+    async with driver.session() as session:
         # get Entity node by id and connected MLCs and connected HLCs
 
         # use this:
@@ -85,7 +92,7 @@ async def get_entity(request: Request, entity_id: str):
         # COLLECT({rel: r, neighbor: x}) AS relationships_with_neighbors,
         # COLLECT({rel_type: TYPE(r), neighbor: x.id, node_type: LABELS(x)[0], text: substring(x.text, 0, 150)}) AS simplified_connections
 
-        result = session.run(
+        result = await session.run(
             "MATCH (entity:Entity {id: $entity_id})-[r]-(x) "
             "WHERE TYPE(r) <> 'HAS_CHAIN' "
             "RETURN entity AS entity, "
@@ -93,7 +100,7 @@ async def get_entity(request: Request, entity_id: str):
             "COLLECT({rel_type: TYPE(r), neighbor: x.id, node_type: LABELS(x)[0], text: substring(x.text, 0, 150)}) AS simplified_connections",
             entity_id=entity_id
         )
-        record = result.single()
+        record = await result.single()
         if not record:
             raise HTTPException(status_code=404, detail="Entity not found")
         
@@ -122,12 +129,12 @@ async def get_entities_from_mlcs(request: Request, mlc_ids: str):
     if not mlc_ids_list:
         raise HTTPException(status_code=400, detail="No MLC IDs provided")
 
-    driver = request.app.state.driver
-    with driver.session() as session:
+    driver = get_neo4j_driver(request)
+    async with driver.session() as session:
         # lowered_mlcs = [mlc.lower() for mlc in mlc_ids_list]
         mlc_ids = [mlc for mlc in mlc_ids_list]
 
-        result = session.run(
+        result = await session.run(
             """
                 MATCH(e:Entity)-[:HAS_ENTITY]-(ext)
                 MATCH(mlc)-[:HAS_CHAIN]-(ext)
@@ -145,7 +152,7 @@ async def get_entities_from_mlcs(request: Request, mlc_ids: str):
         )
 
         entities = []
-        for record in result:
+        async for record in result:
             entity_node = record["e"]
             if entity_node:
                 entities.append({
@@ -169,10 +176,10 @@ async def link_entity(request: Request, entitylinking: EntityLinkingCreate):
     if not entitylinking.entity_id or not entitylinking.hlc_id:
         raise HTTPException(status_code=400, detail="Entity ID and HLC ID are required")
 
-    driver = request.app.state.driver
-    with driver.session() as session:
+    driver = get_neo4j_driver(request)
+    async with driver.session() as session:
         # create relationship between Entity and HLC, between Entity and Extraction of HLC, and between Entity and MLCs
-        session.run(
+        await session.run(
             "MATCH (entity:Entity {id: $entity_id}), (hlc:HLC {id: $hlc_id}) "
             "MERGE (hlc)-[:HAS_ENTITY]->(entity) "
             "MERGE (hlc)-[:HAS_CHAIN {order: $order}]->(entity) "
@@ -190,4 +197,5 @@ async def link_entity(request: Request, entitylinking: EntityLinkingCreate):
     
         # 
 
+    invalidate_read_cache(request)
     return {"message": "Entity linked to HLC successfully"}
\ No newline at end of file
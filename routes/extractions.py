@@ -1,49 +1,62 @@
+import codecs
 from datetime import datetime
+import json
+import logging
 import time
 import uuid
 from fastapi import APIRouter, HTTPException, Request
-from data_processor.data_transformer import get_spacy_sentences
-from helper import extraction_create, remove_all_nodes
-from helper_test import ExtractionResponseModel, extraction_create_optimized, extraction_create_optimized_nltk
+from pydantic import ValidationError
+from data_processor.content_hash import DEDUPLICATE_EXTRACTIONS, get_extraction_hash
+from database.read_cache import invalidate_read_cache
+from data_processor.nlp_executor import require_nlp
+from data_processor.tokenizers import DEFAULT_TOKENIZER, get_tokenizer
+from helper_test import ExtractionResponseModel, create_hlc_sentences, extraction_create_bulk, extraction_create_with_tokenizer
 from models.extraction_models import ExtractionCreateModel
 
 router = APIRouter()
 
+def select_tokenizer(request: Request, name):
+    require_nlp(request)
+    try:
+        return get_tokenizer(request.app.state.tokenizers, name)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+@router.get("/tokenizers")
+async def get_tokenizers(request: Request):
+    """
+    List the available tokenizer backends and the default one.
+    """
+    require_nlp(request)
+    return {"default": DEFAULT_TOKENIZER, "tokenizers": list(request.app.state.tokenizers.keys())}
+
 @router.get("/extractions")
 async def get_extractions(request: Request):
     """
     Retrieve all extractions.
     """
 
-    # get list of the last 10 extractions from the database
-    driver = request.app.state.driver
-    with driver.session() as session:
-        result = session.run(
-            "MATCH (e:Extraction) "
-            "RETURN e "
-            "ORDER BY e.creation_time DESC "
-            "LIMIT 10"
+    # get list of the last 10 extractions from the graph storage
+    storage = request.app.state.storage
+    extractions = []
+    for extraction_node in await storage.get_extractions(limit=10):
+        extraction = ExtractionResponseModel(
+            extraction_id=extraction_node["id"],
+            textual_identifier=extraction_node.get("textual_identifier"),
+            source_id=extraction_node.get("source_id"),
+            status=extraction_node["status"],
+            text=extraction_node["text"],
+            sentences=[],  # Placeholder for sentences
+            entities_recommended=None,  # Placeholder for entities
+            relationships=None,  # Placeholder for relationships
+            creation_time=extraction_node["creation_time"]
         )
-        extractions = []
-        for record in result:
-            extraction_node = record["e"]
-            extraction = ExtractionResponseModel(
-                extraction_id=extraction_node["id"],
-                textual_identifier=extraction_node.get("textual_identifier"),
-                source_id=extraction_node.get("source_id"),
-                status=extraction_node["status"],
-                text=extraction_node["text"],
-                sentences=[],  # Placeholder for sentences
-                entities_recommended=None,  # Placeholder for entities
-                relationships=None,  # Placeholder for relationships
-                creation_time=extraction_node["creation_time"]
-            )
-            extractions.append(extraction)
-
-        if not extractions:
-            raise HTTPException(status_code=404, detail="No extractions found")
-        
-        return extractions
+        extractions.append(extraction)
+
+    if not extractions:
+        raise HTTPException(status_code=404, detail="No extractions found")
+
+    return extractions
 
 @router.get("/extractions/{extraction_id}")
 async def get_extraction(request: Request,extraction_id: str):
@@ -51,76 +64,129 @@ async def get_extraction(request: Request,extraction_id: str):
     Retrieve a specific extraction by its ID.
     """
 
-    # retrieve extraction from database
-    driver = request.app.state.driver
-    with driver.session() as session:
-        # use cypher to find extraction by id and the corresponding HLCs 
-        result = session.run(
-        "MATCH (e:Extraction {id: $extraction_id})-[r:HAS_HLC]->(hlc:HLC) "
-        "WITH e, hlc, r.order AS pos "
-        "ORDER BY pos "
-        "WITH e, collect({id: hlc.id, text: hlc.text}) AS hlc_list "
-        "OPTIONAL MATCH (e)-[:HAS_ENTITY]->(entity:Entity) "
-        "RETURN "
-          "e AS extraction, "
-            "hlc_list, "
-            "collect(entity) as entities ",
-            extraction_id=extraction_id
-        )
-        record = result.single()
-        if not record:
-            raise HTTPException(status_code=404, detail="Extraction not found")
-
-        extraction_node = record["extraction"]
-        hlcs = record["hlc_list"]
-        entities = record["entities"]
-        
-        # create sentences from hlcs
-        # sentences = [{"hlc_id": hlc["id"], "text": hlc["text"]} for hlc in hlcs]
-
-        sentences = [{"hlc_id": hlc["id"], "text": hlc["text"]} for hlc in hlcs]
-        
-        
-        # entities_recommended = get_spacy_entities(extraction_node["text"])
-        # if entities_recommended is None or len(entities_recommended) == 0:
-        #     entities_recommended = None
-        # else:
-        #     entities_recommended = [Entity(text=ent[0], label=ent[1], start_char=ent[2], end_char=ent[3]) for ent in entities_recommended]
-        
-        response = ExtractionResponseModel(
-            extraction_id=extraction_node["id"],
-            textual_identifier=extraction_node.get("textual_identifier"),
-            source_id=extraction_node.get("source_id"),
-            status=extraction_node["status"],
-            text=extraction_node["text"],
-            sentences=sentences,
-            # entities_recommended=entities_recommended,
-            relationships=None,  # Placeholder for relationships
-            creation_time=extraction_node["creation_time"],
-            entities=entities
-        )
-        return response
+    # retrieve extraction and the corresponding HLCs from the graph storage
+    storage = request.app.state.storage
+    record = await storage.get_extraction(extraction_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Extraction not found")
+
+    extraction_node = record["extraction"]
+    hlcs = record["hlcs"]
+    entities = record["entities"]
+
+    # create sentences from hlcs
+    sentences = [{"hlc_id": hlc["id"], "text": hlc["text"]} for hlc in hlcs]
+
+    # entities_recommended = get_spacy_entities(extraction_node["text"])
+    # if entities_recommended is None or len(entities_recommended) == 0:
+    #     entities_recommended = None
+    # else:
+    #     entities_recommended = [Entity(text=ent[0], label=ent[1], start_char=ent[2], end_char=ent[3]) for ent in entities_recommended]
+
+    response = ExtractionResponseModel(
+        extraction_id=extraction_node["id"],
+        textual_identifier=extraction_node.get("textual_identifier"),
+        source_id=extraction_node.get("source_id"),
+        status=extraction_node["status"],
+        text=extraction_node["text"],
+        sentences=sentences,
+        # entities_recommended=entities_recommended,
+        relationships=None,  # Placeholder for relationships
+        creation_time=extraction_node["creation_time"],
+        entities=entities
+    )
+    return response
+
+@router.get("/extractions/{extraction_id}/status")
+async def get_extraction_status(request: Request, extraction_id: str):
+    """
+    Retrieve the ingestion status of an extraction (queued, tokenizing, writing, done, failed)
+    including progress and the time spent per stage.
+    """
+    # the queue only exists once the NLP pipeline is loaded
+    ingestion_queue = getattr(request.app.state, "ingestion_queue", None)
+    status = ingestion_queue.get_status(extraction_id) if ingestion_queue else None
+    if status:
+        return status
+
+    # job is not known (anymore) by this worker, fall back to the status stored in the graph
+    stored_status = await request.app.state.storage.get_extraction_status(extraction_id)
+    if stored_status is None:
+        raise HTTPException(status_code=404, detail="Extraction not found")
+
+    return {"extraction_id": extraction_id, "status": stored_status}
+
+async def get_duplicate_response(storage, extraction):
+    """The existing extraction with the same content hash as response (deduplicated=True), None if the content is new."""
+    existing = await storage.find_extraction_by_hash(get_extraction_hash(extraction))
+    if existing is None:
+        return None
+
+    stored = await storage.get_extraction(existing["id"])
+    return ExtractionResponseModel(
+        extraction_id=existing["id"],
+        textual_identifier=existing.get("textual_identifier"),
+        source_id=existing.get("source_id"),
+        status=existing.get("status") or "initial",
+        text=existing["text"],
+        # still empty while the existing extraction is queued
+        sentences=[{"hlc_id": hlc["id"], "text": hlc["text"]} for hlc in stored["hlcs"]] if stored else [],
+        entities_recommended=[],
+        relationships=None,
+        creation_time=existing.get("creation_time"),
+        deduplicated=True
+    )
 
 @router.post("/extractions")
-async def create_extraction(request: Request, extraction: ExtractionCreateModel):
+async def create_extraction(request: Request, extraction: ExtractionCreateModel, wait: bool = False, deduplicate: bool = DEDUPLICATE_EXTRACTIONS):
     """
     Create a new extraction task.
+
+    By default the extraction is queued and processed in the background, the progress
+    is available at /extractions/{extraction_id}/status. Use wait=true to process it within the request.
+
+    Content that is already ingested (same normalized text, tokenizer and co-occurrence settings) is not
+    counted a second time, the existing extraction is returned with deduplicated=true. Use deduplicate=false
+    to ingest it again anyway.
     """
     # load required context
-    spacy_context = request.app.state.spacy_context
-    driver = request.app.state.driver
+    storage = request.app.state.storage
+    tokenizer = select_tokenizer(request, extraction.tokenizer)
+
+    if deduplicate:
+        duplicate = await get_duplicate_response(storage, extraction)
+        if duplicate is not None:
+            return duplicate
 
     # create new unique id for extraction
     extraction_id = str(uuid.uuid4())
 
-    # get sentences from extraction text
-    sentences = get_spacy_sentences(spacy_context,extraction.text)
+    if not wait:
+        creation_time = datetime.now().isoformat()
+        # 503 if the queue is full, nothing is written then
+        await request.app.state.ingestion_queue.enqueue(extraction_id, extraction, creation_time)
+        invalidate_read_cache(request)
+
+        return ExtractionResponseModel(
+            extraction_id=extraction_id,
+            textual_identifier=extraction.textual_identifier if extraction.textual_identifier else None,
+            source_id=extraction.source_id if extraction.source_id else None,
+            status="queued",
+            text=extraction.text,
+            sentences=[],
+            entities_recommended=[],
+            relationships=None,
+            creation_time=creation_time
+        )
+
+    # parse the text once - sentences and tokens are derived from the same analysis (e.g. one spacy Doc)
+    analysed_sentences = await request.app.state.nlp_executor.analyse(tokenizer.name, extraction.text)
 
-    if not sentences:
-        raise HTTPException(status_code=400, detail="System could not split text into sentences based on spacy processing.")
+    if not analysed_sentences:
+        raise HTTPException(status_code=400, detail=f"System could not split text into sentences based on {tokenizer.name} processing.")
 
     # process sentences to create HLCs
-    sentences = [{"hlc_id": str(uuid.uuid4()), "text": sentence} for sentence in sentences]
+    sentences = create_hlc_sentences(analysed_sentences)
 
     # get entities from spacy
     # entities_recommended = get_spacy_entities(extraction.text)
@@ -159,17 +225,21 @@ async def create_extraction(request: Request, extraction: ExtractionCreateModel)
     # remove_all_nodes(driver)
     # print("Removed all nodes for testing the speed")
 
-    start_time = time.time()
+    # start_time = time.time()
     # using nltk tokenizor - testing for speed 
-    response = extraction_create_optimized_nltk(driver, spacy_context, extraction_id, extraction, creation_time, sentences, [])
+    # response = extraction_create_optimized_nltk(driver, spacy_context, extraction_id, extraction, creation_time, sentences, [])
+    # after_nltk = time.time()
 
-    after_nltk = time.time()
-    print(f"NLTK optimized extraction_create took {after_nltk - start_time:.2f} seconds")
+    # the tokens of the analysis are reused, no second tokenization needed
+    start_time = time.time()
+    try:
+        response = await extraction_create_with_tokenizer(storage, tokenizer, extraction_id, extraction, creation_time, sentences, [], token_filter=request.app.state.token_filter)
+    finally:
+        # also after a failed write, parts of the extraction may be written
+        invalidate_read_cache(request)
+    after_optimized = time.time()
 
-    print(f"Different execution times per model and process: ")
-    # print(f" - Old: {diff_for_old:.2f} seconds")
-    # print(f" - Optimized: {diff_for_optimized:.2f} seconds")
-    print(f" - NLTK: {after_nltk - start_time:.2f} seconds")
+    logging.debug(f"Extraction {extraction_id} ({tokenizer.name}) written in {after_optimized - start_time:.2f} seconds")
 
     response = ExtractionResponseModel(
         extraction_id=extraction_id,
@@ -177,9 +247,171 @@ async def create_extraction(request: Request, extraction: ExtractionCreateModel)
         source_id=extraction.source_id if extraction.source_id else None,
         status="initial",
         text=extraction.text,
-        sentences=sentences,  
+        sentences=response.sentences,  # linked HLCs (sentence deduplication) keep the id of the existing HLC
         entities_recommended=[], # return nothing for faster response time -> entity extraction at a later stage 
         relationships=None,  # Placeholder for relationships
         creation_time=creation_time
     )
     return response
+
+
+async def read_extraction_payloads(request: Request):
+    """
+    Yields ExtractionCreateModels from the request body. Supports a JSON array and
+    NDJSON (one extraction per line), NDJSON is read as a stream.
+    """
+    content_type = request.headers.get("content-type", "")
+
+    def to_model(payload, position):
+        try:
+            return ExtractionCreateModel(**payload)
+        except (TypeError, ValidationError) as error:
+            raise HTTPException(status_code=422, detail=f"Invalid extraction at position {position}: {error}")
+
+    def decode(decoder, chunk, final=False):
+        try:
+            return decoder.decode(chunk, final=final)
+        except UnicodeDecodeError as error:
+            raise HTTPException(status_code=400, detail=f"Body is not valid UTF-8: {error}")
+
+    def parse_line(line, line_number):
+        try:
+            return json.loads(line)
+        except json.JSONDecodeError as error:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON at line {line_number}: {error}")
+
+    if "ndjson" in content_type or "jsonl" in content_type:
+        # a multibyte character may be split between two chunks
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        buffer = ""
+        position = 0
+        line_number = 0
+        async for chunk in request.stream():
+            buffer += decode(decoder, chunk)
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                line_number += 1
+                if line.strip():
+                    yield to_model(parse_line(line, line_number), position)
+                    position += 1
+        # fails if the body ends inside a character
+        buffer += decode(decoder, b"", final=True)
+        if buffer.strip():
+            yield to_model(parse_line(buffer, line_number + 1), position)
+        return
+
+    try:
+        payloads = json.loads(await request.body())
+    except json.JSONDecodeError as error:
+        raise HTTPException(status_code=400, detail=f"Body is neither a JSON array nor NDJSON: {error}")
+    if not isinstance(payloads, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of extractions")
+    for position, payload in enumerate(payloads):
+        yield to_model(payload, position)
+
+@router.post("/extractions/bulk")
+async def create_extractions_bulk(request: Request, batch_size: int = 50, n_process: int = 1, documents_per_write: int = 500, deduplicate: bool = DEDUPLICATE_EXTRACTIONS):
+    """
+    Create many extractions at once from a JSON array or an NDJSON stream (application/x-ndjson).
+    Documents are tokenized in batches per tokenizer backend (nlp.pipe for spacy) and written in batches of documents_per_write.
+    With deduplicate, documents that are already ingested (or repeated within the request) are skipped,
+    their entry in "documents" has the existing extraction_id and "deduplicated": true.
+
+    n_process is limited to NLP_PROCESS_WORKERS (at least 1), every batch takes a slot of the NLP document lane.
+
+    An invalid NDJSON line answers 400 (invalid JSON) or 422 (invalid extraction), the batches written before
+    that line stay committed, they are found as duplicates if the corrected stream is sent again.
+    """
+    require_nlp(request)
+    tokenizers = request.app.state.tokenizers
+    storage = request.app.state.storage
+    nlp_executor = request.app.state.nlp_executor
+
+    if batch_size < 1 or n_process < 1 or documents_per_write < 1:
+        raise HTTPException(status_code=400, detail="batch_size, n_process and documents_per_write must be positive")
+    max_process = max(1, nlp_executor.process_workers)
+    if n_process > max_process:
+        raise HTTPException(status_code=400, detail=f"n_process must not be greater than {max_process} (NLP_PROCESS_WORKERS)")
+
+    creation_time = datetime.now().isoformat()
+    start_time = time.time()
+
+    documents = []
+    batch_summaries = []
+    batch = []
+    # content hash -> extraction id of everything ingested by this request
+    seen_hashes = {}
+
+    async def write_batch(batch):
+        try:
+            await write_new_documents(batch)
+        finally:
+            invalidate_read_cache(request)
+
+    async def write_new_documents(batch):
+        if not deduplicate:
+            batch_documents, batch_summary = await extraction_create_bulk(storage, tokenizers, batch, creation_time, batch_size=batch_size, n_process=n_process, token_filter=request.app.state.token_filter, nlp_executor=nlp_executor)
+            documents.extend(batch_documents)
+            batch_summaries.append(batch_summary)
+            return
+
+        hashes = [get_extraction_hash(extraction) for extraction in batch]
+        stored = await storage.find_extractions_by_hash([content_hash for content_hash in hashes if content_hash not in seen_hashes])
+        seen_hashes.update({content_hash: extraction["id"] for content_hash, extraction in stored.items()})
+
+        # None marks the position of a new document, duplicates keep their position in the response
+        entries = []
+        new_extractions = []
+        new_hashes = []
+        for extraction, content_hash in zip(batch, hashes):
+            if content_hash in seen_hashes or content_hash in new_hashes:
+                entries.append((extraction, content_hash))
+            else:
+                entries.append(None)
+                new_extractions.append(extraction)
+                new_hashes.append(content_hash)
+
+        batch_documents = []
+        if new_extractions:
+            batch_documents, batch_summary = await extraction_create_bulk(storage, tokenizers, new_extractions, creation_time, batch_size=batch_size, n_process=n_process, token_filter=request.app.state.token_filter, nlp_executor=nlp_executor)
+            batch_summaries.append(batch_summary)
+            seen_hashes.update({content_hash: document["extraction_id"] for content_hash, document in zip(new_hashes, batch_documents)})
+
+        new_documents = iter(batch_documents)
+        for entry in entries:
+            if entry is None:
+                documents.append(next(new_documents))
+            else:
+                extraction, content_hash = entry
+                documents.append({"extraction_id": seen_hashes[content_hash], "textual_identifier": extraction.textual_identifier, "deduplicated": True})
+
+    async for extraction in read_extraction_payloads(request):
+        select_tokenizer(request, extraction.tokenizer)
+        batch.append(extraction)
+        if len(batch) >= documents_per_write:
+            await write_batch(batch)
+            batch = []
+
+    if batch:
+        await write_batch(batch)
+
+    if not documents:
+        raise HTTPException(status_code=400, detail="No extractions found in the request body")
+
+    total_time = time.time() - start_time
+    total_tokens = sum(summary["tokens"] for summary in batch_summaries)
+
+    return {
+        "documents": documents,
+        "summary": {
+            "documents": len(documents),
+            "batches": len(batch_summaries),
+            "sentences": sum(summary["sentences"] for summary in batch_summaries),
+            "tokens": total_tokens,
+            "tokenization_seconds": round(sum(summary["tokenization_seconds"] for summary in batch_summaries), 3),
+            "write_seconds": round(sum(summary["write_seconds"] for summary in batch_summaries), 3),
+            "total_seconds": round(total_time, 3),
+            "documents_per_second": round(len(documents) / total_time, 2) if total_time > 0 else None,
+            "tokens_per_second": round(total_tokens / total_time, 2) if total_time > 0 else None
+        }
+    }
@@ -1,151 +1,286 @@
-from pypdf import PdfReader
-from fastapi import APIRouter, File, HTTPException, Request, UploadFile
+import asyncio
+import json
+import logging
+import os
+import uuid
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Optional
 
-from data_processor.data_transformer import get_english_stopwords, get_spacy_tokens
+from fastapi import APIRouter, File, HTTPException, Request, UploadFile
+from fastapi.responses import StreamingResponse
+
+from data_processor.content_hash import DEDUPLICATE_EXTRACTIONS, get_extraction_hash
+from data_processor.nlp_executor import require_nlp
+from data_processor.pdf_extractor import remove_spooled_file, spool_upload
+from data_processor.tokenizers import get_tokenizer
+from database.read_cache import cached_read, invalidate_read_cache
+from database.schema import FULLTEXT_INDEXES
+from database.storage import get_neo4j_driver
+from models.extraction_models import ExtractionCreateModel
 from models.function_models import RecommendedEntityFetch
 
 router = APIRouter()
 
+# results per page of /nodes/search and the largest page that can be requested
+SEARCH_LIMIT = int(os.getenv("SEARCH_LIMIT", "50"))
+SEARCH_MAX_LIMIT = int(os.getenv("SEARCH_MAX_LIMIT", "200"))
+# connected HLCs/entities per matched MLC of a multi-word search
+SEARCH_NEIGHBORS = int(os.getenv("SEARCH_NEIGHBORS", "50"))
+
+class SpooledPdfResponse(StreamingResponse):
+    """
+        StreamingResponse that removes the spooled PDF when the response is done. Also if the client is gone
+        before the first page, the generator never runs then and a background task is skipped on a disconnect.
+    """
+
+    def __init__(self, content, path, **kwargs):
+        super().__init__(content, **kwargs)
+        self.path = path
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            remove_spooled_file(self.path)
+
+async def queue_extraction(request: Request, text, textual_identifier, tokenizer, deduplicate=DEDUPLICATE_EXTRACTIONS):
+    """
+    Creates an extraction from the text and puts it into the ingestion queue.
+    Returns {"extraction_id", "status"}, the existing extraction (with "deduplicated": true) if the text is already ingested.
+    """
+    storage = request.app.state.storage
+    extraction = ExtractionCreateModel(text=text, textual_identifier=textual_identifier, tokenizer=tokenizer)
+    if deduplicate:
+        existing = await storage.find_extraction_by_hash(get_extraction_hash(extraction))
+        if existing is not None:
+            return {"extraction_id": existing["id"], "status": existing.get("status") or "initial", "deduplicated": True}
+
+    extraction_id = str(uuid.uuid4())
+    creation_time = datetime.now().isoformat()
+    # 503 if the queue is full, nothing is written then
+    await request.app.state.ingestion_queue.enqueue(extraction_id, extraction, creation_time)
+    invalidate_read_cache(request)
+    return {"extraction_id": extraction_id, "status": "queued"}
+
 @router.post("/text-from-pdf")
-async def text_from_pdf(file: UploadFile = File(...)):
+async def text_from_pdf(request: Request, file: UploadFile = File(...), stream: bool = False, ingest: bool = False, tokenizer: Optional[str] = None,
+                        deduplicate: bool = DEDUPLICATE_EXTRACTIONS):
     """
     Extract text from a PDF file.
+
+    The upload is spooled to disk and the pages are extracted in parallel (PDF_WORKERS processes).
+    stream=true returns NDJSON, one line per page as soon as it is extracted: {"page": 1, "pages": 300, "text": "..."}.
+    ingest=true also creates an extraction from the text (queued, see /extractions/{extraction_id}/status),
+    so the text does not have to be sent back by the client. A PDF whose text is already ingested returns
+    the existing extraction (deduplicated=true) unless deduplicate=false.
     """
-    # Placeholder for actual PDF text extraction logic
-    # In a real application, you would use a library like PyPDF2 or pdfminer.six to extract text from the PDF
-    
     print(f"Received file: {file.filename}, Content Type: {file.content_type}")
 
-    reader = PdfReader(file.file)
-    extracted_text = ""
-    for page in reader.pages:
-        extracted_text += page.extract_text() + "\n"
+    if ingest:
+        require_nlp(request)
+        try:
+            get_tokenizer(request.app.state.tokenizers, tokenizer)
+        except ValueError as error:
+            raise HTTPException(status_code=400, detail=str(error))
+
+    pdf_extractor = request.app.state.pdf_extractor
+    path = await asyncio.to_thread(spool_upload, file.file)
+
+    if stream:
+        async def stream_pages():
+            pages = []
+            try:
+                async for page_number, text, page_count in pdf_extractor.iter_pages(path):
+                    if ingest:
+                        pages.append(text + "\n")
+                    yield json.dumps({"page": page_number, "pages": page_count, "text": text}) + "\n"
+
+                if ingest:
+                    extracted_text = "".join(pages)
+                    if extracted_text.strip():
+                        yield json.dumps(await queue_extraction(request, extracted_text, file.filename, tokenizer, deduplicate)) + "\n"
+                    else:
+                        yield json.dumps({"error": "No text could be extracted from the PDF file."}) + "\n"
+            except Exception as error:
+                # the status code is already sent, the error is the last line of the stream
+                logging.exception(f"PDF extraction of {file.filename} failed")
+                yield json.dumps({"error": f"Could not read the PDF file: {error}"}) + "\n"
+
+        return SpooledPdfResponse(stream_pages(), path, media_type="application/x-ndjson")
+
+    try:
+        extracted_text = await pdf_extractor.extract_text(path)
+    except BrokenProcessPool:
+        raise HTTPException(status_code=400, detail="Could not read the PDF file: the extraction worker crashed")
+    except Exception as error:
+        raise HTTPException(status_code=400, detail=f"Could not read the PDF file: {error}")
+    finally:
+        remove_spooled_file(path)
+
     if not extracted_text.strip():
         raise HTTPException(status_code=400, detail="No text could be extracted from the PDF file.")
 
+    if ingest:
+        return {"extracted_text": extracted_text, **await queue_extraction(request, extracted_text, file.filename, tokenizer, deduplicate)}
+
     return {"extracted_text": extracted_text}
-    # return {"extracted_text": "This is a placeholder for the extracted text from the PDF file."}
 
 
+@router.get("/nlp/status")
+async def get_nlp_status(request: Request):
+    """
+    Load of the NLP executor: running, waiting and rejected tasks per lane (interactive threads, document processes).
+    """
+    require_nlp(request)
+    return request.app.state.nlp_executor.get_stats()
+
+def get_search_labels(node_type):
+    """Labels of a node_type parameter like ":MLC", all searchable labels for an empty one."""
+    # the label is validated, it used to be pasted into the Cypher query
+    label = node_type.strip().lstrip(":")
+    if label and label not in FULLTEXT_INDEXES:
+        raise HTTPException(status_code=400, detail=f"Invalid node_type '{node_type}'. Choose from: {', '.join(':' + name for name in FULLTEXT_INDEXES)}")
+    return [label] if label else list(FULLTEXT_INDEXES)
+
+def validate_page(query, skip, limit):
+    if not query.strip():
+        raise HTTPException(status_code=400, detail="Query string is required")
+    if skip < 0 or not 1 <= limit <= SEARCH_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"skip must not be negative and limit must be between 1 and {SEARCH_MAX_LIMIT}")
+
+def get_ready_search_index(request: Request, labels):
+    """The in-process search index if it is built and covers the labels, else None (the graph is searched instead)."""
+    search_index = getattr(request.app.state, "search_index", None)
+    if search_index is None or search_index.status != "ready" or not set(labels) <= search_index.labels:
+        return None
+    return search_index
+
+@router.get("/nodes/autocomplete")
+async def autocomplete_nodes(request: Request, query: str, node_type: str = "", limit: int = 10, fuzzy: bool = True):
+    """
+    Suggestions while typing, served from the in-process search index without a database round trip.
+    Words match as prefix, inside a word, without spaces ("brucelee" finds "Bruce Lee") and, if a word matches
+    nothing else, with typos (fuzzy).
+    Returns [{"id", "text", "labels", "score"}], texts of HLCs/extractions are shortened.
+    """
+    validate_page(query, 0, limit)
+    labels = get_search_labels(node_type)
+
+    search_index = get_ready_search_index(request, labels)
+    if search_index is None:
+        # index still building or disabled (SEARCH_INDEX=false)
+        results = await request.app.state.storage.search_nodes(query, labels, limit=limit)
+        return [{"id": result["node"]["id"], "text": result["node"].get("text") or result["node"].get("textual_identifier"), "labels": result["labels"], "score": result["score"]} for result in results]
+
+    return [
+        {"id": result["id"], "text": result["text"], "labels": [result["label"]], "score": result["score"]}
+        for result in search_index.search(query, labels, limit=limit, fuzzy=fuzzy)
+    ]
+
 @router.get("/nodes/search")
-async def search_nodes(request: Request, query: str, node_type: str):
+async def search_nodes(request: Request, query: str, node_type: str = "", skip: int = 0, limit: int = SEARCH_LIMIT, fuzzy: bool = True):
     """
     Search for nodes in the graph database based on a query string.
+
+    Single terms are looked up in the in-process search index (prefix, infix, typos with fuzzy=true,
+    "brucelee" finds "Bruce Lee"), only the found nodes are loaded from the graph. Until the index is
+    built, the full-text indexes of the graph are used. Every node has a relevance "score", the results
+    are paged with skip/limit. node_type restricts the search to a label (e.g. ":MLC").
+    Results are cached until the next write to the graph.
     """
+    validate_page(query, skip, limit)
+    labels = get_search_labels(node_type)
 
-    spacy_context = request.app.state.spacy_context
+    # the same query in another case or with other spacing has the same result
+    key = ("nodes/search", " ".join(query.lower().split()), tuple(labels), skip, limit, fuzzy, get_ready_search_index(request, labels) is not None)
+    return await cached_read(request, key, lambda: find_nodes(request, query, labels, skip, limit, fuzzy))
 
-    if not query:
-        raise HTTPException(status_code=400, detail="Query string is required")
+async def find_nodes(request: Request, query, labels, skip, limit, fuzzy):
+    token_filter = request.app.state.token_filter
+    storage = request.app.state.storage
 
     print(f"Search query: {query}")
 
-    if(" " in query):
+    if(" " in query.strip()):
         # use tokenizor and find all relevant mlcs
         # split query into tokens
 
         # make sure to use the same tokenizer as the one used for indexing
-        tokens = get_spacy_tokens(spacy_context, query)
+        require_nlp(request)
+        tokens = await request.app.state.nlp_executor.tokens(query)
         if not tokens:
             raise HTTPException(status_code=400, detail="No tokens found in the query string")
         print(f"Tokens found: {tokens}")
 
-        tokens = [t.strip() for t in tokens if t.strip()]  # Clean up tokens
-        tokens = [t.lower() for t in tokens]  # Convert to lower case for case-insensitive search
-        tokens = [t for t in tokens if t not in get_english_stopwords()]  # Remove stopwords ---> idk how smart this is -- gets more concrete results but removes the possible usage of stopwords
-
-        # get MLCs for tokens
-        driver = request.app.state.driver
-        with driver.session() as session:
-            result = session.run(
-                "MATCH (mlc:MLC) "
-                "WHERE toLower(mlc.text) IN $tokens "
-                "OPTIONAL MATCH (mlc)<-[:COMBINATION_OF]-(entity:Entity) "
-                "OPTIONAL MATCH (mlc)<-[:HAS_CHAIN]-(hlc:HLC) "
-                "RETURN mlc, collect(hlc) as hlcs, collect(entity) as entities",
-                tokens=tokens
-            )
-
-            nodes = {}
-
-            # Iterate through the result and collect all nodes as a single node
-            for record in result:
-                mlc_node = record["mlc"]
-                entities = record["entities"]
-                hlcs = record["hlcs"]
-
-                if mlc_node:
-                    nodes[mlc_node["id"]] = {
-                        "id": mlc_node["id"],
-                        "text": mlc_node["text"],
-                        "creation_time": mlc_node["creation_time"],
-                        "labels": list(mlc_node.labels),
-                        "strength": 9999
-                    }
+        # clean up tokens, convert to lower case for case-insensitive search and remove stopwords
+        # ---> idk how smart this is -- gets more concrete results but removes the possible usage of stopwords
+        tokens = token_filter.search_terms(tokens)
+
+        nodes = {}
+
+        # collect all nodes connected to the MLCs of the tokens as a single node
+        for match in await storage.find_mlcs_by_terms(tokens, neighbors=SEARCH_NEIGHBORS):
+            mlc_node = match["mlc"]
+            nodes[mlc_node["id"]] = {
+                "id": mlc_node["id"],
+                "text": mlc_node["text"],
+                "creation_time": mlc_node.get("creation_time"),
+                "labels": ["MLC"],
+                "strength": 9999,
+                "score": match["score"]
+            }
 
-                for entity in entities:
-                    if entity["id"] not in nodes:
-                        # Add entity only if it is not already added
-                        nodes[entity["id"]] = {
-                            "id": entity["id"],
-                            "text": entity["text"],
-                            "textual_identifier": entity.get("textual_identifier", None),
-                            "creation_time": entity["creation_time"],
-                            "labels": list(entity.labels),
-                            "strength": 0
-                        }
-                    else:
-                        # If entity already exists, just update the strength
-                        nodes[entity["id"]]["strength"] += 1
-
-                for hlc in hlcs:
-                    if hlc["id"] not in nodes:
-                        # Add HLC only if it is not already added
-                        nodes[hlc["id"]] = {
-                            "id": hlc["id"],
-                            "text": hlc["text"],
-                            "creation_time": hlc["creation_time"],
-                            "labels": list(hlc.labels),
-                            "strength": 0
+            for label_name, connected_nodes in (("Entity", match["entities"]), ("HLC", match["hlcs"])):
+                for node in connected_nodes:
+                    if node["id"] not in nodes:
+                        # Add the node only if it is not already added
+                        nodes[node["id"]] = {
+                            "id": node["id"],
+                            "text": node["text"],
+                            "textual_identifier": node.get("textual_identifier", None),
+                            "creation_time": node.get("creation_time"),
+                            "labels": [label_name],
+                            "strength": 0,
+                            "score": None
                         }
                     else:
-                        # If HLC already exists, just update the strength
-                        nodes[hlc["id"]]["strength"] += 1
-
-            if not nodes:
-                raise HTTPException(status_code=404, detail="No nodes found matching the query")
-
-            # Convert the dictionary to a list of nodes
-            nodes = list(nodes.values())
-            # Sort nodes by strength in descending order
-            nodes.sort(key=lambda x: x["strength"], reverse=True)
-
-            return nodes
-
-    # if no space, we assume it's a single term search -- currently does not find "brucelee" or "kgg_1"
-    driver = request.app.state.driver
-    with driver.session() as session:
-        # Use a full-text search or a simple substring match
-        result = session.run(
-            f"MATCH (n{node_type}) "
-            "WHERE toLower(n.text) CONTAINS toLower($search_term) OR toLower(n.textual_identifier) CONTAINS toLower($search_term) "
-            "RETURN n",
-            search_term=query
-        )
-
-        nodes = []
-        for record in result:
-            node = record["n"]
-            nodes.append({
-                "id": node["id"],
-                "text": node["text"],
-                "creation_time": node["creation_time"],
-                "textual_identifier": node.get("textual_identifier", None),
-                "labels": list(node.labels),
-                "creation_time": node.get("creation_time", None),
-            })
-
-        return nodes
+                        # If the node already exists, just update the strength
+                        nodes[node["id"]]["strength"] += 1
+
+        if not nodes:
+            raise HTTPException(status_code=404, detail="No nodes found matching the query")
+
+        # Convert the dictionary to a list of nodes
+        nodes = list(nodes.values())
+        # Sort nodes by strength in descending order
+        nodes.sort(key=lambda x: x["strength"], reverse=True)
+
+        return nodes[skip:skip + limit]
+
+    search_index = get_ready_search_index(request, labels)
+    if search_index is not None:
+        matches = search_index.search(query, labels, skip=skip, limit=limit, fuzzy=fuzzy)
+        node_ids = {}
+        for match in matches:
+            node_ids.setdefault(match["label"], []).append(match["id"])
+        # the full nodes in one round trip, nodes that are gone from the graph are left out
+        nodes = await storage.get_nodes(node_ids)
+        results = [{"node": nodes[match["id"]], "labels": [match["label"]], "score": match["score"]} for match in matches if match["id"] in nodes]
+    else:
+        # single term: whole words and word prefixes of the full-text indexes
+        results = await storage.search_nodes(query, labels, skip=skip, limit=limit)
+    return [
+        {
+            "id": result["node"]["id"],
+            "text": result["node"].get("text"),
+            "textual_identifier": result["node"].get("textual_identifier", None),
+            "labels": result["labels"],
+            "creation_time": result["node"].get("creation_time", None),
+            "score": result["score"],
+        }
+        for result in results
+    ]
 
 @router.post("/find-recommended-entities")
 async def find_entities(request: Request, body: RecommendedEntityFetch):
@@ -156,15 +291,14 @@ async def find_entities(request: Request, body: RecommendedEntityFetch):
 
     print(body.mlc_ids, body.hlc_id)
     # remove grammatical stuff here like ".", "," etc.
-    stopsigns = {" ", ".", ",", ":", ";", "!", "?", "-", "_", "(", ")", "[", "]", "{", "}", "", "\n", "\"", "'", "/", "\n\n"}
-    body.mlc_ids = [mlc_id for mlc_id in body.mlc_ids if mlc_id not in stopsigns]
+    body.mlc_ids = request.app.state.token_filter.remove_stopsigns(body.mlc_ids)
 
 
     # get tokens from hlc_id
-    with request.app.state.driver.session() as session:
+    async with get_neo4j_driver(request).session() as session:
         possible_entities = []
         if body.hlc_id:
-            result = session.run(
+            result = await session.run(
                 """
                     CALL () {
                         MATCH (mlc:MLC)
@@ -206,7 +340,7 @@ async def find_entities(request: Request, body: RecommendedEntityFetch):
                 mlc_ids=body.mlc_ids
             )
 
-            possible_entities = [record for record in result]
+            possible_entities = [record async for record in result]
 
             # now check if any of them make sense
             # for each token? or for each entity that spacy is predicting? or for each entity that is already in the database? so many questions...
@@ -215,87 +349,45 @@ async def find_entities(request: Request, body: RecommendedEntityFetch):
 
     return possible_entities
 
+@router.get("/similar-extractions")
+async def get_similar_extractions(request: Request, extraction_id: str, limit: int = 10, min_similarity: float = 0.0):
+    """
+    Extractions with text similar to the given one, the most similar first: [{"extraction_id", "textual_identifier", "similarity"}].
+    The similarity is the Jaccard similarity of the word shingles estimated from MinHash signatures, candidates come from
+    the LSH buckets of the similarity index, so only a few extractions are compared (pairs below ~0.4 are usually not found).
+    """
+    similarity_index = getattr(request.app.state, "similarity_index", None)
+    if similarity_index is None or similarity_index.status != "ready":
+        raise HTTPException(status_code=503, detail="The similarity index is not ready yet", headers={"Retry-After": "5"})
+    if not 1 <= limit <= SEARCH_MAX_LIMIT or not 0 <= min_similarity <= 1:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {SEARCH_MAX_LIMIT} and min_similarity between 0 and 1")
+
+    similar = similarity_index.find_similar(extraction_id, limit=limit, min_similarity=min_similarity)
+    if similar is None:
+        raise HTTPException(status_code=404, detail="Extraction not found or without sentences")
+
+    storage = request.app.state.storage
+    extractions = await storage.get_nodes({"Extraction": [result["extraction_id"] for result in similar]})
+    return [
+        {
+            "extraction_id": result["extraction_id"],
+            "textual_identifier": extractions[result["extraction_id"]].get("textual_identifier"),
+            "similarity": result["similarity"]
+        }
+        for result in similar
+        if result["extraction_id"] in extractions
+    ]
+
 @router.get("/compare-extractions")
 async def compare_extractions(request: Request, extraction_id_1: str, extraction_id_2: str):
     """
     Compare two extractions and return their differences.
+    Exact intersection of the n-gram index of both extractions, see GET /similar-extractions to find extractions to compare.
     """
-    driver = request.app.state.driver
-    with driver.session() as session:
-        result = session.run(
-            """
-                CALL {
-                    MATCH (e:Extraction)-[:HAS_HLC]-(hlc:HLC)
-                    WHERE e.id = $extraction_id_1
-                    MATCH (hlc)-[r:HAS_CHAIN]-(mlc:MLC)
-                    WHERE EXISTS { (mlc)-[:RELATED_TO]-() }
-                    WITH e, hlc, mlc
-                    ORDER BY r.order ASC
-                    WITH e, hlc, COLLECT(mlc.text) AS seq
-                    WITH e, hlc, seq, SIZE(seq) AS seq_len
-                    UNWIND (
-                        [i IN RANGE(0, seq_len-2) | seq[i..i+2]] +
-                        [i IN RANGE(0, seq_len-3) | seq[i..i+3]] +
-                        [i IN RANGE(0, seq_len-4) | seq[i..i+4]]
-                    ) AS ngram
-                    WITH REDUCE(s = "", word IN ngram | s + word + " ") AS phrase,
-                        COUNT(DISTINCT hlc) AS freq1
-                    // WHERE freq1 > 1 maybe add later again if there are too many results...
-                    RETURN phrase, freq1
-                    }
-                    WITH COLLECT({phrase: phrase, freq1: freq1}) AS set1
-
-                    // Process second extraction
-                CALL {
-                    MATCH (e2:Extraction)-[:HAS_HLC]-(hlc2:HLC)
-                    WHERE e2.id = $extraction_id_2
-                    MATCH (hlc2)-[r2:HAS_CHAIN]-(mlc2:MLC)
-                    WHERE EXISTS { (mlc2)-[:RELATED_TO]-() }
-                    WITH e2, hlc2, mlc2
-                    ORDER BY r2.order ASC
-                    WITH e2, hlc2, COLLECT(mlc2.text) AS seq2
-                    WITH e2, hlc2, seq2, SIZE(seq2) AS seq_len2
-                    UNWIND (
-                        [i IN RANGE(0, seq_len2-2) | seq2[i..i+2]] +
-                        [i IN RANGE(0, seq_len2-3) | seq2[i..i+3]] +
-                        [i IN RANGE(0, seq_len2-4) | seq2[i..i+4]]
-                    ) AS ngram2
-                    WITH REDUCE(s = "", word IN ngram2 | s + word + " ") AS phrase,
-                        COUNT(DISTINCT hlc2) AS freq2
-                    // WHERE freq2 > 1 maybe add later again if there are too many results...
-                    RETURN phrase, freq2
-                }
-                WITH set1, COLLECT({phrase: phrase, freq2: freq2}) AS set2
-
-                // Compute intersection and sum frequencies
-                UNWIND set1 AS s1
-                UNWIND set2 AS s2
-                WITH s1, s2
-                WHERE s1.phrase = s2.phrase
-                RETURN s1.phrase AS phrase,
-                    s1.freq1 AS extraction1_freq,
-                    s2.freq2 AS extraction2_freq,
-                    s1.freq1 + s2.freq2 AS total_frequency
-                ORDER BY total_frequency DESC
-                LIMIT 50
-            """,
-            extraction_id_1=extraction_id_1,
-            extraction_id_2=extraction_id_2
-        )
-        
-        intersections = []
-
-        for record in result:
-            # print("Record:", record)
-            intersection = {
-                "phrase": record["phrase"],
-                "extraction1_freq": record["extraction1_freq"],
-                "extraction2_freq": record["extraction2_freq"],
-                "total_frequency": record["total_frequency"]
-            }
-            intersections.append(intersection)
+    storage = request.app.state.storage
+    intersections = await storage.compare_extractions(extraction_id_1, extraction_id_2, limit=50)
+
+    if not intersections:
+        raise HTTPException(status_code=404, detail="No common phrases found between the two extractions")
 
-        if not intersections:
-            raise HTTPException(status_code=404, detail="No common phrases found between the two extractions")
-        
-        return intersections
\ No newline at end of file
+    return intersections
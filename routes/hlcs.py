@@ -1,57 +1,72 @@
 from fastapi import APIRouter, HTTPException, Request
-from data_processor.data_transformer import get_hlc_entities, get_spacy_tokens, get_spacy_entities
+from data_processor.data_transformer import get_hlc_entities
+from data_processor.nlp_executor import require_nlp
+from data_processor.tokenizers import get_token_offsets
+from helper_test import get_hlc_analysis, load_hlc_analysis
 
 router = APIRouter()
 
 
 @router.get("/hlc/{hlc_id}")
-async def get_hlc(request: Request, hlc_id: str):
+async def get_hlc(request: Request, hlc_id: str, recompute: bool = False):
     """
     Retrieve a specific HLC by its ID.
+
+    Tokens, token offsets and spaCy entities are stored with the HLC at ingestion and served from the
+    graph storage. HLCs ingested without entities (older HLCs, backends without NER) get their spaCy entities
+    once, their tokens stay the ones of the chain. recompute=true runs spaCy again and replaces the whole
+    analysis, tokens included.
     """
-    # get hlc from db
-    driver = request.app.state.driver
-    spacy_context = request.app.state.spacy_context
-
-    with driver.session() as session:
-        # get HLC node by id and connected MLCs and connected distinct Extraction
-        result = session.run(
-            "MATCH (hlc:HLC {id: $hlc_id}) "
-            "OPTIONAL MATCH (hlc)<-[:HAS_HLC]-(e:Extraction) "
-            "OPTIONAL MATCH (hlc)-[:HAS_ENTITY]->(entity:Entity) "
-            "OPTIONAL MATCH (hlc)-[r:HAS_CHAIN]->(chain_item) "
-            "WITH hlc, collect(DISTINCT e) as extractions, collect(DISTINCT entity) as entities, chain_item, r.order as pos "
-            "ORDER BY pos "
-            "RETURN hlc, collect({id: chain_item.id, type: head(labels(chain_item)), text: chain_item.text}) as chain, extractions, entities",
-            hlc_id=hlc_id
-        )
-        record = result.single()
-                
-        if not record:
-            raise HTTPException(status_code=404, detail="HLC not found")
-        hlc_node = record["hlc"]
-        tokens = get_spacy_tokens(spacy_context, hlc_node["text"])
-        spacy_entities = get_spacy_entities(spacy_context, hlc_node["text"])
-        hlc_entities = get_hlc_entities(session, hlc_node["text"])
-            
-        # enhance space entities with recommended_by field
-        if spacy_entities is None or len(spacy_entities) == 0:
-            spacy_entities = []
+    # get hlc from the graph storage
+    storage = request.app.state.storage
+
+    # get HLC node by id and connected MLCs and connected distinct Extraction
+    record = await storage.get_hlc(hlc_id)
+
+    if not record:
+        raise HTTPException(status_code=404, detail="HLC not found")
+    hlc_node = record["hlc"]
+    hlc_entities = await get_hlc_entities(storage, hlc_node["text"], getattr(request.app.state, "entity_matcher", None))
+
+    analysis = load_hlc_analysis(hlc_node.get("analysis"))
+    if recompute or analysis is None or analysis.get("entities") is None:
+        # the only case that needs the model
+        require_nlp(request)
+        nlp_executor = request.app.state.nlp_executor
+        if recompute:
+            tokens, spacy_entities = await nlp_executor.tokens_and_entities(hlc_node["text"])
         else:
-            spacy_entities = [{"text": ent[0], "label": ent[1], "start_char": ent[2], "end_char": ent[3], "recommended_by": "spacy"} for ent in spacy_entities]
-    
-        # hlc_found = [{"text": "University of Applied Sciences and Arts Northwestern Switzerland", "label": "ORGANIZATION", "start_char": 17, "end_char": 80, "recommended_by": "hlc"}]
-    
-        hlc = {
-            "id": hlc_node["id"],
-            "creation_time": hlc_node["creation_time"],
-            "text": hlc_node["text"],
-            "tokens": tokens,
-            "recommended_entities": spacy_entities + hlc_entities,
-            "relations": [],
-            "chain": record["chain"],
-            "extractions": record["extractions"],
-            "entities": record["entities"]
-        }
-
-        return hlc
\ No newline at end of file
+            # the tokens the chain was built with are kept (e.g. nltk or regex), only the entities are added
+            tokens = analysis["tokens"] if analysis else [item["text"] for item in record["chain"]]
+            spacy_entities = await nlp_executor.entities(hlc_node["text"])
+        analysis = {"tokens": tokens, "token_offsets": get_token_offsets(hlc_node["text"], tokens), "entities": spacy_entities}
+        await storage.set_hlc_analysis(hlc_id, get_hlc_analysis(analysis))
+        analysis_source = "computed"
+    else:
+        analysis_source = "stored"
+    tokens = analysis["tokens"]
+    spacy_entities = analysis["entities"]
+
+    # enhance space entities with recommended_by field
+    if spacy_entities is None or len(spacy_entities) == 0:
+        spacy_entities = []
+    else:
+        spacy_entities = [{"text": ent[0], "label": ent[1], "start_char": ent[2], "end_char": ent[3], "recommended_by": "spacy"} for ent in spacy_entities]
+
+    # hlc_found = [{"text": "University of Applied Sciences and Arts Northwestern Switzerland", "label": "ORGANIZATION", "start_char": 17, "end_char": 80, "recommended_by": "hlc"}]
+
+    hlc = {
+        "id": hlc_node["id"],
+        "creation_time": hlc_node.get("creation_time"),
+        "text": hlc_node["text"],
+        "tokens": tokens,
+        "token_offsets": analysis["token_offsets"],
+        "analysis": analysis_source,
+        "recommended_entities": spacy_entities + hlc_entities,
+        "relations": [],
+        "chain": record["chain"],
+        "extractions": record["extractions"],
+        "entities": record["entities"]
+    }
+
+    return hlc
@@ -1,4 +1,6 @@
 from fastapi import APIRouter, HTTPException, Request
+from database.read_cache import invalidate_read_cache
+from database.storage import get_neo4j_driver
 from models.entity_models import RelationshipCreateModel
 
 router = APIRouter()
@@ -19,11 +21,11 @@ async def create_relationship(request: Request, relationship: RelationshipCreate
 
         full_string = string_builder1 + string_builder2 + string_builder3
 
-        with request.app.state.driver.session() as session:
+        async with get_neo4j_driver(request).session() as session:
             query = (
                 full_string
             )
-            session.run(
+            await session.run(
                 query,
                 source_id=relationship.source_id,
                 target_id=relationship.target_id,
@@ -33,7 +35,7 @@ async def create_relationship(request: Request, relationship: RelationshipCreate
         # source exists but no target indicated
         if not relationship.target_text:
             raise HTTPException(status_code=400, detail="Target text is required when target ID is not provided")
-        with request.app.state.driver.session() as session:
+        async with get_neo4j_driver(request).session() as session:
             # set property of source entity with name = relationship_type and value = target_id
 
             # make sure that target does not have ' in it, otherwise it will break the query
@@ -44,10 +46,11 @@ async def create_relationship(request: Request, relationship: RelationshipCreate
             query = (
                 full_query
             )
-            session.run(
+            await session.run(
                 query,
                 source_id=relationship.source_id
             )
+    invalidate_read_cache(request)
     return {"message": "Relationship created successfully"}
 
 @router.get("/relationship-types")
@@ -55,14 +58,14 @@ async def get_relationship_types(request: Request):
     """
     Retrieve all relationship types in the graph database.
     """
-    driver = request.app.state.driver
-    with driver.session() as session:
-        result = session.run(
+    driver = get_neo4j_driver(request)
+    async with driver.session() as session:
+        result = await session.run(
             "CALL db.relationshipTypes() YIELD relationshipType "
             "RETURN relationshipType"
         )
 
-        relationship_types = [record["relationshipType"] for record in result]
+        relationship_types = [record["relationshipType"] async for record in result]
 
         return {"relationship_types": relationship_types}
     
\ No newline at end of file
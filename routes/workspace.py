@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException, Request
+from database.read_cache import cached_read
 
 router = APIRouter()
 
@@ -7,142 +8,74 @@ async def get_important_mlcs(request: Request, extraction_id: str = None):
     """
     Retrieve important MLCs based on their relationships.
     """
-    driver = request.app.state.driver
-    with driver.session() as session:
-        if extraction_id:
-            # If extraction_id is provided, filter MLCs related to that extraction
-            result = session.run(
-                "MATCH (mlc)-[r:RELATED_TO]-(x) "
-                "MATCH (e:Extraction {id: $extraction_id})-[:HAS_HLC]->(hlc:HLC)-[:HAS_CHAIN]->(mlc:MLC) "
-                "WITH mlc, count(r) as rels "
-                "ORDER BY rels DESC "
-                "LIMIT 20 "
-                "RETURN collect({mlc: mlc, strength: rels}) as important_mlcs",
-                extraction_id=extraction_id
-            )
-        else:
-            # Otherwise, find the most related MLCs in the entire database
+    storage = request.app.state.storage
 
-            result = session.run(
-                "MATCH (a:MLC)-[r:RELATED_TO]-(x) "
-                "WITH a, count(r) as rels "
-                "ORDER BY rels DESC "
-                "LIMIT 20 "
-                "RETURN collect({mlc: a, strength: rels}) as important_mlcs"
-            )
+    # if extraction_id is provided, only MLCs of that extraction, otherwise the most related MLCs in the entire graph
+    # (cached until the next write, the query looks at all RELATED_TO relationships)
+    result = await cached_read(request, ("workspace/important-mlcs", extraction_id or None), lambda: storage.get_important_mlcs(extraction_id=extraction_id, limit=20))
+    if not result:
+        raise HTTPException(status_code=404, detail="No important MLCs found")
 
-        result = result.single()
-        if not result or not result["important_mlcs"]:
-            raise HTTPException(status_code=404, detail="No important MLCs found")
-        
-        result = result["important_mlcs"]
+    important_mlcs = []
+    for item in result:
+        mlc = item["mlc"]
+        important_mlcs.append({
+            "id": mlc["id"],
+            "text": mlc["text"],
+            "creation_time": mlc["creation_time"] if "creation_time" in mlc else None,
+            "labels": item["labels"],
+            "strength": item["strength"]
+        })
 
-        important_mlcs = []
-        for item in result:
-            mlc = item["mlc"]
-            important_mlcs.append({
-                "id": mlc["id"],
-                "text": mlc["text"],
-                "creation_time": mlc["creation_time"] if "creation_time" in mlc else None,
-                "labels": list(mlc.labels),
-                "strength": item["strength"]
-            })
-
-        return important_mlcs
+    return important_mlcs
 
 @router.get("/workspace/recent-creations")
 async def get_recent_creations(request: Request):
     """
     Retrieve recent creations (MLCs, HLCs, Entities) in the workspace.
     """
-    driver = request.app.state.driver
-    with driver.session() as session:
-        result = session.run(
-            "MATCH (n) "
-            "WHERE n:Extraction OR n:Entity "
-            "RETURN n "
-            "ORDER BY n.creation_time DESC "
-            "LIMIT 20"
-        )
+    storage = request.app.state.storage
 
-        recent_creations = []
-        for record in result:
-            node = record["n"]
-            recent_creations.append({
-                "id": node["id"],
-                "text": node["text"],
-                "textual_identifier": node.get("textual_identifier", None),
-                "creation_time": node["creation_time"] if "creation_time" in node else None,
-                "labels": list(node.labels)
-            })
+    recent_creations = []
+    for item in await cached_read(request, ("workspace/recent-creations",), lambda: storage.get_recent_creations(limit=20)):
+        node = item["node"]
+        recent_creations.append({
+            "id": node["id"],
+            "text": node["text"],
+            "textual_identifier": node.get("textual_identifier", None),
+            "creation_time": node["creation_time"] if "creation_time" in node else None,
+            "labels": item["labels"]
+        })
 
-        return recent_creations
+    return recent_creations
     
 @router.get("/workspace/n-grams")
-async def get_ngrams(request: Request, extraction_id: str = None):
+async def get_ngrams(request: Request, extraction_id: str = None, scope: str = "extraction"):
     """
     Retrieve n-grams from the text of an extraction.
+
+    scope=extraction (default): frequent n-grams per extraction (of the given extraction or of all extractions).
+    scope=workspace: frequent n-grams of the whole graph, counted over all HLCs.
+
+    The n-grams are built from the tokens of every HLC without stopwords and signs (the token filter of the ingestion),
+    phrases that consist of or start/end with stopwords are not returned.
     """
+    if scope not in ("extraction", "workspace"):
+        raise HTTPException(status_code=400, detail="scope must be 'extraction' or 'workspace'")
+
+    storage = request.app.state.storage
 
-    driver = request.app.state.driver
-    with driver.session() as session:
-        if extraction_id:
-            result = session.run(
-                """
-                    MATCH (e:Extraction {id: $extraction_id})-[:HAS_HLC]-(hlc:HLC)
-                    MATCH (hlc)-[r:HAS_CHAIN]-(mlc:MLC)
-                    WHERE EXISTS { (mlc)-[:RELATED_TO]-() }
-                    WITH e, hlc, mlc
-                    ORDER BY r.order ASC
-                    WITH e, hlc, COLLECT(mlc.text) AS seq
-                    WITH e, hlc, seq, SIZE(seq) AS seq_len
-                    UNWIND (
-                        [i IN RANGE(0, seq_len-2) | seq[i..i+2]] +    // duograms (n=2)
-                        [i IN RANGE(0, seq_len-3) | seq[i..i+3]] +    // trigrams (n=3)
-                        [i IN RANGE(0, seq_len-4) | seq[i..i+4]]      // quadruplograms (n=4)
-                    ) AS ngram
-                    WITH e.id AS extraction,
-                        REDUCE(s = "", word IN ngram | s + word + " ") AS phrase,
-                        COUNT(DISTINCT hlc) AS frequency
-                    WHERE frequency > 1
-                    RETURN extraction, phrase, frequency
-                    ORDER BY frequency DESC
-                    LIMIT 50
-                """,
-                extraction_id=extraction_id
-            )
-        else:
-            result = session.run(
-                """
-                    MATCH (e:Extraction)-[:HAS_HLC]-(hlc:HLC)
-                    MATCH (hlc)-[r:HAS_CHAIN]-(mlc:MLC)
-                    WHERE EXISTS { (mlc)-[:RELATED_TO]-() }
-                    WITH e, hlc, mlc
-                    ORDER BY r.order ASC
-                    WITH e, hlc, COLLECT(mlc.text) AS seq
-                    WITH e, hlc, seq, SIZE(seq) AS seq_len
-                    UNWIND (
-                        [i IN RANGE(0, seq_len-2) | seq[i..i+2]] +    // duograms (n=2)
-                        [i IN RANGE(0, seq_len-3) | seq[i..i+3]] +    // trigrams (n=3)
-                        [i IN RANGE(0, seq_len-4) | seq[i..i+4]]      // quadruplograms (n=4)
-                    ) AS ngram
-                    WITH e.id AS extraction,
-                        REDUCE(s = "", word IN ngram | s + word + " ") AS phrase,
-                        COUNT(DISTINCT hlc) AS frequency
-                    WHERE frequency > 1
-                    RETURN extraction, phrase, frequency
-                    ORDER BY frequency DESC
-                    LIMIT 50
-                """
-            )
+    # duograms, trigrams and quadruplograms of the filtered MLC chains that occur in more than one HLC (from the n-gram index)
+    if scope == "workspace":
+        return await cached_read(request, ("workspace/n-grams/workspace",), lambda: storage.get_top_ngrams(min_frequency=2, limit=50))
 
-        ngrams = []
-        for record in result:
-            ngram = {
-                "extraction_id": record["extraction"],
-                "phrase": record["phrase"].strip(),
-                "frequency": record["frequency"]
-            }
-            ngrams.append(ngram)
+    ngrams = []
+    for record in await cached_read(request, ("workspace/n-grams", extraction_id or None), lambda: storage.get_ngrams(extraction_id=extraction_id, min_frequency=2, limit=50)):
+        ngram = {
+            "extraction_id": record["extraction_id"],
+            "phrase": record["phrase"].strip(),
+            "frequency": record["frequency"]
+        }
+        ngrams.append(ngram)
 
-        return ngrams
\ No newline at end of file
+    return ngrams